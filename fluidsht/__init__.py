@@ -7,6 +7,7 @@ The sht and related `operators` classes are in the subpackages
    :toctree:
 
    sht2d
+   wisdom
 
 This root module provides two helper functions to import sht classes and
 create sht objects:
@@ -15,11 +16,34 @@ create sht objects:
 
 .. autofunction:: create_sht_object
 
+SHT objects created by :func:`create_sht_object` are shared through a
+process-wide cache, which can be inspected and emptied with:
+
+.. autofunction:: plan_cache_info
+
+.. autofunction:: clear_plan_cache
+
+The read-only arrays of the operators depending only on the truncation and the
+radius (indices of the coefficients, powers of :math:`l(l+1)/r^2`, ...) are
+also shared between operators. Their memory footprint is given by:
+
+.. autofunction:: spectral_tables_info
+
 """
 from importlib import import_module as _import_module
 from fluidsht._version import __version__, __about__
+from fluidsht._plan_cache import plan_cache as _plan_cache
+from fluidsht.util import get_nthreads as _get_nthreads
 
-__all__ = ["__version__", "__about__", "import_sht_class", "create_sht_object"]
+__all__ = [
+    "__version__",
+    "__about__",
+    "import_sht_class",
+    "create_sht_object",
+    "plan_cache_info",
+    "clear_plan_cache",
+    "spectral_tables_info",
+]
 
 
 def import_sht_class(method, raise_import_error=True):
@@ -65,7 +89,15 @@ def import_sht_class(method, raise_import_error=True):
 
 
 def create_sht_object(
-    method, n0=None, n1=None, n2=None, lmax=15, *args, **kwargs
+    method,
+    n0=None,
+    n1=None,
+    n2=None,
+    lmax=15,
+    *args,
+    nthreads=None,
+    use_cache=True,
+    **kwargs,
 ):
     """Helper for creating sht objects.
 
@@ -83,6 +115,18 @@ def create_sht_object(
     lmax : int
       Truncation degree
 
+    nthreads : {None, int, "auto"}
+
+      Number of threads used by the SHT object. If None, the default of the
+      library. If "auto", computed from the CPU affinity mask of the process
+      (see :func:`fluidsht.util.get_nthreads`).
+
+    use_cache : {True}, False
+
+      If True, an object created before with the same parameters is returned
+      (see :func:`plan_cache_info`). Note that such object is shared and should
+      not be modified.
+
     Returns
     -------
 
@@ -100,8 +144,52 @@ def create_sht_object(
     elif n2 is not None and str_module.startswith("fluidsht.sht2d."):
         raise ValueError("Arguments incompatible")
 
+    if nthreads is not None:
+        kwargs["nthreads"] = _get_nthreads(nthreads)
+
     if n2 is None:
-        return cls(n0, n1, lmax, *args, **kwargs)
+        if not use_cache:
+            return cls(n0, n1, lmax, *args, **kwargs)
+
+        key = _plan_cache.make_key(str_module, n0, n1, lmax, *args, **kwargs)
+        return _plan_cache.get_or_create(
+            key, lambda: cls(n0, n1, lmax, *args, **kwargs)
+        )
     else:
         raise NotImplementedError
         # return cls(n0, n1, n2, lmax, *args, **kwargs)
+
+
+def plan_cache_info():
+    """Statistics on the cache of SHT objects.
+
+    Returns
+    -------
+
+    A namedtuple with the fields ``hits``, ``misses``, ``evictions``,
+    ``nb_plans``, ``nbytes`` and ``maxbytes``.
+
+    """
+    return _plan_cache.info()
+
+
+def clear_plan_cache():
+    """Remove all SHT objects from the cache."""
+    _plan_cache.clear()
+
+
+def spectral_tables_info():
+    """Number of spectral tables shared between the operators and memory used
+    by them.
+
+    The tables are released when they are not used anymore by any operator.
+
+    Returns
+    -------
+
+    A namedtuple with the fields ``nb_tables`` and ``nbytes``.
+
+    """
+    from fluidsht.sht2d._spectral_tables import tables_info
+
+    return tables_info()
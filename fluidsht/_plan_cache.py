@@ -0,0 +1,142 @@
+"""Process-wide cache of SHT objects (:mod:`fluidsht._plan_cache`)
+==================================================================
+
+Creating a SHT object is costly (Gauss nodes, Legendre tables, optional
+tuning). SHT objects created with the same parameters are equivalent, so that
+they can be shared between operators. The cache is bounded by a memory budget
+(in bytes) and evicts the least recently used objects first.
+
+The budget can be set with the environment variable
+``FLUIDSHT_PLAN_CACHE_MAXBYTES`` (default 1 GiB). A budget equal to 0 disables
+the cache.
+
+.. autoclass:: PlanCache
+   :members:
+
+"""
+from collections import OrderedDict, namedtuple
+import os
+import threading
+
+
+CacheInfo = namedtuple(
+    "CacheInfo", ("hits", "misses", "evictions", "nb_plans", "nbytes", "maxbytes")
+)
+
+
+def nbytes_array_attrs(obj):
+    """Sum the sizes of the array attributes of an object."""
+    try:
+        attrs = vars(obj)
+    except TypeError:
+        return 0
+    return sum(
+        value.nbytes
+        for value in attrs.values()
+        if isinstance(getattr(value, "nbytes", None), int)
+    )
+
+
+def estimate_nbytes(obj):
+    """Estimate the memory used by an object.
+
+    The objects can define a method ``_estimate_nbytes`` to account for the
+    memory not held in array attributes (tables of an external library, tables
+    computed lazily). By default, the sizes of the array attributes are summed.
+
+    """
+    try:
+        method = obj._estimate_nbytes
+    except AttributeError:
+        return nbytes_array_attrs(obj)
+    return int(method())
+
+
+def _make_hashable(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _make_hashable(v)) for k, v in value.items()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(_make_hashable(v) for v in value)
+    hash(value)
+    return value
+
+
+class PlanCache:
+    """LRU cache of SHT objects with a memory budget.
+
+    Parameters
+    ----------
+
+    maxbytes : int
+
+      Memory budget in bytes. Objects larger than the budget are not cached.
+
+    """
+
+    def __init__(self, maxbytes):
+        self.maxbytes = int(maxbytes)
+        self._plans = OrderedDict()
+        self._nbytes = 0
+        self._hits = self._misses = self._evictions = 0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def make_key(method, *args, **kwargs):
+        """Build a hashable key, or return None if arguments are not hashable."""
+        try:
+            return (method, _make_hashable(args), _make_hashable(kwargs))
+        except TypeError:
+            return None
+
+    def get_or_create(self, key, create):
+        """Return the cached object for ``key`` or create and store it."""
+        if key is None or self.maxbytes <= 0:
+            return create()
+
+        with self._lock:
+            try:
+                obj, _ = self._plans[key]
+            except KeyError:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._plans.move_to_end(key)
+                return obj
+
+            obj = create()
+            nbytes = estimate_nbytes(obj)
+            if nbytes <= self.maxbytes:
+                self._plans[key] = (obj, nbytes)
+                self._nbytes += nbytes
+                self._evict()
+            return obj
+
+    def _evict(self):
+        while self._nbytes > self.maxbytes and self._plans:
+            _, (_, nbytes) = self._plans.popitem(last=False)
+            self._nbytes -= nbytes
+            self._evictions += 1
+
+    def clear(self):
+        """Remove all objects from the cache and reset the statistics."""
+        with self._lock:
+            self._plans.clear()
+            self._nbytes = 0
+            self._hits = self._misses = self._evictions = 0
+
+    def info(self):
+        """Return statistics on the cache as a namedtuple."""
+        with self._lock:
+            return CacheInfo(
+                self._hits,
+                self._misses,
+                self._evictions,
+                len(self._plans),
+                self._nbytes,
+                self.maxbytes,
+            )
+
+
+plan_cache = PlanCache(
+    int(os.getenv("FLUIDSHT_PLAN_CACHE_MAXBYTES", 1024**3))
+)
@@ -0,0 +1,341 @@
+"""Benchmarks of the SHT operators (:mod:`fluidsht.bench`)
+=========================================================
+
+Sweep over truncation degrees, grid types, backends, kinds of transforms
+(scalar or vector) and number of fields transformed per call. For each case,
+the forward and inverse transforms are timed after a warmup and repeated
+several times.
+
+The throughput is given in "GFlop-equivalent" per second, computed from the
+conventional operation count of a SHT (FFTs along the longitudes and Legendre
+transforms with a matrix product, see :func:`flop_estimate`). It does not
+depend on the algorithm actually used by the backend and is only meant to
+compare cases and releases.
+
+The results can be saved in JSON or CSV files (depending on the extension)
+to track regressions between releases::
+
+  fluidsht-bench --lmax 31 63 127 --batch-sizes 1 8 -o bench.json
+
+.. autofunction:: bench_case
+
+.. autofunction:: run_benchmarks
+
+.. autofunction:: flop_estimate
+
+"""
+import argparse
+import csv
+from datetime import datetime
+import json
+import platform
+import sys
+from time import perf_counter
+import tracemalloc
+
+import numpy as np
+
+from fluiddyn.calcul.sphericalharmo import compute_nlatnlon
+
+from fluidsht._plan_cache import estimate_nbytes
+from fluidsht._version import __version__
+
+fields_results = (
+    "backend",
+    "grid_type",
+    "lmax",
+    "nlat",
+    "nlon",
+    "kind",
+    "batch_size",
+    "direction",
+    "time_min",
+    "time_median",
+    "time_per_field",
+    "gflops",
+    "memory_peak",
+    "memory_plan",
+)
+
+
+def flop_estimate(nlat, nlon, nlm, kind="scalar"):
+    """Conventional number of floating point operations for one transform.
+
+    A real FFT of size ``nlon`` per latitude (:math:`2.5 n \\log_2 n`) and the
+    Legendre transforms as matrix products (one multiply-add for the real and
+    imaginary parts, per coefficient and per latitude). A vector transform
+    counts twice the FFTs and four times the Legendre transforms.
+
+    """
+    fft = 2.5 * nlon * np.log2(nlon) * nlat
+    legendre = 4.0 * nlm * nlat
+    if kind == "vector":
+        return 2 * fft + 4 * legendre
+    return fft + legendre
+
+
+def _time_function(func, repeat, warmup):
+    for _ in range(warmup):
+        func()
+    times = np.empty(repeat)
+    for irep in range(repeat):
+        t_start = perf_counter()
+        func()
+        times[irep] = perf_counter() - t_start
+    return times
+
+
+def _memory_peak(func):
+    """Peak of memory allocated (and traced by Python) during a call."""
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    else:
+        # Python < 3.9: the peak is only reset by restarting the tracing
+        nframe = tracemalloc.get_traceback_limit()
+        tracemalloc.stop()
+        tracemalloc.start(nframe)
+    memory_start = tracemalloc.get_traced_memory()[0]
+    func()
+    memory_peak = tracemalloc.get_traced_memory()[1] - memory_start
+    if not tracing:
+        tracemalloc.stop()
+    return memory_peak
+
+
+def _make_functions(oper, kind, batch_size):
+    """Return the forward and inverse functions to be timed."""
+    if kind == "scalar":
+        if batch_size == 1:
+            field = oper.create_array_spat_random()
+            field_lm = oper.sht(field)
+            return (
+                lambda: oper.sht_as_arg(field, field_lm),
+                lambda: oper.isht_as_arg(field_lm, field),
+            )
+        fields = np.array(
+            [oper.create_array_spat_random() for _ in range(batch_size)]
+        )
+        fields_lm = oper.sht_batch(fields)
+        return (
+            lambda: oper.sht_batch(fields, fields_lm),
+            lambda: oper.isht_batch(fields_lm, fields),
+        )
+    elif kind == "vector":
+        if batch_size == 1:
+            u = oper.create_array_spat_random()
+            v = oper.create_array_spat_random()
+            uD_lm, uR_lm = oper.vsh_from_vec(u, v)
+            return (
+                lambda: oper.vsh_from_vec(u, v, uD_lm, uR_lm),
+                lambda: oper.vec_from_vsh(uD_lm, uR_lm, u, v),
+            )
+        u, v = (
+            np.array([oper.create_array_spat_random() for _ in range(batch_size)])
+            for _ in range(2)
+        )
+        uD_lm, uR_lm = oper.vsh_from_vec_batch(u, v)
+        return (
+            lambda: oper.vsh_from_vec_batch(u, v, uD_lm, uR_lm),
+            lambda: oper.vec_from_vsh_batch(uD_lm, uR_lm, u, v),
+        )
+    else:
+        raise ValueError(f"Unknown kind of transforms: {kind}")
+
+
+def bench_case(
+    lmax,
+    grid_type="gaussian",
+    backend="default",
+    kind="scalar",
+    batch_size=1,
+    repeat=10,
+    warmup=2,
+):
+    """Benchmark the forward and inverse transforms for one case.
+
+    Returns
+    -------
+
+    A list of two dictionaries (forward and inverse) with the keys listed in
+    ``fields_results``.
+
+    """
+    from fluidsht.sht2d.operators import OperatorsSphereHarmo2D
+
+    nlat, nlon = compute_nlatnlon(lmax)
+    oper = OperatorsSphereHarmo2D(
+        nlat, nlon, lmax=lmax, grid_type=grid_type, sht=backend
+    )
+    flops = batch_size * flop_estimate(oper.nlat, oper.nlon, oper.nlm, kind)
+    results = []
+    for direction, func in zip(
+        ("forward", "inverse"), _make_functions(oper, kind, batch_size)
+    ):
+        times = _time_function(func, repeat, warmup)
+        time_min = times.min()
+        results.append(
+            dict(
+                backend=oper.type_sht,
+                grid_type=grid_type,
+                lmax=lmax,
+                nlat=oper.nlat,
+                nlon=oper.nlon,
+                kind=kind,
+                batch_size=batch_size,
+                direction=direction,
+                time_min=time_min,
+                time_median=np.median(times),
+                time_per_field=time_min / batch_size,
+                gflops=flops / time_min / 1e9,
+                memory_peak=_memory_peak(func),
+                memory_plan=estimate_nbytes(oper.opsht),
+            )
+        )
+    return results
+
+
+def run_benchmarks(
+    lmaxs=(15, 31, 63, 127, 255),
+    grid_types=("gaussian",),
+    backends=("default",),
+    kinds=("scalar", "vector"),
+    batch_sizes=(1,),
+    repeat=10,
+    warmup=2,
+    verbose=True,
+):
+    """Run a sweep of benchmarks (see :func:`bench_case`).
+
+    Cases for which the backend cannot be used are skipped.
+
+    """
+    results = []
+    for backend in backends:
+        for grid_type in grid_types:
+            for lmax in lmaxs:
+                for kind in kinds:
+                    for batch_size in batch_sizes:
+                        try:
+                            results_case = bench_case(
+                                lmax,
+                                grid_type,
+                                backend,
+                                kind,
+                                batch_size,
+                                repeat,
+                                warmup,
+                            )
+                        except (
+                            ImportError,
+                            NotImplementedError,
+                            ValueError,
+                        ) as error:
+                            if verbose:
+                                print(
+                                    f"skip {backend}, {grid_type}, lmax={lmax}, "
+                                    f"{kind}: {error!r}",
+                                    file=sys.stderr,
+                                )
+                            continue
+                        results.extend(results_case)
+                        if verbose:
+                            for result in results_case:
+                                print(format_result(result))
+    return results
+
+
+def format_result(result):
+    """Format a result as a line of text."""
+    return (
+        "{backend:28s} {grid_type:9s} lmax={lmax:<5d} {kind:7s} "
+        "batch={batch_size:<3d} {direction:8s} "
+        "{time_per_field:.3e} s/field {gflops:7.3f} GFlop/s "
+        "mem={memory_peak:.3g} B".format(**result)
+    )
+
+
+def get_metadata():
+    """Information on the environment of the benchmarks."""
+    return dict(
+        fluidsht=__version__,
+        numpy=np.__version__,
+        python=platform.python_version(),
+        machine=platform.machine(),
+        processor=platform.processor(),
+        node=platform.node(),
+        date=datetime.now().isoformat(timespec="seconds"),
+    )
+
+
+def save_results(results, path):
+    """Save the results in a JSON or CSV file (depending on the extension)."""
+    path = str(path)
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=fields_results)
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(path, "w") as file:
+            json.dump(
+                dict(metadata=get_metadata(), results=results),
+                file,
+                indent=2,
+                default=float,
+            )
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        prog="fluidsht-bench", description="Benchmarks of the SHT operators"
+    )
+    parser.add_argument(
+        "--lmax", type=int, nargs="+", default=[15, 31, 63, 127, 255]
+    )
+    parser.add_argument(
+        "--grid-types",
+        nargs="+",
+        default=["gaussian"],
+        choices=["gaussian", "regular"],
+    )
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=["default"],
+        help='e.g. "sht2d.with_shtns"',
+    )
+    parser.add_argument(
+        "--kinds",
+        nargs="+",
+        default=["scalar", "vector"],
+        choices=["scalar", "vector"],
+    )
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument(
+        "-o", "--output", help="path of a .json or .csv file to save the results"
+    )
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+    results = run_benchmarks(
+        args.lmax,
+        args.grid_types,
+        args.backends,
+        args.kinds,
+        args.batch_sizes,
+        args.repeat,
+        args.warmup,
+    )
+    if args.output:
+        save_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
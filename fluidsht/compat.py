@@ -3,3 +3,9 @@ try:
     from functools import cached_property
 except ImportError:
     from cached_property import cached_property
+
+try:
+    # python 3.7+
+    from contextlib import nullcontext
+except ImportError:
+    from contextlib import suppress as nullcontext
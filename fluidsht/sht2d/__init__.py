@@ -7,9 +7,14 @@ number of classes depend on how many SHT libraries are available. The 2D
 classes currently implemented are:
 
 - :class:`fluidsht.sht2d.with_shtns.SHT2DWithSHTns`
+- :class:`fluidsht.sht2d.with_numpy.SHT2DWithNumpy` (pure NumPy, used when
+  SHTns is not available)
+- :class:`fluidsht.sht2d.with_shtools.SHT2DWithSHTOOLS`
 
 To use the SHT classes in real codes, it is simpler and recommended to use the
-class :class:`fluidsht.sht2d.operators.OperatorsSphereHarmo2D`.
+class :class:`fluidsht.sht2d.operators.OperatorsSphereHarmo2D`, or its
+MPI-distributed counterpart
+:class:`fluidsht.sht2d.operators_mpi.OperatorsSphereHarmo2DMPI`.
 
 The classes can be found the following modules:
 
@@ -17,6 +22,12 @@ The classes can be found the following modules:
    :toctree:
 
    with_shtns
+   with_numpy
+   with_shtools
    operators
+   operators_mpi
+   stream
+   regrid
+   checkpoint
 
 """
@@ -0,0 +1,134 @@
+"""Conversions between layouts of spectral arrays
+===============================================
+
+The coefficients are stored packed "m-major" (see
+:mod:`fluidsht.sht2d.with_numpy`). Other codes use other layouts:
+
+- triangular 2D arrays ``tri[l, m]`` (zero for m > l),
+
+- SHTOOLS cubes of real coefficients ``cilm`` of shape ``(2, lmax+1,
+  lmax+1)``, with :math:`C_{lm} = \\sqrt{2} \\Re(a_{lm})` and :math:`S_{lm} =
+  -\\sqrt{2} \\Im(a_{lm})` for m > 0 (same normalization as the complex
+  harmonics),
+
+- real vectors with interleaved real and imaginary parts, which are views of
+  the packed arrays (no copy).
+
+The index maps are computed once per set of coefficients. The conversions of
+arrays of shape ``(..., nlm)`` (e.g. stacks of fields) are done with one
+gather or one scatter, in preallocated outputs if given. For the scatters
+(``triangle_from_sh`` and ``cube_from_sh``), only the positions of the
+coefficients are written in ``out``, which has to be zero elsewhere (as for
+the arrays created by these functions).
+
+"""
+import numpy as np
+
+
+def real_from_sh(a_lm):
+    """Real view ``(..., 2*nlm)`` of complex spectral arrays (real and
+    imaginary parts interleaved).
+
+    """
+    a_lm = np.asarray(a_lm)
+    return a_lm.view(a_lm.real.dtype)
+
+
+def sh_from_real(a_r):
+    """Complex view ``(..., nlm)`` of interleaved real arrays (inverse of
+    :func:`real_from_sh`).
+
+    """
+    a_r = np.asarray(a_r)
+    return a_r.view(np.result_type(a_r.dtype, np.complex64))
+
+
+class LayoutMaps:
+    """Index maps between the packed layout and other layouts.
+
+    Parameters
+    ----------
+
+    l_idx, m_idx : array_like
+
+      Degree and order of the packed coefficients.
+
+    lmax, mmax : {None, int}
+
+      Maximum degree and order of the triangles and cubes (by default, the
+      maximum of ``l_idx`` and ``m_idx``).
+
+    """
+
+    def __init__(self, l_idx, m_idx, lmax=None, mmax=None):
+        l_idx = np.asarray(l_idx)
+        m_idx = np.asarray(m_idx)
+        self.lmax = int(l_idx.max() if lmax is None else lmax)
+        self.mmax = int(m_idx.max() if mmax is None else mmax)
+        self.nlm = l_idx.size
+        self.shape_triangle = (self.lmax + 1, self.mmax + 1)
+        self.shape_cube = (2, self.lmax + 1, self.lmax + 1)
+
+        self.idx_triangle = l_idx * (self.mmax + 1) + m_idx
+        # positions of the interleaved real and imaginary parts in the cubes
+        idx_cos = l_idx * (self.lmax + 1) + m_idx
+        self.idx_cube = np.empty(2 * self.nlm, dtype=np.intp)
+        self.idx_cube[0::2] = idx_cos
+        self.idx_cube[1::2] = idx_cos + (self.lmax + 1) ** 2
+        factors = np.where(m_idx > 0, np.sqrt(2), 1.0)
+        self.factors_cube = np.empty(2 * self.nlm)
+        self.factors_cube[0::2] = factors
+        # no sine coefficients for m == 0
+        self.factors_cube[1::2] = np.where(m_idx > 0, -factors, 0.0)
+        self.inv_factors_cube = np.zeros_like(self.factors_cube)
+        nonzero = self.factors_cube != 0
+        self.inv_factors_cube[nonzero] = 1 / self.factors_cube[nonzero]
+        for array in vars(self).values():
+            if isinstance(array, np.ndarray):
+                array.setflags(write=False)
+
+    def triangle_from_sh(self, a_lm, out=None):
+        """Triangular arrays ``(..., lmax+1, mmax+1)`` from packed arrays."""
+        a_lm = np.asarray(a_lm)
+        if out is None:
+            out = np.zeros(a_lm.shape[:-1] + self.shape_triangle, a_lm.dtype)
+        out_flat = out.reshape(out.shape[:-2] + (-1,))
+        out_flat[..., self.idx_triangle] = a_lm
+        if not np.may_share_memory(out_flat, out):
+            # out is not contiguous
+            out[...] = out_flat.reshape(out.shape)
+        return out
+
+    def sh_from_triangle(self, tri, out=None):
+        """Packed arrays from triangular arrays ``(..., lmax+1, mmax+1)``."""
+        tri = np.asarray(tri)
+        tri_flat = tri.reshape(tri.shape[:-2] + (-1,))
+        return np.take(tri_flat, self.idx_triangle, axis=-1, out=out)
+
+    def cube_from_sh(self, a_lm, out=None, dtype=None):
+        """SHTOOLS cubes ``(..., 2, lmax+1, lmax+1)`` of real coefficients
+        from packed arrays (of real fields).
+
+        """
+        a_r = real_from_sh(np.ascontiguousarray(a_lm))
+        if out is None:
+            out = np.zeros(
+                a_r.shape[:-1] + self.shape_cube, dtype or a_r.dtype
+            )
+        out_flat = out.reshape(out.shape[:-3] + (-1,))
+        out_flat[..., self.idx_cube] = a_r * self.factors_cube
+        if not np.may_share_memory(out_flat, out):
+            out[...] = out_flat.reshape(out.shape)
+        return out
+
+    def sh_from_cube(self, cilm, out=None, dtype=None):
+        """Packed arrays from SHTOOLS cubes ``(..., 2, lmax+1, lmax+1)``."""
+        cilm = np.asarray(cilm)
+        if out is None:
+            dtype = np.result_type(dtype or cilm.dtype, np.complex64)
+            out = np.empty(cilm.shape[:-3] + (self.nlm,), dtype)
+        a_r = real_from_sh(out)
+        cilm_flat = cilm.reshape(cilm.shape[:-3] + (-1,))
+        np.take(cilm_flat, self.idx_cube, axis=-1, out=a_r)
+        a_r *= self.inv_factors_cube
+        return out
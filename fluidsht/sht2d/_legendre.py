@@ -0,0 +1,596 @@
+"""Associated Legendre functions and Legendre transforms with NumPy
+==================================================================
+
+Internal module used by the SHT classes which do not rely on an external SHT
+library. The conventions follow SHTns (with the flags used in
+:mod:`fluidsht.sht2d.with_shtns`):
+
+- spatial arrays of shape ``(nlat, nlon)``, with the south pole first (i.e.
+  increasing :math:`\\cos \\theta`, where :math:`\\theta` is the colatitude);
+
+- spectral arrays packed "m-major": the coefficients for a given m are stored
+  contiguously for l = m, ..., lmax (see :func:`compute_lm_indices`);
+
+- complex spherical harmonics, a real field being represented by the
+  coefficients with m >= 0;
+
+- for vectors, ``v`` is the colatitude component and ``u`` the longitude
+  component.
+
+The Legendre transforms are matrix products (one per order m) applied to stacks
+of fields, so that they are done by BLAS level 3 routines. The complex arrays
+are viewed as real arrays to avoid complex-real products. The transforms are
+done in the precision of the arrays and tables (double or single).
+
+"""
+import numpy as np
+
+from .._plan_cache import nbytes_array_attrs
+from ..compat import cached_property
+
+
+def compute_nodes_weights(nlat, grid_type="gaussian"):
+    """Compute the cosines of the colatitudes and the quadrature weights.
+
+    The nodes are sorted with the south pole first and the weights sum to 2.
+
+    """
+    if grid_type == "gaussian":
+        cos_theta, weights = np.polynomial.legendre.leggauss(nlat)
+    elif grid_type == "regular":
+        # equally spaced colatitudes without the poles and Fejer quadrature
+        theta = np.pi * (np.arange(nlat)[::-1] + 0.5) / nlat
+        cos_theta = np.cos(theta)
+        k = np.arange(1, nlat // 2 + 1)
+        weights = (2.0 / nlat) * (
+            1
+            - 2
+            * (np.cos(2 * np.outer(theta, k)) / (4 * k**2 - 1)).sum(axis=1)
+        )
+    else:
+        raise ValueError(f"Unknown grid_type: {grid_type}")
+    return cos_theta, weights
+
+
+def compute_lm_indices(lmax, ms):
+    """Indices of the coefficients for a set of orders ``ms``.
+
+    Returns
+    -------
+
+    l_idx, m_idx : ndarray
+
+      Degree and order of the packed coefficients.
+
+    slices : list of slice
+
+      Slice of the coefficients of each order.
+
+    """
+    ms = np.asarray(ms, dtype=int)
+    sizes = lmax + 1 - ms
+    starts = np.concatenate(([0], np.cumsum(sizes)))
+    slices = [slice(start, stop) for start, stop in zip(starts, starts[1:])]
+    l_idx = np.concatenate([np.arange(m, lmax + 1) for m in ms])
+    m_idx = np.repeat(ms, sizes)
+    return l_idx, m_idx, slices
+
+
+def norm_factors(l_idx, norm="orthonormal"):
+    """Factors between spherical harmonics for a normalization and orthonormal
+    spherical harmonics.
+
+    """
+    if norm == "orthonormal":
+        return np.ones(len(l_idx))
+    elif norm == "fourpi":
+        return np.full(len(l_idx), np.sqrt(4 * np.pi))
+    elif norm == "schmidt":
+        return np.sqrt(4 * np.pi / (2 * l_idx + 1))
+    else:
+        raise ValueError(f"Unknown normalization: {norm}")
+
+
+def compute_legendre(
+    lmax, ms, cos_theta, norm="orthonormal", cs_phase=False, derivatives=False
+):
+    """Compute the associated Legendre functions for a set of orders.
+
+    Parameters
+    ----------
+
+    lmax : int
+
+    ms : sequence of int
+
+      Orders for which the functions are computed (and stored in this order).
+
+    cos_theta : array_like
+
+      Cosines of the colatitudes.
+
+    derivatives : bool
+
+      If True, also compute :math:`\\partial_\\theta P_l^m` and :math:`m P_l^m
+      / \\sin \\theta`, which are finite at the poles.
+
+    Returns
+    -------
+
+    plm : ndarray of shape ``(nlm, len(cos_theta))``
+
+      Values of the functions in the packed layout of the orders ``ms``.
+
+    dplm, mplm_sin : ndarray (only if ``derivatives``)
+
+    """
+    ms = np.asarray(ms, dtype=int)
+    x = np.asarray(cos_theta, dtype=float)
+    sin_theta = np.sqrt(1.0 - x**2)
+    l_idx, m_idx, slices = compute_lm_indices(lmax, ms)
+    # dP_l0 / dtheta is computed from P_l1
+    mmax = max(ms.max(), 1 if derivatives else 0)
+
+    # row of the coefficient (l=m, m) in the packed layout (-1 if not stored)
+    starts = np.full(mmax + 1, -1)
+    starts[ms] = [slice_m.start for slice_m in slices]
+
+    # P_mm and Q_mm = P_mm / sin(theta)
+    pmm = np.empty((mmax + 1, x.size))
+    qmm = np.zeros((mmax + 1, x.size))
+    pmm[0] = 1 / np.sqrt(4 * np.pi)
+    for m in range(1, mmax + 1):
+        if m == 1:
+            qmm[1] = np.sqrt(1.5) * pmm[0]
+        else:
+            qmm[m] = np.sqrt((2 * m + 1) / (2 * m)) * sin_theta * qmm[m - 1]
+        pmm[m] = sin_theta * qmm[m]
+
+    plm = np.empty((len(l_idx), x.size))
+    qlm = np.empty_like(plm)
+    if derivatives:
+        p_l1 = np.zeros((lmax + 1, x.size))
+
+    # recurrence over l, vectorized over m (same recurrence for P and Q)
+    mm = np.arange(mmax + 1)[:, np.newaxis]
+    p_prev = np.zeros((mmax + 1, x.size))
+    q_prev = np.zeros((mmax + 1, x.size))
+    p_prev2 = p_prev.copy()
+    q_prev2 = q_prev.copy()
+    for l in range(lmax + 1):
+        p_cur = np.empty_like(p_prev)
+        q_cur = np.empty_like(q_prev)
+        nb_m = min(l, mmax + 1)
+        if nb_m:
+            m = mm[:nb_m]
+            a = np.sqrt((4 * l**2 - 1) / (l**2 - m**2))
+            b = np.sqrt(((l - 1) ** 2 - m**2) / (4 * (l - 1) ** 2 - 1))
+            p_cur[:nb_m] = a * (x * p_prev[:nb_m] - b * p_prev2[:nb_m])
+            q_cur[:nb_m] = a * (x * q_prev[:nb_m] - b * q_prev2[:nb_m])
+        if l <= mmax:
+            p_cur[l] = pmm[l]
+            q_cur[l] = qmm[l]
+            p_cur[l + 1 :] = 0.0
+            q_cur[l + 1 :] = 0.0
+        stored = ms[ms <= l]
+        rows = starts[stored] + l - stored
+        plm[rows] = p_cur[stored]
+        qlm[rows] = q_cur[stored]
+        if derivatives and l >= 1:
+            p_l1[l] = p_cur[1]
+        p_prev2, p_prev = p_prev, p_cur
+        q_prev2, q_prev = q_prev, q_cur
+
+    factors = norm_factors(l_idx, norm)[:, np.newaxis]
+    if cs_phase:
+        factors = factors * (-1.0) ** m_idx[:, np.newaxis]
+
+    plm *= factors
+    if not derivatives:
+        return plm
+
+    ll = l_idx[:, np.newaxis]
+    mm = m_idx[:, np.newaxis]
+    c = np.sqrt((2 * ll + 1) * (ll - mm) * (ll + mm) / (2 * ll - 1))
+    q_prev = np.zeros_like(qlm)
+    q_prev[1:] = qlm[:-1]
+    # c == 0 for l == m, i.e. at the start of the blocks
+    dplm = ll * x * qlm - c * q_prev
+    cond = m_idx == 0
+    l0 = l_idx[cond][:, np.newaxis]
+    dplm[cond] = -np.sqrt(l0 * (l0 + 1)) * p_l1[l_idx[cond]]
+    mplm_sin = mm * qlm
+
+    dplm *= factors
+    mplm_sin *= factors
+    return plm, dplm, mplm_sin
+
+
+def _as_real(array):
+    """Real view of a complex array (float32 for complex64)."""
+    return array.view(array.real.dtype)
+
+
+def legendre_analysis(fourier, plm_w, slices, out):
+    """Legendre analysis for each order.
+
+    Parameters
+    ----------
+
+    fourier : complex ndarray of shape ``(nm, nlat, nfields)``
+
+    plm_w : ndarray of shape ``(nlm, nlat)``
+
+      Analysis matrix (Legendre functions times quadrature weights).
+
+    out : complex ndarray of shape ``(nlm, nfields)``
+
+    """
+    fourier = _as_real(np.ascontiguousarray(fourier))
+    out_r = _as_real(out)
+    for im, slice_m in enumerate(slices):
+        np.matmul(plm_w[slice_m], fourier[im], out=out_r[slice_m])
+    return out
+
+
+def legendre_synthesis(coefs, plm, slices, out):
+    """Legendre synthesis for each order.
+
+    Parameters
+    ----------
+
+    coefs : complex ndarray of shape ``(nlm, nfields)``
+
+    plm : ndarray of shape ``(nlm, nlat)``
+
+    out : complex ndarray of shape ``(nm, nlat, nfields)``
+
+    """
+    coefs = _as_real(np.ascontiguousarray(coefs))
+    out_r = _as_real(out)
+    for im, slice_m in enumerate(slices):
+        np.matmul(plm[slice_m].T, coefs[slice_m], out=out_r[im])
+    return out
+
+
+def vector_analysis(fourier_t, fourier_p, dplm_w, mplm_sin_w, slices, sph, tor):
+    """Legendre analysis of the spheroidal / toroidal decomposition.
+
+    ``fourier_t`` and ``fourier_p`` (colatitude and longitude components) have
+    the shape ``(nm, nlat, nfields)``; ``sph`` and ``tor`` the shape ``(nlm,
+    nfields)``. The matrices ``dplm_w`` and ``mplm_sin_w`` include the
+    quadrature weights and the factor :math:`1 / [l(l+1)]`.
+
+    """
+    nm, nlat, nfields = fourier_t.shape
+    stacked = np.empty((nm, nlat, 2, nfields), sph.dtype)
+    stacked[:, :, 0] = fourier_t
+    stacked[:, :, 1] = fourier_p
+    stacked_r = _as_real(stacked).reshape(nm, nlat, 4 * nfields)
+    for im, slice_m in enumerate(slices):
+        derivs = dplm_w[slice_m] @ stacked_r[im]
+        m_over_sin = mplm_sin_w[slice_m] @ stacked_r[im]
+        derivs = derivs.view(sph.dtype).reshape(-1, 2, nfields)
+        m_over_sin = m_over_sin.view(sph.dtype).reshape(-1, 2, nfields)
+        sph[slice_m] = derivs[:, 0] - 1j * m_over_sin[:, 1]
+        tor[slice_m] = -1j * m_over_sin[:, 0] - derivs[:, 1]
+    return sph, tor
+
+
+def vector_synthesis(sph, tor, dplm, mplm_sin, slices, out_t, out_p):
+    """Legendre synthesis of the spheroidal / toroidal decomposition.
+
+    ``sph`` and ``tor`` have the shape ``(nlm, nfields)``; ``out_t`` and
+    ``out_p`` (colatitude and longitude components) the shape ``(nm, nlat,
+    nfields)``. ``sph`` or ``tor`` can be None (no contribution).
+
+    """
+    nlm = dplm.shape[0]
+    nfields = out_t.shape[2]
+    nb_comp = (sph is not None) + (tor is not None)
+    stacked = np.empty((nlm, nb_comp, nfields), out_t.dtype)
+    i_tor = 0
+    if sph is not None:
+        stacked[:, 0] = sph
+        i_tor = 1
+    if tor is not None:
+        stacked[:, i_tor] = tor
+    stacked_r = _as_real(stacked).reshape(nlm, 2 * nb_comp * nfields)
+    for im, slice_m in enumerate(slices):
+        derivs = dplm[slice_m].T @ stacked_r[slice_m]
+        m_over_sin = mplm_sin[slice_m].T @ stacked_r[slice_m]
+        derivs = derivs.view(out_t.dtype).reshape(-1, nb_comp, nfields)
+        m_over_sin = m_over_sin.view(out_t.dtype).reshape(-1, nb_comp, nfields)
+        if sph is not None:
+            out_t[im] = derivs[:, 0]
+            out_p[im] = 1j * m_over_sin[:, 0]
+        else:
+            out_t[im] = 0.0
+            out_p[im] = 0.0
+        if tor is not None:
+            out_t[im] += 1j * m_over_sin[:, i_tor]
+            out_p[im] -= derivs[:, i_tor]
+    return out_t, out_p
+
+
+class LegendreTransforms:
+    """Transforms with FFTs along the longitudes and the Legendre transforms
+    of this module (base class of the SHT classes not relying on an external
+    SHT library).
+
+    The subclasses define the attributes describing the grid and the
+    coefficients (``lmax``, ``nlat``, ``shapeX``, ``nlm``, ``l_idx``,
+    ``l2_idx``, ``radius``, ``norm``, ``cs_phase``, ``dtype`` and
+    ``dtype_complex``), the orders ``_ms`` of the coefficients with their
+    ``_slices``, the nodes ``_cos_theta`` and weights ``_weights`` of the
+    quadrature, and the Fourier transforms along the longitudes:
+
+    - ``_fourier_from_spat(fields)``, from real arrays of shape ``(nfields,
+      nlat, nlon)`` to Fourier coefficients of shape ``(nm, nlat, nfields)``,
+
+    - ``_spat_from_fourier(fourier, fields)``, the inverse.
+
+    They call :func:`_init_scalar_tables` at initialization.
+
+    """
+
+    def _init_scalar_tables(self):
+        self._plm = compute_legendre(
+            self.lmax, self._ms, self._cos_theta, self.norm, self.cs_phase
+        )
+        factors = norm_factors(self.l_idx, self.norm)[:, np.newaxis] ** 2
+        self._plm_w = (self._plm * (self._weights / factors)).astype(self.dtype)
+        self._plm = self._plm.astype(self.dtype, copy=False)
+
+    @cached_property
+    def _vector_tables(self):
+        _, dplm, mplm_sin = compute_legendre(
+            self.lmax,
+            self._ms,
+            self._cos_theta,
+            self.norm,
+            self.cs_phase,
+            derivatives=True,
+        )
+        factors = self._weights / (
+            norm_factors(self.l_idx, self.norm) ** 2 * np.maximum(self.l2_idx, 1)
+        )[:, np.newaxis]
+        factors[self.l2_idx == 0] = 0.0
+        return tuple(
+            table.astype(self.dtype, copy=False)
+            for table in (dplm, mplm_sin, dplm * factors, mplm_sin * factors)
+        )
+
+    def _estimate_nbytes(self):
+        """Memory used by the arrays, including the 4 vector tables even if
+        they are not yet computed.
+
+        """
+        nbytes_vector_tables = 4 * self.nlm * self.nlat * self.dtype.itemsize
+        return nbytes_array_attrs(self) + nbytes_vector_tables
+
+    # creation of arrays
+
+    def create_array_spat(self, value=None):
+        """Create an array representing a field in spatial space."""
+        if value is None:
+            return np.empty(self.shapeX, self.dtype)
+        elif value == "rand":
+            return np.random.randn(*self.shapeX).astype(self.dtype)
+        else:
+            return np.full(self.shapeX, value, self.dtype)
+
+    def create_array_sh(self, value=None, dtype=None):
+        """Create an array representing a field in spectral space."""
+        if dtype is None:
+            dtype = self.dtype_complex
+        if value is None:
+            return np.empty(self.nlm, dtype)
+        elif value == "rand":
+            field_lm = np.random.randn(self.nlm) + 1j * np.random.randn(self.nlm)
+            return field_lm.astype(dtype)
+        else:
+            return np.full(self.nlm, value, dtype)
+
+    def create_array_spat_random(self):
+        return self.create_array_spat("rand")
+
+    def create_array_sh_random(self):
+        return self.create_array_sh("rand")
+
+    def create_array_spat_batch(self, nfields, value=None):
+        """Create a stack of ``nfields`` arrays in spatial space."""
+        if value is None:
+            return np.empty((nfields,) + self.shapeX, self.dtype)
+        return np.full((nfields,) + self.shapeX, value, self.dtype)
+
+    def create_array_sh_batch(self, nfields, value=None, dtype=None):
+        """Create a stack of ``nfields`` arrays in spectral space."""
+        if dtype is None:
+            dtype = self.dtype_complex
+        if value is None:
+            return np.empty((nfields, self.nlm), dtype)
+        return np.full((nfields, self.nlm), value, dtype)
+
+    # scalar transforms
+
+    def sht_batch(self, fields, fields_lm=None):
+        """Forward transforms of a stack of fields of shape ``(nfields, nlat,
+        nlon)`` (``fields_lm`` of shape ``(nfields, nlm)`` is overwritten).
+
+        """
+        if fields_lm is None:
+            fields_lm = self.create_array_sh_batch(len(fields))
+        fourier = self._fourier_from_spat(fields)
+        coefs = np.empty((self.nlm, len(fields)), self.dtype_complex)
+        legendre_analysis(fourier, self._plm_w, self._slices, coefs)
+        fields_lm[:] = coefs.T
+        return fields_lm
+
+    def isht_batch(self, fields_lm, fields=None):
+        """Inverse transforms of a stack of fields of shape ``(nfields, nlm)``
+        (``fields`` of shape ``(nfields, nlat, nlon)`` is overwritten).
+
+        """
+        if fields is None:
+            fields = self.create_array_spat_batch(len(fields_lm))
+        fourier = np.empty(
+            (len(self._ms), self.nlat, len(fields_lm)), self.dtype_complex
+        )
+        legendre_synthesis(fields_lm.T, self._plm, self._slices, fourier)
+        return self._spat_from_fourier(fourier, fields)
+
+    def sht(self, field, field_lm=None):
+        """Forward transform (``field_lm`` is overwritten)."""
+        if field_lm is None:
+            field_lm = self.create_array_sh()
+        self.sht_batch(field[np.newaxis], field_lm[np.newaxis])
+        return field_lm
+
+    def isht(self, field_lm, field=None):
+        """Inverse transform (``field`` is overwritten)."""
+        if field is None:
+            field = self.create_array_spat()
+        self.isht_batch(field_lm[np.newaxis], field[np.newaxis])
+        return field
+
+    sht_as_arg = sht
+    isht_as_arg = isht
+
+    # vector transforms
+
+    def vsh_from_vec_batch(self, u, v, uD_lm=None, uR_lm=None):
+        """Batched version of :func:`vsh_from_vec` for stacks of shape
+        ``(nfields, nlat, nlon)`` (uD_lm and uR_lm are overwritten).
+
+        """
+        nfields = len(u)
+        if uD_lm is None:
+            uD_lm = self.create_array_sh_batch(nfields)
+        if uR_lm is None:
+            uR_lm = self.create_array_sh_batch(nfields)
+        fourier = self._fourier_from_spat(np.concatenate((v, u)))
+        _, _, dplm_w, mplm_sin_w = self._vector_tables
+        sph = np.empty((self.nlm, nfields), self.dtype_complex)
+        tor = np.empty_like(sph)
+        vector_analysis(
+            fourier[..., :nfields],
+            fourier[..., nfields:],
+            dplm_w,
+            mplm_sin_w,
+            self._slices,
+            sph,
+            tor,
+        )
+        uD_lm[:] = sph.T
+        uR_lm[:] = tor.T
+        return uD_lm, uR_lm
+
+    def _vec_from_sphtor_batch(self, sph, tor, u, v):
+        nfields = len(u)
+        dplm, mplm_sin, _, _ = self._vector_tables
+        fourier = np.empty(
+            (len(self._ms), self.nlat, 2 * nfields), self.dtype_complex
+        )
+        vector_synthesis(
+            None if sph is None else sph.T,
+            None if tor is None else tor.T,
+            dplm,
+            mplm_sin,
+            self._slices,
+            fourier[..., :nfields],
+            fourier[..., nfields:],
+        )
+        fields = self._spat_from_fourier(
+            fourier, np.empty((2 * nfields,) + self.shapeX, self.dtype)
+        )
+        v[:] = fields[:nfields]
+        u[:] = fields[nfields:]
+        return u, v
+
+    def vec_from_vsh_batch(self, uD_lm, uR_lm, u=None, v=None):
+        """Batched version of :func:`vec_from_vsh` for stacks of shape
+        ``(nfields, nlm)`` (u and v are overwritten).
+
+        """
+        if u is None:
+            u = self.create_array_spat_batch(len(uD_lm))
+            v = self.create_array_spat_batch(len(uD_lm))
+        return self._vec_from_sphtor_batch(uD_lm, uR_lm, u, v)
+
+    def vec_from_sphsh_batch(self, uD_lm, u=None, v=None):
+        """Batched version of :func:`vec_from_sphsh` for stacks of shape
+        ``(nfields, nlm)`` (u and v are overwritten).
+
+        """
+        if u is None:
+            u = self.create_array_spat_batch(len(uD_lm))
+            v = self.create_array_spat_batch(len(uD_lm))
+        return self._vec_from_sphtor_batch(uD_lm, None, u, v)
+
+    def vsh_from_vec(self, u, v, uD_lm=None, uR_lm=None):
+        """Compute vector spherical harmonics uD_lm, uR_lm from from velocities u,
+        v (uD_lm and uR_lm are overwritten).
+
+        """
+        if uD_lm is None:
+            uD_lm = self.create_array_sh()
+        if uR_lm is None:
+            uR_lm = self.create_array_sh()
+        self.vsh_from_vec_batch(
+            u[np.newaxis], v[np.newaxis], uD_lm[np.newaxis], uR_lm[np.newaxis]
+        )
+        return uD_lm, uR_lm
+
+    def vec_from_vsh(self, uD_lm, uR_lm, u=None, v=None):
+        """Compute velocities u, v from vector spherical harmonics uD, uR (u and v
+        are overwritten).
+
+        """
+        if u is None:
+            u = self.create_array_spat()
+            v = self.create_array_spat()
+        self.vec_from_vsh_batch(
+            uD_lm[np.newaxis], uR_lm[np.newaxis], u[np.newaxis], v[np.newaxis]
+        )
+        return u, v
+
+    def vec_from_sphsh(self, uD_lm, u=None, v=None):
+        """Compute velocities u, v from the spheroidal (divergent) part uD
+        alone (u and v are overwritten).
+
+        """
+        if u is None:
+            u = self.create_array_spat()
+            v = self.create_array_spat()
+        self._vec_from_sphtor_batch(
+            uD_lm[np.newaxis], None, u[np.newaxis], v[np.newaxis]
+        )
+        return u, v
+
+    def vec_from_torsh(self, uR_lm, u=None, v=None):
+        """Compute velocities u, v from the toroidal (rotational) part uR
+        alone (u and v are overwritten).
+
+        """
+        if u is None:
+            u = self.create_array_spat()
+            v = self.create_array_spat()
+        self._vec_from_sphtor_batch(
+            None, uR_lm[np.newaxis], u[np.newaxis], v[np.newaxis]
+        )
+        return u, v
+
+    def gradf_from_fsh(self, f_lm, gradf_lon=None, gradf_lat=None):
+        """Compute the gradient of a function f from its spherical
+        harmonic coeff f_lm (gradf_lon and gradf_lat are overwritten)
+
+        """
+        if gradf_lon is None:
+            gradf_lon = self.create_array_spat()
+            gradf_lat = self.create_array_spat()
+        self.vec_from_sphsh(f_lm, gradf_lon, gradf_lat)
+        if self.radius != 1:
+            gradf_lon /= self.radius
+            gradf_lat /= self.radius
+        return gradf_lon, gradf_lat
@@ -0,0 +1,170 @@
+"""Instrumentation of the operators
+=================================
+
+The methods of an operator are replaced by wrappers counting the calls, the
+cumulative time and the memory allocated for the results (arrays returned by
+the methods which are not arguments, i.e. calls without ``out`` arguments).
+The times are inclusive (a method calling other methods also counts their
+time), and the self times exclude the time spent in the other profiled
+methods. The percentages of the reports are computed from the self times, so
+that the time of nested calls is not counted twice.
+
+The wrappers are instance attributes, so that the methods of the class (and
+the methods forwarded from the SHT object) are restored when the profiling is
+disabled and that there is no overhead without profiling.
+
+"""
+from functools import wraps
+import json
+import threading
+from time import perf_counter
+
+import numpy as np
+
+fields_timings = ("ncalls", "time", "nbytes", "self_time")
+
+# per thread, time spent in the profiled methods called by the methods being
+# executed (one item per level of nesting)
+_calls = threading.local()
+
+
+def _iter_arrays(obj):
+    if isinstance(obj, np.ndarray):
+        yield obj
+    elif isinstance(obj, (tuple, list)):
+        for item in obj:
+            if isinstance(item, np.ndarray):
+                yield item
+
+
+def _nbytes_allocated(result, args):
+    inputs = [arr for arg in args for arr in _iter_arrays(arg)]
+    return sum(
+        arr.nbytes
+        for arr in _iter_arrays(result)
+        if not any(np.may_share_memory(arr, arg) for arg in inputs)
+    )
+
+
+class Profiler:
+    """Collect the timings of the methods of an object.
+
+    Parameters
+    ----------
+
+    stats : dict
+
+      Dictionary ``{name: [ncalls, time, nbytes, self_time]}`` updated by
+      the wrappers.
+
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self._originals = {}
+        self._lock = threading.Lock()
+
+    def _wrap(self, name, method):
+        stats = self.stats
+        lock = self._lock
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            try:
+                times_children = _calls.times_children
+            except AttributeError:
+                times_children = _calls.times_children = []
+            times_children.append(0.0)
+            t_start = perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                duration = perf_counter() - t_start
+                time_children = times_children.pop()
+                if times_children:
+                    times_children[-1] += duration
+            nbytes = _nbytes_allocated(result, args + tuple(kwargs.values()))
+            with lock:
+                try:
+                    values = stats[name]
+                except KeyError:
+                    values = stats[name] = [0, 0.0, 0, 0.0]
+                values[0] += 1
+                values[1] += duration
+                values[2] += nbytes
+                values[3] += duration - time_children
+            return result
+
+        wrapper._profiled = True
+        return wrapper
+
+    def instrument(self, obj, names):
+        """Replace the methods ``names`` of ``obj`` by wrappers."""
+        attrs = vars(obj)
+        for name in names:
+            method = attrs.get(name)
+            if method is None:
+                try:
+                    method = getattr(type(obj), name)
+                except AttributeError:
+                    continue
+                # method of the class (removed in restore)
+                self._originals[name] = None
+                method = method.__get__(obj)
+            elif getattr(method, "_profiled", False):
+                continue
+            else:
+                # instance attribute (e.g. forwarded from the SHT object)
+                self._originals[name] = method
+            attrs[name] = self._wrap(name, method)
+
+    def restore(self, obj):
+        """Restore the original methods of ``obj``."""
+        attrs = vars(obj)
+        for name, original in self._originals.items():
+            if original is None:
+                attrs.pop(name, None)
+            else:
+                attrs[name] = original
+        self._originals.clear()
+
+
+def get_timings(stats):
+    """Timings as a dictionary ``{name: {"ncalls": ..., "time": ..., "nbytes":
+    ..., "self_time": ...}}``."""
+    return {
+        name: dict(zip(fields_timings, values))
+        for name, values in sorted(stats.items())
+    }
+
+
+def format_timings(stats):
+    """Format the timings as a table sorted by cumulative time (percentages
+    of the total time computed from the self times).
+
+    """
+    # total time spent in the profiled methods (nested calls counted once)
+    total = sum(values[3] for values in stats.values()) or 1.0
+    lines = [
+        f"{'method':32s} {'ncalls':>8s} {'time (s)':>10s} "
+        f"{'per call':>10s} {'self (s)':>10s} {'%':>6s} {'allocated':>10s}"
+    ]
+    for name, (ncalls, time, nbytes, self_time) in sorted(
+        stats.items(), key=lambda item: item[1][1], reverse=True
+    ):
+        lines.append(
+            f"{name:32s} {ncalls:8d} {time:10.3e} {time / ncalls:10.3e} "
+            f"{self_time:10.3e} {100 * self_time / total:6.1f} "
+            f"{nbytes / 1e6:8.3f}MB"
+        )
+    return "\n".join(lines)
+
+
+def save_timings(stats, path, metadata=None):
+    """Save the timings in a JSON file."""
+    with open(path, "w") as file:
+        json.dump(
+            dict(metadata=metadata or {}, timings=get_timings(stats)),
+            file,
+            indent=2,
+        )
@@ -0,0 +1,139 @@
+"""Shared tables of spectral coefficients
+=======================================
+
+Arrays depending only on the truncation (``lmax``, ``mmax``, ``mres``) and on
+the radius, such as the indices of the coefficients and the powers of
+:math:`K^2 = l(l+1)/r^2`. They are computed once and shared (read-only) by the
+operators with the same parameters.
+
+The registry only keeps weak references to the tables, so that the memory of
+a table is released when no operator uses it anymore.
+
+"""
+from collections import namedtuple
+import threading
+from weakref import WeakValueDictionary
+
+import numpy as np
+
+from ..compat import cached_property
+from ._layouts import LayoutMaps
+from ._legendre import compute_lm_indices
+
+TablesInfo = namedtuple("TablesInfo", ("nb_tables", "nbytes"))
+
+_registry = WeakValueDictionary()
+_lock = threading.Lock()
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+class SpectralTables:
+    """Read-only arrays for a set of coefficients.
+
+    Parameters
+    ----------
+
+    l_idx, m_idx : array_like
+
+      Degree and order of the coefficients.
+
+    radius : float
+
+    lmax, mmax : {None, int}
+
+      Maximum degree and order of the truncation (by default, the maximum of
+      ``l_idx`` and ``m_idx``), used for the conversions between layouts.
+
+    """
+
+    def __init__(self, l_idx, m_idx, radius=1.0, lmax=None, mmax=None):
+        self.radius = float(radius)
+        self.l_idx = _read_only(np.array(l_idx, dtype=int))
+        self.m_idx = _read_only(np.array(m_idx, dtype=int))
+        self._lmax = lmax
+        self._mmax = mmax
+
+        l2_idx = self.l_idx * (self.l_idx + 1)
+        K2 = l2_idx / self.radius**2
+        K2_not0 = K2.copy()
+        K2_not0[l2_idx == 0] = 1e-15
+        inv_K2_not0 = 1.0 / K2_not0
+        inv_K2_not0[l2_idx == 0] = 0.0
+
+        self.l2_idx = _read_only(l2_idx)
+        self.K2 = _read_only(K2)
+        self.K2_not0 = _read_only(K2_not0)
+        self.inv_K2_not0 = _read_only(inv_K2_not0)
+        self.K2_r = _read_only(l2_idx / self.radius)
+        self.inv_K2_r = _read_only(inv_K2_not0 / self.radius)
+        self.where_l2_idx_positive = _read_only(l2_idx > 0)
+
+        self._powers_K2 = {1: self.K2}
+        self._lock = threading.Lock()
+
+    def K2_power(self, n):
+        """Return :math:`K^{2n}` (e.g. for hyperviscosity), computed once."""
+        with self._lock:
+            try:
+                return self._powers_K2[n]
+            except KeyError:
+                power = self._powers_K2[n] = _read_only(self.K2**n)
+                return power
+
+    @cached_property
+    def layouts(self):
+        """Index maps between the packed layout and other layouts (see
+        :class:`fluidsht.sht2d._layouts.LayoutMaps`).
+
+        """
+        return LayoutMaps(self.l_idx, self.m_idx, self._lmax, self._mmax)
+
+    @property
+    def K4(self):
+        return self.K2_power(2)
+
+    @property
+    def K8(self):
+        return self.K2_power(4)
+
+    @property
+    def nbytes(self):
+        """Memory used by the arrays."""
+        # K2 is also stored in the powers
+        arrays = {
+            id(value): value
+            for value in (*vars(self).values(), *self._powers_K2.values())
+            if isinstance(value, np.ndarray)
+        }
+        return sum(array.nbytes for array in arrays.values())
+
+
+def get_spectral_tables(lmax, mmax=None, mres=1, radius=1.0):
+    """Return the tables for a triangular (or rhomboidal if ``mmax < lmax``)
+    truncation, shared with the other users of the same parameters.
+
+    """
+    if mmax is None:
+        mmax = lmax
+    key = (int(lmax), int(mmax), int(mres), float(radius))
+    with _lock:
+        try:
+            return _registry[key]
+        except KeyError:
+            pass
+        l_idx, m_idx, _ = compute_lm_indices(lmax, mres * np.arange(mmax + 1))
+        tables = _registry[key] = SpectralTables(
+            l_idx, m_idx, radius, lmax, mres * mmax
+        )
+        return tables
+
+
+def tables_info():
+    """Number of shared tables and memory used by them."""
+    with _lock:
+        tables = list(_registry.values())
+    return TablesInfo(len(tables), sum(table.nbytes for table in tables))
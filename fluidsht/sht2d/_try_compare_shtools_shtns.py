@@ -1,37 +1,35 @@
 from fluidsht.sht2d.operators import OperatorsSphereHarmo2D
-from fluidsht.sht2d._try_with_shtools import SHT2DWithSHTOOLS
-from time import time
+from time import perf_counter
 
 lmax = 15
 nlat = lmax + 1
 nlon = 2 * lmax + 1
 
 oper = OperatorsSphereHarmo2D(nlat, nlon, lmax)
-optools = SHT2DWithSHTOOLS(nlat, nlon, lmax)
+optools = OperatorsSphereHarmo2D(nlat, nlon, lmax, sht="sht2d.with_shtools")
 
 spat = oper.create_array_spat_random()
 print("shapeX =", oper.shapeX)
 print("shapeK =", oper.shapeK)
-print("l_idx.shape=", oper.opsht.l_idx.shape, "= \n", oper.opsht.l_idx)
-
-# print("zeros=\n", optools._grid_coeffs[0])
-# print("weights=\n", optools._grid_coeffs[1])
+print("l_idx.shape=", oper.l_idx.shape, "= \n", oper.l_idx)
 
 print("-----------")
 print("spat max =", spat.max(), "sum =", spat.sum())
 
-tstart = time()
+tstart = perf_counter()
 sh_ns = oper.sht(spat)
 spat_ns = oper.isht(sh_ns)
-tend = time()
-print("Time taken for sht and isht by shtns =", tend - tstart)
+tend = perf_counter()
+print(f"Time taken for sht and isht by {oper.type_sht} =", tend - tstart)
 
-tstart = time()
+tstart = perf_counter()
 sh_tools = optools.sht(spat)
 spat_tools = optools.isht(sh_tools)
-tend = time()
-print("Time taken for sht and isht by shtools=", tend - tstart)
+tend = perf_counter()
+print("Time taken for sht and isht by shtools =", tend - tstart)
 
 print()
-print("spat by shtns max =", spat_ns.max(), "sum =", spat_ns.sum())
-print("spat by shttools max =", spat_tools.max(), "sum =", spat_tools.sum())
+print("spat by", oper.type_sht, "max =", spat_ns.max(), "sum =", spat_ns.sum())
+print("spat by shtools max =", spat_tools.max(), "sum =", spat_tools.sum())
+print("max difference sh =", abs(sh_ns - sh_tools).max())
+print("(see fluidsht-bench for proper benchmarks)")
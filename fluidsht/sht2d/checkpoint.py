@@ -0,0 +1,236 @@
+"""Checkpoint files of spectral arrays (:mod:`fluidsht.sht2d.checkpoint`)
+=======================================================================
+
+Spectral arrays are saved without loss of precision in a simple
+self-describing binary format:
+
+- the magic string ``b"FLUIDSHT"``,
+
+- the length of the header (little-endian unsigned 32-bit integer),
+
+- the header, a JSON dictionary with the truncation (``lmax``, ``mmax`` and
+  ``mres`` as in SHTns), the normalization (``norm`` and ``cs_phase``), the
+  radius, the data type and, for each entry, its name (null for a single
+  array), its shape and the offset of its data in bytes from the start of the
+  data (padded with spaces so that the data is aligned on 64 bytes),
+
+- the coefficients of the entries in the packed layout (see
+  :mod:`fluidsht.sht2d.with_numpy`), stored contiguously entry by entry
+  (little-endian).
+
+The data can be loaded lazily with memory-mapping. When loaded by an operator
+with another truncation or normalization (for example to restart a simulation
+at a higher resolution), the coefficients are truncated or padded with zeros
+and converted.
+
+.. code-block:: python
+
+    oper.save_sh("state.sht", {"rot": rot_lm, "div": div_lm})
+    state = oper_fine.load_sh("state.sht", mmap_mode="r")
+
+.. autofunction:: save_sh
+
+.. autofunction:: read_header
+
+.. autofunction:: load_sh
+
+"""
+import json
+import os
+
+import numpy as np
+
+from ._legendre import norm_factors
+
+MAGIC = b"FLUIDSHT"
+VERSION = 1
+ALIGNMENT = 64
+
+
+def _nlm(lmax, mmax, mres):
+    ms = mres * np.arange(mmax + 1)
+    return int((lmax + 1 - ms).sum())
+
+
+def save_sh(
+    path,
+    fields_lm,
+    lmax,
+    mmax=None,
+    mres=1,
+    norm="orthonormal",
+    cs_phase=False,
+    radius=1.0,
+):
+    """Save spectral arrays.
+
+    Parameters
+    ----------
+
+    path : str or path-like
+
+    fields_lm : array or dict
+
+      Spectral array of shape ``(nlm,)``, stack of arrays of shape
+      ``(nfields, nlm)`` or dictionary of named arrays of shape ``(..., nlm)``
+      (possibly different).
+
+    lmax, mmax, mres, norm, cs_phase, radius :
+
+      Parameters of the truncation (as in SHTns) and of the normalization.
+
+    """
+    if mmax is None:
+        mmax = lmax
+    if isinstance(fields_lm, dict):
+        names = list(fields_lm)
+        arrays = [np.asarray(a_lm) for a_lm in fields_lm.values()]
+    else:
+        names = [None]
+        arrays = [np.asarray(fields_lm)]
+    dtype = np.result_type(*arrays, np.complex64).newbyteorder("<")
+    nlm = _nlm(lmax, mmax, mres)
+    if any(array.shape[-1:] != (nlm,) for array in arrays):
+        raise ValueError(f"Spectral arrays with nlm != {nlm}")
+
+    entries = []
+    offset = 0
+    for name, array in zip(names, arrays):
+        entries.append(dict(name=name, shape=list(array.shape), offset=offset))
+        offset += array.size * dtype.itemsize
+
+    header = dict(
+        version=VERSION,
+        lmax=int(lmax),
+        mmax=int(mmax),
+        mres=int(mres),
+        norm=norm or "orthonormal",
+        cs_phase=bool(cs_phase),
+        radius=float(radius),
+        dtype=dtype.str,
+        entries=entries,
+    )
+    header = json.dumps(header).encode()
+    start = len(MAGIC) + 4
+    padding = -(start + len(header)) % ALIGNMENT
+    header += b" " * padding
+
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        file.write(np.array(len(header), "<u4").tobytes())
+        file.write(header)
+        for array in arrays:
+            np.ascontiguousarray(array, dtype=dtype).tofile(file)
+
+
+def read_header(path):
+    """Read the header of a file (with the offset of the data)."""
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a fluidsht checkpoint file")
+        size = int(np.frombuffer(file.read(4), "<u4")[0])
+        header = json.loads(file.read(size).decode())
+    if header["version"] > VERSION:
+        raise ValueError(
+            f"Unsupported version of the format: {header['version']}"
+        )
+    header["offset"] = len(MAGIC) + 4 + size
+    return header
+
+
+def _read_data(path, header, mmap_mode):
+    """Read (or memory-map) the arrays of the entries."""
+    dtype = np.dtype(header["dtype"])
+    arrays = []
+    for entry in header["entries"]:
+        shape = tuple(entry["shape"])
+        offset = header["offset"] + entry["offset"]
+        if mmap_mode is not None and np.prod(shape):
+            array = np.memmap(
+                path, dtype, mode=mmap_mode, offset=offset, shape=shape
+            )
+        elif mmap_mode is not None:
+            array = np.empty(shape, dtype)
+        else:
+            with open(path, "rb") as file:
+                file.seek(offset)
+                array = np.fromfile(file, dtype, count=int(np.prod(shape)))
+            array = array.reshape(shape)
+        arrays.append(array)
+    return arrays
+
+
+def _as_fields(arrays, header):
+    names = [entry["name"] for entry in header["entries"]]
+    if names == [None]:
+        return arrays[0]
+    return dict(zip(names, arrays))
+
+
+def _convert(data, header, oper):
+    """Truncate / pad and convert the coefficients for an operator."""
+    params = oper._params_sh()
+    lmax, mmax, mres = (header[key] for key in ("lmax", "mmax", "mres"))
+    l_idx, m_idx = oper.l_idx, oper.m_idx
+    # position of the coefficients of the operator in the file
+    valid = (
+        (l_idx <= lmax) & (m_idx % mres == 0) & (m_idx // mres <= mmax)
+    )
+    k = m_idx // mres
+    positions = k * (lmax + 1) - mres * k * (k - 1) // 2 + l_idx - m_idx
+
+    same_layout = valid.all() and np.array_equal(
+        positions, np.arange(data.shape[-1])
+    )
+    same_norm = all(
+        header[key] == params[key] for key in ("norm", "cs_phase")
+    )
+    if same_layout and same_norm and data.dtype == oper.dtype_complex:
+        return data
+
+    result = np.zeros(data.shape[:-1] + (len(l_idx),), oper.dtype_complex)
+    if same_layout:
+        result[:] = data
+    else:
+        # one gather (only the needed coefficients are read)
+        result[..., valid] = data[..., positions[valid]]
+    if not same_norm:
+        factors = norm_factors(l_idx, header["norm"]) / norm_factors(
+            l_idx, params["norm"]
+        )
+        if header["cs_phase"] != params["cs_phase"]:
+            factors *= (-1.0) ** m_idx
+        result *= factors
+    return result
+
+
+def load_sh(path, oper=None, mmap_mode=None):
+    """Load spectral arrays.
+
+    Parameters
+    ----------
+
+    path : str or path-like
+
+    oper : {None, OperatorsSphereHarmo2D}
+
+      If given, the coefficients are truncated or padded with zeros and
+      converted to the truncation and the normalization of the operator (no
+      copy if they are the same).
+
+    mmap_mode : {None, "r", "r+", "c"}
+
+      If not None, the data is memory-mapped (see :func:`numpy.memmap`).
+
+    Returns
+    -------
+
+    Array or dictionary of arrays (as given to :func:`save_sh`).
+
+    """
+    path = os.fspath(path)
+    header = read_header(path)
+    arrays = _read_data(path, header, mmap_mode)
+    if oper is not None:
+        arrays = [_convert(data, header, oper) for data in arrays]
+    return _as_fields(arrays, header)
@@ -6,39 +6,193 @@
    :undoc-members:
 
 """
-from contextlib import suppress
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, suppress
+from importlib.util import find_spec
+from itertools import repeat
+import logging
 import os
+import threading
 import numpy as np
-from transonic import boost
+from transonic import Array, Type, boost
+from transonic.typing import Optional
 from .. import create_sht_object
 from ..compat import cached_property
+from ..util import get_nthreads
+from . import _layouts, _profiling
+from ._legendre import (
+    compute_legendre,
+    compute_lm_indices,
+    legendre_synthesis,
+    norm_factors,
+    vector_synthesis,
+)
+from ._spectral_tables import get_spectral_tables
 
 
+logger = logging.getLogger(__name__)
+
 SKIP_SHTNS = os.getenv("SKIP_SHTNS")
+# instrumentation of the operators (see OperatorsSphereHarmo2D.profile)
+PROFILE = os.getenv("FLUIDSHT_PROFILE")
 
 
 Af = "float64[:]"
-Ac = "complex128[:]"
-Ac_optional = "complex128[:] or None"
+# double or single precision (see the argument dtype of the operators)
+Tc = Type(np.complex128, np.complex64)
+Ac = Array[Tc, "1d"]
+Ac_optional = Optional[Ac]
 
 
 def get_simple_2d_method() -> str:
     """Easily select an available SHT library. Used by the operators class when
     ``sht="default"`` is specified.
 
+    SHTns is used if it is installed (and the environment variable
+    ``SKIP_SHTNS`` is not set), otherwise the pure NumPy backend.
+
     """
-    try:
-        if SKIP_SHTNS:
-            raise ImportError
+    if not SKIP_SHTNS and find_spec("shtns") is not None:
+        return "sht2d.with_shtns"
+    return "sht2d.with_numpy"
+
+
+_executor = None
+_lock_executor = threading.Lock()
+
 
-        import shtns
+def get_default_executor():
+    """Thread pool shared by the operators (see
+    :func:`OperatorsSphereHarmo2D.submit`).
 
-        sht = "sht2d.with_shtns"
-    except ImportError:
-        # sht = "sht2d.with_shtools"
-        raise NotImplementedError
+    The pool is created at the first call, with one thread per CPU core
+    available for the process.
 
-    return sht
+    """
+    global _executor
+    with _lock_executor:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                get_nthreads("auto"), thread_name_prefix="fluidsht"
+            )
+        return _executor
+
+
+def _create_operator(cls, kwargs):
+    """Recreate an operator when unpickling (see ``__reduce__``)."""
+    return cls(**kwargs)
+
+
+def _as_key(value):
+    """Cheap hashable key of a parameter given as a number or an array."""
+    if value is None:
+        return None
+    if value.ndim == 0:
+        return value.item()
+    return value.shape, value.dtype.str, hash(value.tobytes())
+
+
+# attributes and methods forwarded from the SHT object
+_attrs_from_opsht = (
+    "nlat",
+    "nlon",
+    "lats",
+    "lons",
+    "LATS",
+    "LONS",
+    "deltax",
+    "deltay",  # FIXME: deltay
+    "shapeX",
+    "shapeX_loc",
+    "shapeX_seq",
+    "shapeK",
+    "shapeK_loc",
+    "shapeK_seq",
+    "nlm",
+    "radius",
+    "_zeros_sh",
+)
+
+# read-only arrays shared between operators (see _spectral_tables.py)
+_attrs_from_tables = (
+    "l_idx",
+    "m_idx",
+    "l2_idx",  # l(l+1)
+    "K2",
+    "K4",
+    "K8",
+    "K2_not0",
+    "inv_K2_not0",
+    "K2_r",
+    "inv_K2_r",
+    "where_l2_idx_positive",
+)
+
+_methods_from_opsht = (
+    # Initialization methods
+    "create_array_spat",
+    "create_array_spat_random",
+    "create_array_sh",
+    "create_array_sh_random",
+    "create_array_spat_batch",
+    "create_array_sh_batch",
+    # Generic transformations
+    "sht",
+    "isht",
+    "sht_as_arg",
+    "isht_as_arg",
+    # Batched transformations on stacks of fields
+    "sht_batch",
+    "isht_batch",
+    # Velocity vector <-> Spherical Harmonics transformations methods
+    "vec_from_vsh",
+    "vsh_from_vec",
+    "vec_from_vsh_batch",
+    "vsh_from_vec_batch",
+    # Velocity from only one part of the VSH decomposition
+    "vec_from_sphsh",
+    "vec_from_torsh",
+    "vec_from_sphsh_batch",
+    # Gradient
+    "gradf_from_fsh",
+    # Post-processing
+    "sum_wavenumbers",
+    # Informational
+    "produce_str_describing_oper",
+    "produce_long_str_describing_oper",
+)
+
+# methods instrumented by the profiler (with the forwarded methods)
+_methods_profiled = (
+    "laplacian_sh",
+    "invlaplacian_sh",
+    "divrotsh_from_vsh",
+    "vsh_from_divrotsh",
+    "uDsh_from_divsh",
+    "uRsh_from_rotsh",
+    "vec_from_divrotsh",
+    "vec_from_rotsh",
+    "vec_from_divsh",
+    "divrotsh_from_vec",
+    "dealiasing",
+    "nonlinear_product_sh",
+    "advection_sh",
+    "advection_divrotsh",
+    "apply_integrating_factor",
+    "eval_at_points",
+    "eval_vec_at_points",
+    "spectrum_l",
+    "energy_spectrum_from_vsh",
+    "enstrophy_spectrum",
+)
+
+# names triggering the creation of the SHT object
+_names_from_opsht = frozenset(
+    _attrs_from_opsht
+    + _attrs_from_tables
+    + _methods_from_opsht
+    + ("opsht", "type_sht", "x_seq", "y_seq", "spectral_tables")
+)
 
 
 @boost
@@ -80,8 +234,44 @@ class OperatorsSphereHarmo2D:
       module of fluidsht. The first part "fluidsht." of the module "path" can be
       omitted.
 
+    wisdom_dir: str, optional
+
+      Directory where tuned configurations of the SHT library are saved and
+      loaded (see :mod:`fluidsht.wisdom`). Default to the environment variable
+      ``FLUIDSHT_WISDOM_DIR``.
+
+    nthreads: {None, int, "auto"}
+
+      Number of threads used by the transforms. If None, the default of the SHT
+      library. If "auto", computed from the CPU affinity mask of the process.
+      See also :func:`set_nthreads` and :func:`use_nthreads`.
+
+    dtype: {"float64", "float32"}
+
+      Precision of the arrays: float64 / complex128 (default) or float32 /
+      complex64 for the spatial / spectral arrays. With backends computing only
+      in double precision (SHTns on CPUs, SHTOOLS), the arrays are cast before
+      and after the transforms.
+
+    coef_dealiasing: float
+
+      The coefficients with ``l > coef_dealiasing * lmax`` are set to zero by
+      :func:`dealiasing` (default 2/3).
+
     Notes
     -----
+    The SHT object ``opsht`` (import of the SHT library and initialization of
+    the transforms) is only created when one of its attributes or methods is
+    used for the first time, so that creating an operator is cheap.
+
+    The arrays depending only on the truncation and the radius (``l_idx``,
+    ``m_idx``, ``K2``, ``K4``, ``inv_K2_r``, ...) are read-only and shared
+    with the other operators with the same parameters (see
+    :func:`fluidsht.spectral_tables_info` and :func:`K2_power`).
+
+    The calls of the methods can be counted and timed (see :func:`profile` and
+    the environment variable ``FLUIDSHT_PROFILE``).
+
     Some of the class attributes and their equivalent mathematical definitions
 
     .. math::
@@ -109,24 +299,50 @@ class OperatorsSphereHarmo2D:
         grid_type="gaussian",
         radius=1,
         sht=None,
+        wisdom_dir=None,
+        nthreads=None,
+        dtype="float64",
+        coef_dealiasing=2 / 3,
     ):
+        # to recreate the operator (see __reduce__)
+        self._init_kwargs = dict(
+            nlat=nlat,
+            nlon=nlon,
+            lmax=lmax,
+            norm=norm,
+            cs_phase=cs_phase,
+            grid_type=grid_type,
+            radius=radius,
+            sht=sht,
+            wisdom_dir=wisdom_dir,
+            nthreads=nthreads,
+            dtype=dtype,
+            coef_dealiasing=coef_dealiasing,
+        )
         if sht is None or sht == "default":
             sht = get_simple_2d_method()
 
+        kwargs_sht = dict(
+            n0=nlat,
+            n1=nlon,
+            lmax=lmax,
+            norm=norm,
+            cs_phase=False,
+            grid_type=grid_type,
+            radius=radius,
+        )
+        if wisdom_dir is not None:
+            kwargs_sht["wisdom_dir"] = wisdom_dir
+        if nthreads is not None:
+            nthreads = get_nthreads(nthreads)
+        dtype = np.dtype(dtype)
+        if dtype not in (np.float64, np.float32):
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        if dtype != np.float64:
+            kwargs_sht["dtype"] = dtype.name
+
         if isinstance(sht, str):
-            if any([sht.startswith(s) for s in ["fluidsht.", "sht2d."]]):
-                opsht = create_sht_object(
-                    sht,
-                    nlat,
-                    nlon,
-                    lmax=lmax,
-                    norm=norm,
-                    cs_phase=False,
-                    grid_type=grid_type,
-                    radius=radius,
-                )
-                print(f"{sht}: nlat={opsht.nlat}, nlon={opsht.nlon}")
-            else:
+            if not any([sht.startswith(s) for s in ["fluidsht.", "sht2d."]]):
                 raise ValueError(
                     (
                         "Cannot instantiate %s. Expected something like "
@@ -136,89 +352,134 @@ class OperatorsSphereHarmo2D:
                     % sht
                 )
 
-        self.opsht = opsht
-        self.type_sht = opsht.__class__.__module__
+        # the SHT object is created at the first use of one of its attributes
+        # (see __getattr__)
+        self.nthreads = nthreads
+        # limit of threads applied by the SHT object (see _set_opsht)
+        self._threads_limiter = None
+        self._sht = sht
+        self._kwargs_sht = kwargs_sht
+        # work arrays (one set per thread, see _get_buffer)
+        self._buffers = threading.local()
+        # see get_integrating_factor
+        self._integrating_factors = {}
+        self._dt_integrating_factors = None
+
+        self.lmax = lmax
+        self.norm = norm
+        self.cs_phase = cs_phase
+        self.grid_type = grid_type
+        self.dtype = dtype
+        self.dtype_complex = np.result_type(dtype, np.complex64)
+        self.coef_dealiasing = coef_dealiasing
+        self._init_profiling()
+
+    def __getattr__(self, name):
+        # only called when the attribute is not found
+        if name in _names_from_opsht and "opsht" not in self.__dict__:
+            self._init_opsht()
+            return getattr(self, name)
+        raise AttributeError(
+            f"{type(self).__name__!r} object has no attribute {name!r}"
+        )
 
-        for attr in (
-            "nlat",
-            "nlon",
-            "lats",
-            "lons",
-            "LATS",
-            "LONS",
-            "deltax",
-            "deltay",  # FIXME: deltay
-            "shapeX",
-            "shapeX_loc",
-            "shapeX_seq",
-            "shapeK",
-            "shapeK_loc",
-            "shapeK_seq",
-            "nlm",
-            "l2_idx",  # l(l+1)
-            "radius",
-            "K2",
-            "K4",
-            "K8",
-            "K2_not0",
-            "_zeros_sh",
-        ):
+    def __reduce__(self):
+        """Pickle only the parameters of the operator.
+
+        The operator is recreated (cheaply, see the notes of the class) from
+        the parameters given to the constructor, for example in the workers of
+        a :class:`concurrent.futures.ProcessPoolExecutor`. The SHT object is
+        then taken from the cache of the process (see
+        :func:`fluidsht.plan_cache_info`), so that it is created only once per
+        worker. The state of the operator (number of threads changed with
+        :func:`set_nthreads`, profiling, cached integrating factors, ...) is
+        not transferred.
+
+        """
+        return (_create_operator, (type(self), self._init_kwargs))
+
+    def _init_opsht(self):
+        """Create the SHT object (costly: import of the library and plan)."""
+        opsht = create_sht_object(
+            self._sht, nthreads=self.nthreads, **self._kwargs_sht
+        )
+        logger.info("%s: nlat=%s, nlon=%s", self._sht, opsht.nlat, opsht.nlon)
+        self._set_opsht(opsht, self.nthreads)
+
+    def _copy_from_opsht(self):
+        """Copies attributes and transform methods from ``opsht`` instance."""
+        for attr in _attrs_from_opsht + _methods_from_opsht:
             self.copyattr(attr)
 
         # for fluidsim plotting
         self.x_seq = self.lons
         self.y_seq = self.lats
 
-        self.lmax = lmax
-        self.norm = norm
-        self.cs_phase = cs_phase
-        self.grid_type = grid_type
+        if self._profiler is not None:
+            # the forwarded methods have been replaced
+            self._profiler.instrument(self, _methods_from_opsht)
 
-        for method in (
-            # Initialization methods
-            "create_array_spat",
-            "create_array_spat_random",
-            "create_array_sh",
-            "create_array_sh_random",
-            # Generic transformations
-            "sht",
-            "isht",
-            "sht_as_arg",
-            "isht_as_arg",
-            # Velocity vector <-> Spherical Harmonics transformations methods
-            "vec_from_vsh",
-            "vsh_from_vec",
-            # Gradient
-            "gradf_from_fsh",
-            # Misc.
-            "dealiasing",  # FIXME: Implement properly
-            # Post-processing
-            "sum_wavenumbers",
-            # Informational
-            "produce_str_describing_oper",
-            "produce_long_str_describing_oper",
-        ):
-            self.copyattr(method)
+        opsht = self.opsht
+        mres = getattr(opsht, "mres", 1)
+        self._set_spectral_tables(
+            get_spectral_tables(
+                self.lmax, opsht.m_idx.max() // mres, mres, self.radius
+            )
+        )
 
-    @cached_property
-    def inv_K2_not0(self):
-        inv_K2_not0 = 1.0 / self.K2_not0
-        inv_K2_not0[self.l2_idx == 0] = 0.0
-        return inv_K2_not0
+    def _set_spectral_tables(self, tables):
+        """Use read-only arrays shared with the other operators."""
+        self.spectral_tables = tables
+        for attr in _attrs_from_tables:
+            setattr(self, attr, getattr(tables, attr))
 
-    @cached_property
-    def K2_r(self):
-        r"""Compute :math:`r \Delta = [l(l+1)] / r`"""
-        return self.l2_idx / self.radius
+    def K2_power(self, n):
+        r"""Return :math:`K^{2n} = [l(l+1)/r^2]^n` (read-only array shared
+        between the operators, e.g. for hyperviscosity).
 
-    @cached_property
-    def inv_K2_r(self):
-        r"""Compute :math:`(r \Delta)^{-1} = r / [l(l+1)]`"""
-        return self.inv_K2_not0 / self.radius
+        """
+        return self.spectral_tables.K2_power(n)
 
     @cached_property
-    def where_l2_idx_positive(self):
-        return self.l2_idx > 0
+    def _weights_spectra(self):
+        """Weights of the squared coefficients in the spectra.
+
+        The coefficients with m > 0 are counted twice (for -m and m) and the
+        factors of the normalization are included, so that the spectra sum to
+        the mean over the sphere.
+
+        """
+        weights = np.where(self.m_idx == 0, 1.0, 2.0)
+        weights *= norm_factors(self.l_idx, self.norm or "orthonormal") ** 2
+        return weights / (4 * np.pi)
+
+    def _get_buffer(self, name, space="sh", nfields=None):
+        """Return a work array used internally by the operators.
+
+        The array is allocated at the first call and then reused, so that its
+        content is only valid until the next call of a method using the same
+        buffer. Each thread has its own work arrays, so that the methods can
+        be called concurrently (see :func:`submit`). If ``nfields`` is given,
+        the buffer is a stack of ``nfields`` arrays.
+
+        """
+        buffers = self._buffers.__dict__
+        try:
+            return buffers[name]
+        except KeyError:
+            if space == "sh":
+                if nfields is None:
+                    buffer = self.create_array_sh()
+                else:
+                    buffer = self.create_array_sh_batch(nfields)
+            elif space == "spat_padded":
+                buffer = self.opsht_padded.create_array_spat()
+            elif nfields is None:
+                buffer = self.create_array_spat()
+            else:
+                buffer = self.create_array_spat_batch(nfields)
+            buffers[name] = buffer
+            return buffer
 
     def copyattr(self, attr):
         """Copies attributes / methods from ``opsht`` instance."""
@@ -227,9 +488,186 @@ class OperatorsSphereHarmo2D:
         with suppress(AttributeError):
             setattr(self, attr, getattr(self.opsht, attr))
 
-    @boost
-    def laplacian_sh(self, a_lm: Ac, negative: bool = False):
-        r"""Compute the Laplacian, :math:`\nabla^{n} a^{lm}`
+    def set_nthreads(self, nthreads):
+        """Change the number of threads used by the transforms.
+
+        The SHT object is replaced by an equivalent object using ``nthreads``
+        threads (shared through the cache of :func:`fluidsht.create_sht_object`
+        so that switching back and forth is cheap).
+
+        Parameters
+        ----------
+
+        nthreads : int or "auto"
+
+        """
+        nthreads = get_nthreads(nthreads)
+        if nthreads == self.nthreads:
+            return
+        if "opsht" not in self.__dict__:
+            # the SHT object will be created with nthreads threads
+            self.nthreads = nthreads
+            return
+        self._set_opsht(
+            create_sht_object(self._sht, nthreads=nthreads, **self._kwargs_sht),
+            nthreads,
+        )
+
+    @contextmanager
+    def use_nthreads(self, nthreads):
+        """Context manager to temporarily change the number of threads.
+
+        .. code-block:: python
+
+            with oper.use_nthreads(4):
+                field_lm = oper.sht(field)
+
+        """
+        opsht, nthreads_old = self.opsht, self.nthreads
+        self.set_nthreads(nthreads)
+        try:
+            yield self
+        finally:
+            if self.opsht is not opsht:
+                # process-wide limits (e.g. BLAS threads for NumPy)
+                if self._threads_limiter is not None:
+                    self._threads_limiter.restore_original_limits()
+                self._set_opsht(opsht, nthreads_old)
+
+    def submit(self, method, *args, executor=None):
+        """Schedule the call of a method in a pool of threads.
+
+        The transforms of SHTns (and the matrix products of the NumPy backend)
+        release the GIL, so that independent transforms can run concurrently.
+        To avoid oversubscription, the operator should then use one thread per
+        transform (``nthreads=1``).
+
+        Parameters
+        ----------
+
+        method : str or callable
+
+          Name of a method of the operator (for example ``"sht"``) or any
+          callable.
+
+        args :
+
+          Arguments of the method.
+
+        executor : {None, concurrent.futures.Executor}
+
+          Default to the thread pool of :func:`get_default_executor`.
+
+        Returns
+        -------
+
+        A :class:`concurrent.futures.Future` (which can be awaited in a
+        coroutine with ``await asyncio.wrap_future(future)``).
+
+        """
+        if isinstance(method, str):
+            method = getattr(self, method)
+        # create the SHT object in the calling thread
+        self.opsht
+        if executor is None:
+            executor = get_default_executor()
+        return executor.submit(method, *args)
+
+    def submit_sht(self, field, field_lm=None, executor=None):
+        """Schedule a forward transform (see :func:`submit`)."""
+        return self.submit("sht", field, field_lm, executor=executor)
+
+    def submit_isht(self, field_lm, field=None, executor=None):
+        """Schedule an inverse transform (see :func:`submit`)."""
+        return self.submit("isht", field_lm, field, executor=executor)
+
+    def submit_divrotsh_from_vec(
+        self, u, v, div_lm=None, rot_lm=None, executor=None
+    ):
+        """Schedule a call of :func:`divrotsh_from_vec` (see :func:`submit`)."""
+        return self.submit(
+            "divrotsh_from_vec", u, v, div_lm, rot_lm, executor=executor
+        )
+
+    def submit_vec_from_divrotsh(
+        self, div_lm, rot_lm, u=None, v=None, executor=None
+    ):
+        """Schedule a call of :func:`vec_from_divrotsh` (see :func:`submit`)."""
+        return self.submit(
+            "vec_from_divrotsh", div_lm, rot_lm, u, v, executor=executor
+        )
+
+    def _map(self, method, sequences, executor):
+        futures = [
+            self.submit(method, *args, executor=executor)
+            for args in zip(*sequences)
+        ]
+        return [future.result() for future in futures]
+
+    def map_sht(self, fields, fields_lm=None, executor=None):
+        """Forward transforms of independent fields computed concurrently.
+
+        Parameters
+        ----------
+
+        fields : sequence of arrays
+
+        fields_lm : {None, sequence of arrays}
+
+          Output arrays (overwritten).
+
+        executor : {None, concurrent.futures.Executor}
+
+          See :func:`submit`.
+
+        Returns
+        -------
+
+        The list of the spectral arrays.
+
+        """
+        if fields_lm is None:
+            fields_lm = repeat(None)
+        return self._map("sht", (fields, fields_lm), executor)
+
+    def map_isht(self, fields_lm, fields=None, executor=None):
+        """Inverse transforms of independent fields computed concurrently (see
+        :func:`map_sht`).
+
+        """
+        if fields is None:
+            fields = repeat(None)
+        return self._map("isht", (fields_lm, fields), executor)
+
+    def map_divrotsh_from_vec(self, us, vs, executor=None):
+        """Divergence and curl of independent velocity fields computed
+        concurrently (list of tuples ``(div_lm, rot_lm)``).
+
+        """
+        return self._map("divrotsh_from_vec", (us, vs), executor)
+
+    def map_vec_from_divrotsh(self, divs_lm, rots_lm, executor=None):
+        """Velocities from independent divergence and curl fields computed
+        concurrently (list of tuples ``(u, v)``).
+
+        """
+        return self._map("vec_from_divrotsh", (divs_lm, rots_lm), executor)
+
+    def _set_opsht(self, opsht, nthreads):
+        # the padded SHT object has to be recreated (see opsht_padded)
+        self.__dict__.pop("opsht_padded", None)
+        self.opsht = opsht
+        self.type_sht = opsht.__class__.__module__
+        self.nthreads = nthreads
+        self._copy_from_opsht()
+        # the SHT objects using other libraries (e.g. BLAS for NumPy) limit
+        # their threads when they are used by the operator
+        limit_threads = getattr(opsht, "limit_threads", None)
+        if limit_threads is not None:
+            self._threads_limiter = limit_threads()
+
+    def laplacian_sh(self, a_lm, negative=False, out=None):
+        r"""Compute the Laplacian, :math:`\nabla^{2} a^{lm}`
 
         Parameters
         ----------
@@ -238,15 +676,20 @@ class OperatorsSphereHarmo2D:
         negative: bool, optional
             Negative of the result.
 
+        out: ndarray, optional
+            Array where the result is stored (can be ``a_lm``).
+
         """
-        if negative:
-            return self.K2 * a_lm
-        else:
-            return -self.K2 * a_lm
+        if out is None:
+            out = np.empty_like(a_lm)
+        # ufuncs with out: no temporary array
+        np.multiply(a_lm, self.K2, out=out)
+        if not negative:
+            np.negative(out, out=out)
+        return out
 
-    @boost
-    def invlaplacian_sh(self, a_lm: Ac, negative: bool = False):
-        r"""Compute the Laplacian, :math:`\nabla^{n} a^{lm}`
+    def invlaplacian_sh(self, a_lm, negative=False, out=None):
+        r"""Compute the inverse Laplacian, :math:`\nabla^{-2} a^{lm}`
 
         Parameters
         ----------
@@ -255,11 +698,16 @@ class OperatorsSphereHarmo2D:
         negative: bool, optional
             Negative of the result.
 
+        out: ndarray, optional
+            Array where the result is stored (can be ``a_lm``).
+
         """
-        if negative:
-            return self.inv_K2_not0 * a_lm
-        else:
-            return -self.inv_K2_not0 * a_lm
+        if out is None:
+            out = np.empty_like(a_lm)
+        np.multiply(a_lm, self.inv_K2_not0, out=out)
+        if not negative:
+            np.negative(out, out=out)
+        return out
 
     @boost
     def divrotsh_from_vsh(
@@ -275,11 +723,11 @@ class OperatorsSphereHarmo2D:
         """
         if div_lm is None:
             # div_lm = self.create_array_sh()
-            div_lm = np.empty(self.nlm, complex)
+            div_lm = np.empty_like(uD_lm)
 
         if rot_lm is None:
             # rot_lm = self.create_array_sh()
-            rot_lm = np.empty(self.nlm, complex)
+            rot_lm = np.empty_like(uR_lm)
 
         div_lm[:] = -self.K2_r * uD_lm
         rot_lm[:] = self.K2_r * uR_lm
@@ -299,16 +747,38 @@ class OperatorsSphereHarmo2D:
         """
         if uD_lm is None:
             # uD_lm = self.create_array_sh()
-            uD_lm = np.empty(self.nlm, complex)
+            uD_lm = np.empty_like(div_lm)
 
         if uR_lm is None:
             # uR_lm = self.create_array_sh()
-            uR_lm = np.empty(self.nlm, complex)
+            uR_lm = np.empty_like(rot_lm)
 
         uD_lm[:] = -div_lm * self.inv_K2_r
         uR_lm[:] = rot_lm * self.inv_K2_r
         return uD_lm, uR_lm
 
+    @boost
+    def uDsh_from_divsh(self, div_lm: Ac, uD_lm: Ac_optional = None):
+        """Compute the spheroidal VSH from the divergence ``div_lm`` alone
+        (``uD_lm`` is overwritten).
+
+        """
+        if uD_lm is None:
+            uD_lm = np.empty_like(div_lm)
+        uD_lm[:] = -div_lm * self.inv_K2_r
+        return uD_lm
+
+    @boost
+    def uRsh_from_rotsh(self, rot_lm: Ac, uR_lm: Ac_optional = None):
+        """Compute the toroidal VSH from the curl ``rot_lm`` alone (``uR_lm`` is
+        overwritten).
+
+        """
+        if uR_lm is None:
+            uR_lm = np.empty_like(rot_lm)
+        uR_lm[:] = rot_lm * self.inv_K2_r
+        return uR_lm
+
     def vec_from_divrotsh(self, div_lm, rot_lm, u=None, v=None):
         """Velocities u, v from horizontal divergence, and vertical vorticity
         (u and v are overwritten).
@@ -319,22 +789,41 @@ class OperatorsSphereHarmo2D:
         if v is None:
             v = self.create_array_spat()
 
-        uD_lm, uR_lm = self.vsh_from_divrotsh(div_lm, rot_lm)
+        # one pass on the coefficients to compute the two VSH
+        uD_lm, uR_lm = self.vsh_from_divrotsh(
+            div_lm, rot_lm, self._get_buffer("uD_lm"), self._get_buffer("uR_lm")
+        )
         return self.vec_from_vsh(uD_lm, uR_lm, u, v)
 
     def vec_from_rotsh(self, rot_sh, u=None, v=None):
         """Velocities u, v from vertical vorticity alone (u and v are
         overwritten).
 
+        Only the toroidal part is transformed (no transform of a zero
+        divergence).
+
         """
-        return self.vec_from_divrotsh(self._zeros_sh, rot_sh, u, v)
+        if u is None:
+            u = self.create_array_spat()
+        if v is None:
+            v = self.create_array_spat()
+        uR_lm = self.uRsh_from_rotsh(rot_sh, self._get_buffer("uR_lm"))
+        return self.vec_from_torsh(uR_lm, u, v)
 
     def vec_from_divsh(self, div_sh, u=None, v=None):
         """Velocities u, v from horizontal divergence alone (u and v are
         overwritten).
 
+        Only the spheroidal part is transformed (no transform of a zero
+        curl).
+
         """
-        return self.vec_from_divrotsh(div_sh, self._zeros_sh, u, v)
+        if u is None:
+            u = self.create_array_spat()
+        if v is None:
+            v = self.create_array_spat()
+        uD_lm = self.uDsh_from_divsh(div_sh, self._get_buffer("uD_lm"))
+        return self.vec_from_sphsh(uD_lm, u, v)
 
     def divrotsh_from_vec(self, u, v, div_lm=None, rot_lm=None):
         """Compute horizontal divergence, and vertical vorticity from u, v
@@ -354,3 +843,631 @@ class OperatorsSphereHarmo2D:
         return self.divrotsh_from_vsh(
             uD_lm, uR_lm, div_lm, rot_lm  # Inputs  # Buffers to be overwritten
         )
+
+    # profiling
+
+    def _init_profiling(self):
+        self._timings = {}
+        self._profiler = None
+        if PROFILE:
+            self.enable_profiling()
+
+    def enable_profiling(self):
+        """Count the calls, the cumulative time and the memory allocated for
+        the results of the methods (also enabled by the environment variable
+        ``FLUIDSHT_PROFILE``).
+
+        Without profiling, the methods are not wrapped (no overhead).
+
+        """
+        if self._profiler is not None:
+            return
+        self._profiler = _profiling.Profiler(self._timings)
+        names = _methods_profiled
+        if "opsht" in self.__dict__:
+            names = _methods_from_opsht + names
+        # the forwarded methods are instrumented when opsht is created
+        self._profiler.instrument(self, names)
+
+    def disable_profiling(self):
+        """Restore the original methods (the timings are kept)."""
+        if self._profiler is None:
+            return
+        self._profiler.restore(self)
+        self._profiler = None
+
+    @contextmanager
+    def profile(self):
+        """Context manager to profile a block of code.
+
+        .. code-block:: python
+
+            with oper.profile():
+                for it in range(10):
+                    field_lm = oper.sht(field)
+            print(oper.timings_report())
+
+        """
+        enabled = self._profiler is not None
+        self.enable_profiling()
+        try:
+            yield self
+        finally:
+            if not enabled:
+                self.disable_profiling()
+
+    def reset_timings(self):
+        """Remove the timings collected so far."""
+        self._timings.clear()
+
+    def get_timings(self):
+        """Timings per method: ``{name: {"ncalls": ..., "time": ..., "nbytes":
+        ..., "self_time": ...}}`` (inclusive times and times excluding the
+        other profiled methods in seconds, memory allocated for the results in
+        bytes).
+
+        """
+        return _profiling.get_timings(self._timings)
+
+    def timings_report(self):
+        """Return a table of the timings sorted by cumulative time."""
+        return _profiling.format_timings(self._timings)
+
+    def save_timings(self, path):
+        """Save the timings in a JSON file."""
+        _profiling.save_timings(
+            self._timings,
+            path,
+            dict(operator=type(self).__name__, lmax=self.lmax),
+        )
+
+    # dealiasing and nonlinear terms
+
+    @cached_property
+    def where_dealiased(self):
+        """Boolean mask of the coefficients removed by :func:`dealiasing`."""
+        return self.l_idx > self.coef_dealiasing * self.lmax
+
+    @cached_property
+    def _idx_dealiased(self):
+        return np.flatnonzero(self.where_dealiased)
+
+    def dealiasing(self, *arrays_lm):
+        """Set to zero (in place) the coefficients with ``l > coef_dealiasing *
+        lmax`` (2/3 rule by default).
+
+        The arrays can also be stacks of shape ``(..., nlm)``. Returns the
+        array (or the tuple of arrays).
+
+        """
+        for a_lm in arrays_lm:
+            a_lm[..., self._idx_dealiased] = 0.0
+        if len(arrays_lm) == 1:
+            return arrays_lm[0]
+        return arrays_lm
+
+    def _nlatnlon_padded(self):
+        """Dimensions of a grid fine enough to compute the products of two
+        fields without aliasing (3/2 rule).
+
+        """
+        if self.grid_type == "regular":
+            nlat = max(self.nlat, 3 * self.lmax + 2)
+            nlon = max(self.nlon, 3 * self.lmax + 1)
+        else:
+            # fluiddyn is only imported when the padded grid is needed
+            from fluiddyn.calcul.sphericalharmo import compute_nlatnlon
+
+            nlat, nlon = compute_nlatnlon(self.lmax)
+            # same kind of grid (SHTOOLS needs nlon == 2*nlat - 1)
+            if self.nlon == 2 * self.nlat - 1:
+                nlon -= 1
+        return nlat, nlon
+
+    @cached_property
+    def opsht_padded(self):
+        """SHT object on a grid fine enough to compute the products of two
+        fields without aliasing (3/2 rule), with the same truncation.
+
+        """
+        nlat, nlon = self._nlatnlon_padded()
+        if nlat <= self.nlat and nlon <= self.nlon:
+            return self.opsht
+        # shared through the cache of SHT objects
+        return create_sht_object(
+            self._sht,
+            nthreads=self.nthreads,
+            **dict(self._kwargs_sht, n0=nlat, n1=nlon),
+        )
+
+    def nonlinear_product_sh(self, a_lm, b_lm, out=None):
+        """Spectral coefficients of the product of two fields, computed
+        without aliasing (``out`` is overwritten).
+
+        The fields are synthesized on the grid of :attr:`opsht_padded`,
+        multiplied and analysed back with the truncation of the operator.
+
+        """
+        if out is None:
+            out = self.create_array_sh()
+        opsht = self.opsht_padded
+        a = opsht.isht(a_lm, self._get_buffer("a_padded", "spat_padded"))
+        b = opsht.isht(b_lm, self._get_buffer("b_padded", "spat_padded"))
+        a *= b
+        return opsht.sht(a, out)
+
+    def _gradients_batch(self, name, nfields):
+        """Work arrays for the batched syntheses of the advection terms."""
+        return (
+            self._get_buffer(name + "_lm", "sh", nfields),
+            self._get_buffer(name + "_lon", "spat", nfields),
+            self._get_buffer(name + "_colat", "spat", nfields),
+        )
+
+    def advection_sh(self, rot_lm, q_lm, out=None):
+        r"""Advection of a scalar q by a non-divergent flow, :math:`\mathbf{u}
+        \cdot \nabla q`, from the curl of the flow (``out`` is overwritten).
+
+        The velocity is expressed with the gradient of the toroidal VSH
+        (stream function), so that the gradients of the two fields are
+        computed with one batched spheroidal synthesis. The products are
+        computed in place in work arrays.
+
+        """
+        if out is None:
+            out = self.create_array_sh()
+        sph_lm, grad_lon, grad_colat = self._gradients_batch("advection", 2)
+        self.uRsh_from_rotsh(rot_lm, sph_lm[0])
+        sph_lm[1] = q_lm
+        self.vec_from_sphsh_batch(sph_lm, grad_lon, grad_colat)
+        # toroidal velocity: (u_lon, u_colat) = (-grad_colat, grad_lon)
+        result = grad_lon[0]
+        result *= grad_colat[1]
+        grad_colat[0] *= grad_lon[1]
+        result -= grad_colat[0]
+        if self.radius != 1:
+            result /= self.radius
+        return self.sht(result, out)
+
+    def advection_divrotsh(self, div_lm, rot_lm, q_lm, out=None):
+        r"""Advection of a scalar q by a divergent flow, :math:`\mathbf{u}
+        \cdot \nabla q`, from the divergence and the curl of the flow
+        (``out`` is overwritten). See :func:`advection_sh`.
+
+        """
+        if out is None:
+            out = self.create_array_sh()
+        sph_lm, grad_lon, grad_colat = self._gradients_batch("advection_div", 3)
+        self.uRsh_from_rotsh(rot_lm, sph_lm[0])
+        self.uDsh_from_divsh(div_lm, sph_lm[1])
+        sph_lm[2] = q_lm
+        self.vec_from_sphsh_batch(sph_lm, grad_lon, grad_colat)
+        # velocity (toroidal + spheroidal parts)
+        u_lon = grad_lon[1]
+        u_lon -= grad_colat[0]
+        u_colat = grad_colat[1]
+        u_colat += grad_lon[0]
+        u_lon *= grad_lon[2]
+        u_colat *= grad_colat[2]
+        u_lon += u_colat
+        if self.radius != 1:
+            u_lon /= self.radius
+        return self.sht(u_lon, out)
+
+    # dissipation
+
+    def spectral_filter(self, filter_exp=None, ltrunc=None):
+        r"""Compute the factors of a spectral filter.
+
+        Parameters
+        ----------
+
+        filter_exp : {None, (float, float)}
+
+          Exponential filter :math:`\exp[-\alpha (l / l_{max})^p]` given as
+          the tuple ``(alpha, p)``.
+
+        ltrunc : {None, int}
+
+          Hard truncation: coefficients with ``l > ltrunc`` are set to 0.
+
+        """
+        factor = np.ones(self.l_idx.shape)
+        if filter_exp is not None:
+            alpha, power = filter_exp
+            factor *= np.exp(-alpha * (self.l_idx / self.lmax) ** power)
+        if ltrunc is not None:
+            factor[self.l_idx > ltrunc] = 0.0
+        return factor
+
+    def get_integrating_factor(
+        self, nu, dt, order=1, filter_exp=None, ltrunc=None
+    ):
+        r"""Return the integrating factor :math:`\exp(-\nu K^{2n} dt)` of a
+        (hyper)viscous term, possibly multiplied by a spectral filter (see
+        :func:`spectral_filter`).
+
+        The factors are cached (read-only arrays). The cache is emptied when
+        the time step changes, so that only the factors for the current time
+        step are kept.
+
+        Parameters
+        ----------
+
+        nu : float or array
+
+          Viscosity (possibly one value per coefficient).
+
+        dt : float
+
+          Time step.
+
+        order : int
+
+          Order n of the dissipation (1 for viscosity, > 1 for
+          hyperviscosity).
+
+        filter_exp, ltrunc :
+
+          See :func:`spectral_filter`.
+
+        """
+        # nu and filter_exp can be arrays or lists (not hashable)
+        nu = np.asarray(nu)
+        if filter_exp is not None:
+            filter_exp = np.asarray(filter_exp)
+        key = (_as_key(nu), order, _as_key(filter_exp), ltrunc)
+        if dt != self._dt_integrating_factors:
+            self._integrating_factors.clear()
+            self._dt_integrating_factors = dt
+        try:
+            return self._integrating_factors[key]
+        except KeyError:
+            pass
+        factor = np.exp(-nu * dt * self.K2_power(order))
+        if filter_exp is not None or ltrunc is not None:
+            factor *= self.spectral_filter(filter_exp, ltrunc)
+        # same precision as the spectral arrays (no upcast)
+        factor = factor.astype(self.dtype)
+        factor.setflags(write=False)
+        self._integrating_factors[key] = factor
+        return factor
+
+    def apply_integrating_factor(
+        self, arrays_lm, nu, dt, order=1, filter_exp=None, ltrunc=None
+    ):
+        """Multiply in place spectral arrays by an integrating factor (see
+        :func:`get_integrating_factor`).
+
+        Parameters
+        ----------
+
+        arrays_lm : array of shape ``(..., nlm)`` or sequence of arrays
+
+          Spectral arrays (overwritten). A stack of arrays is multiplied in
+          one operation.
+
+        Returns
+        -------
+
+        ``arrays_lm``
+
+        """
+        factor = self.get_integrating_factor(nu, dt, order, filter_exp, ltrunc)
+        if isinstance(arrays_lm, np.ndarray):
+            arrays_lm *= factor
+        else:
+            for a_lm in arrays_lm:
+                a_lm *= factor
+        return arrays_lm
+
+    # layouts of the spectral arrays (see _layouts.py)
+
+    def triangle_from_sh(self, a_lm, out=None):
+        """Convert spectral arrays of shape ``(..., nlm)`` to triangular arrays
+        ``tri[..., l, m]`` of shape ``(..., lmax+1, mmax+1)``.
+
+        Only the coefficients with m <= l are written in ``out`` (which has to
+        be zero elsewhere).
+
+        """
+        return self.spectral_tables.layouts.triangle_from_sh(a_lm, out)
+
+    def sh_from_triangle(self, tri, out=None):
+        """Convert triangular arrays (see :func:`triangle_from_sh`) to
+        spectral arrays (``out`` is overwritten).
+
+        """
+        return self.spectral_tables.layouts.sh_from_triangle(tri, out)
+
+    def cube_from_sh(self, a_lm, out=None, dtype=None):
+        """Convert spectral arrays of real fields to SHTOOLS cubes of real
+        coefficients of shape ``(..., 2, lmax+1, lmax+1)``.
+
+        Only the coefficients with m <= l are written in ``out`` (which has to
+        be zero elsewhere).
+
+        """
+        return self.spectral_tables.layouts.cube_from_sh(a_lm, out, dtype)
+
+    def sh_from_cube(self, cilm, out=None, dtype=None):
+        """Convert SHTOOLS cubes (see :func:`cube_from_sh`) to spectral arrays
+        (``out`` is overwritten).
+
+        """
+        return self.spectral_tables.layouts.sh_from_cube(cilm, out, dtype)
+
+    @staticmethod
+    def real_from_sh(a_lm):
+        """Real view of shape ``(..., 2*nlm)`` of spectral arrays (real and
+        imaginary parts interleaved, no copy).
+
+        """
+        return _layouts.real_from_sh(a_lm)
+
+    @staticmethod
+    def sh_from_real(a_r):
+        """Spectral view of real arrays of shape ``(..., 2*nlm)`` (inverse of
+        :func:`real_from_sh`, no copy).
+
+        """
+        return _layouts.sh_from_real(a_r)
+
+    # checkpoints (see checkpoint.py)
+
+    def _params_sh(self):
+        """Parameters describing the spectral coefficients."""
+        mres = getattr(self.opsht, "mres", 1)
+        return dict(
+            lmax=self.lmax,
+            mmax=int(self.m_idx.max()) // mres,
+            mres=mres,
+            norm=self.norm or "orthonormal",
+            cs_phase=self._kwargs_sht["cs_phase"],
+        )
+
+    def save_sh(self, path, fields_lm):
+        """Save spectral arrays in a checkpoint file.
+
+        Parameters
+        ----------
+
+        path : str or path-like
+
+        fields_lm : array or dict
+
+          Spectral array, stack of arrays of shape ``(nfields, nlm)`` or
+          dictionary of named arrays (e.g. the state of a simulation).
+
+        See :mod:`fluidsht.sht2d.checkpoint`.
+
+        """
+        from .checkpoint import save_sh
+
+        save_sh(path, fields_lm, radius=self.radius, **self._params_sh())
+
+    def load_sh(self, path, mmap_mode=None):
+        """Load spectral arrays saved by :func:`save_sh`.
+
+        The coefficients are truncated or padded with zeros if the file was
+        saved with another truncation (and converted if saved with another
+        normalization). Otherwise, the data is not copied, so that it is
+        loaded lazily with ``mmap_mode="r"``.
+
+        Returns
+        -------
+
+        Array or dictionary of arrays (as given to :func:`save_sh`).
+
+        """
+        from .checkpoint import load_sh
+
+        return load_sh(path, self, mmap_mode)
+
+    # evaluation at arbitrary points
+
+    @cached_property
+    def _orders_points(self):
+        """Orders of the (local) coefficients, slices of the orders in the
+        packed layout and weights of the orders for real fields.
+
+        """
+        ms = np.unique(self.m_idx)
+        _, _, slices = compute_lm_indices(self.lmax, ms)
+        weights = np.where(self.m_idx == 0, 1.0, 2.0)[:, np.newaxis]
+        return ms, slices, weights
+
+    def _legendre_points(self, cos_theta, derivatives=False):
+        ms = self._orders_points[0]
+        return compute_legendre(
+            self.lmax,
+            ms,
+            cos_theta,
+            self.norm or "orthonormal",
+            self._kwargs_sht["cs_phase"],
+            derivatives,
+        )
+
+    def _reduce_points(self, values):
+        return values
+
+    def _eval_points(self, arrays_lm, lats, lons, degrees, vector):
+        """Values at points of spectral arrays (or stacks of arrays).
+
+        The Legendre functions are computed for blocks of unique latitudes
+        and the Fourier series are summed for chunks of points with the
+        Horner scheme (the orders form an arithmetic progression), so that
+        the memory used does not depend on the number of points.
+
+        """
+        ms, slices, weights = self._orders_points
+        arrays_lm = [np.asarray(a_lm) for a_lm in arrays_lm]
+        ndim = arrays_lm[0].ndim
+        # coefficients of shape (nlm, nfields)
+        coefs = [weights * np.atleast_2d(a_lm).T for a_lm in arrays_lm]
+        nfields = coefs[0].shape[1]
+
+        lats, lons = np.broadcast_arrays(
+            np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+        )
+        shape = lats.shape
+        lats = lats.ravel()
+        lons = lons.ravel()
+        if degrees:
+            lats = np.radians(lats)
+            lons = np.radians(lons)
+        cos_theta, inverse = np.unique(np.sin(lats), return_inverse=True)
+        inverse = inverse.ravel()
+        # points sorted by latitude
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(cos_theta.size + 1))
+
+        nb_comp = 2 if vector else 1
+        values = np.zeros((nb_comp, nfields, lats.size))
+        nm = ms.size
+        # about 32 MB per table of Legendre functions and 8 MB per chunk
+        nlat_block = max(1, 2**22 // max(len(self.l_idx), 1))
+        npoints_chunk = max(1, 2**19 // (nb_comp * max(nm, 1) * nfields))
+        if nm > 1:
+            step = ms[1] - ms[0]
+        for start in range(0, cos_theta.size if nm else 0, nlat_block):
+            stop = min(start + nlat_block, cos_theta.size)
+            fourier = np.empty(
+                (nb_comp, nm, stop - start, nfields), np.complex128
+            )
+            tables = self._legendre_points(cos_theta[start:stop], vector)
+            if vector:
+                _, dplm, mplm_sin = tables
+                vector_synthesis(
+                    *coefs, dplm, mplm_sin, slices, fourier[0], fourier[1]
+                )
+            else:
+                legendre_synthesis(coefs[0], tables, slices, fourier[0])
+
+            points = order[bounds[start] : bounds[stop]]
+            for index in range(0, points.size, npoints_chunk):
+                idx = points[index : index + npoints_chunk]
+                # Fourier coefficients at the points (nb_comp, nm, npoints, nf)
+                coefs_points = fourier[:, :, inverse[idx] - start]
+                result = coefs_points[:, -1]
+                if nm > 1:
+                    z = np.exp(1j * step * lons[idx])[:, np.newaxis]
+                    for im in range(nm - 2, -1, -1):
+                        result *= z
+                        result += coefs_points[:, im]
+                if ms[0]:
+                    result *= np.exp(1j * ms[0] * lons[idx])[:, np.newaxis]
+                values[:, :, idx] = result.real.transpose(0, 2, 1)
+
+        values = self._reduce_points(values)
+        if ndim == 1:
+            values = values[:, 0]
+        values = values.reshape(values.shape[:-1] + shape)
+        if vector:
+            # u (longitude) and v (colatitude)
+            return values[1], values[0]
+        return values[0]
+
+    def eval_at_points(self, a_lm, lats, lons, degrees=False):
+        """Evaluate a field at arbitrary points.
+
+        Exact (up to round-off errors) for the spectral truncation, contrary
+        to an interpolation of the field on the grid. The Legendre functions
+        are computed once per unique latitude, so that it is efficient for
+        points sharing latitudes (e.g. a regular grid of stations).
+
+        Parameters
+        ----------
+
+        a_lm : array of shape ``(nlm,)`` or ``(nfields, nlm)``
+
+          Spectral array of a real field or stack of spectral arrays.
+
+        lats, lons : array_like
+
+          Latitudes and longitudes of the points (broadcast together).
+
+        degrees : bool
+
+          If True, ``lats`` and ``lons`` are in degrees (radians by default).
+
+        Returns
+        -------
+
+        Array of shape ``lats.shape`` or ``(nfields,) + lats.shape``.
+
+        """
+        return self._eval_points((a_lm,), lats, lons, degrees, vector=False)
+
+    def eval_vec_at_points(self, uD_lm, uR_lm, lats, lons, degrees=False):
+        """Evaluate at arbitrary points the velocity given by its vector
+        spherical harmonics (see :func:`eval_at_points`).
+
+        Returns
+        -------
+
+        u, v : arrays of shape ``lats.shape`` or ``(nfields,) + lats.shape``
+
+          Longitude and colatitude components (as for :func:`vec_from_vsh`).
+
+        """
+        return self._eval_points(
+            (uD_lm, uR_lm), lats, lons, degrees, vector=True
+        )
+
+    # spectra
+
+    def _sum_per_l(self, values):
+        """Sum over the orders m of arrays of shape ``(..., nlm)``."""
+        shape = values.shape[:-1]
+        nb_spectra = int(np.prod(shape))
+        nb_l = self.lmax + 1
+        # one bin per degree and per spectrum
+        bins = self.l_idx + nb_l * np.arange(nb_spectra)[:, np.newaxis]
+        spectra = np.bincount(
+            bins.ravel(),
+            values.reshape(nb_spectra, -1).ravel(),
+            minlength=nb_spectra * nb_l,
+        )
+        return spectra.reshape(shape + (nb_l,))
+
+    def spectrum_l(self, a_lm):
+        """Spectrum of the variance of a field as a function of the degree l.
+
+        The spectrum sums to the mean over the sphere of the square of the
+        field.
+
+        Parameters
+        ----------
+
+        a_lm : array of shape ``(nlm,)`` or ``(..., nlm)``
+
+          Spectral array or stack of spectral arrays (one spectrum per
+          array).
+
+        Returns
+        -------
+
+        Array of shape ``(lmax + 1,)`` or ``(..., lmax + 1)``.
+
+        """
+        return self._sum_per_l(self._weights_spectra * abs(a_lm) ** 2)
+
+    def energy_spectrum_from_vsh(self, uD_lm, uR_lm):
+        """Spectrum of the kinetic energy :math:`(u^2 + v^2)/2` from the vector
+        spherical harmonics (see :func:`spectrum_l`).
+
+        """
+        return self._sum_per_l(
+            0.5
+            * self._weights_spectra
+            * self.l2_idx
+            * (abs(uD_lm) ** 2 + abs(uR_lm) ** 2)
+        )
+
+    def enstrophy_spectrum(self, rot_lm):
+        r"""Spectrum of the enstrophy :math:`\zeta^2/2` from the curl (see
+        :func:`spectrum_l`).
+
+        """
+        return 0.5 * self.spectrum_l(rot_lm)
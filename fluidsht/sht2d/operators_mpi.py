@@ -0,0 +1,417 @@
+"""MPI Operators 2D (:mod:`fluidsht.sht2d.operators_mpi`)
+=========================================================
+
+Distributed version of :class:`fluidsht.sht2d.operators.OperatorsSphereHarmo2D`
+using mpi4py.
+
+- In physical space, the latitudes are split between the processes (local
+  arrays of shape ``shapeX_loc = (nlat_loc, nlon)``).
+
+- In spectral space, the orders m are distributed in a round-robin fashion
+  (``ms_loc = range(rank, mmax + 1, nb_proc)``), so that the Legendre
+  transforms are well balanced. The local coefficients are packed as in the
+  sequential case, for l = m, ..., lmax and m in ``ms_loc``.
+
+The FFTs along the longitudes are done locally. The Fourier coefficients are
+then transposed with an all-to-all communication, and the Legendre transforms
+(matrix products of :class:`fluidsht.sht2d._legendre.LegendreTransforms`, as
+for the NumPy backend) are done locally for the local orders.
+
+The tests can be run with::
+
+  mpirun -np 4 python -m unittest fluidsht.sht2d.tests
+
+.. autoclass:: OperatorsSphereHarmo2DMPI
+   :members:
+   :undoc-members:
+
+"""
+import threading
+
+import numpy as np
+from mpi4py import MPI
+
+from fluiddyn.calcul.sphericalharmo import compute_nlatnlon
+
+from ..compat import cached_property
+from ._legendre import (
+    LegendreTransforms,
+    compute_legendre,
+    compute_lm_indices,
+    compute_nodes_weights,
+)
+from ._spectral_tables import SpectralTables
+from .operators import OperatorsSphereHarmo2D
+
+
+class OperatorsSphereHarmo2DMPI(LegendreTransforms, OperatorsSphereHarmo2D):
+    """Perform 2D SHT and operations on data distributed with MPI.
+
+    Parameters
+    ----------
+
+    nlat, nlon, lmax, norm, cs_phase, grid_type, radius, coef_dealiasing :
+
+      See :class:`fluidsht.sht2d.operators.OperatorsSphereHarmo2D`.
+
+    comm : mpi4py communicator
+
+      Default to ``MPI.COMM_WORLD``.
+
+    dtype : {"float64"}
+
+      Only double precision is supported (ValueError otherwise).
+
+    """
+
+    def __init__(
+        self,
+        nlat=None,
+        nlon=None,
+        lmax=15,
+        norm="orthonormal",
+        cs_phase=False,
+        grid_type="gaussian",
+        radius=1,
+        comm=None,
+        coef_dealiasing=2 / 3,
+        dtype="float64",
+    ):
+        if np.dtype(dtype) != np.float64:
+            raise ValueError(
+                f"Unsupported dtype for the MPI operators: {dtype} "
+                "(only float64)"
+            )
+        if comm is None:
+            comm = MPI.COMM_WORLD
+        self.comm = comm
+        self.rank = comm.rank
+        self.nb_proc = comm.size
+
+        if nlat is None or nlon is None:
+            nlat_default, nlon_default = compute_nlatnlon(lmax)
+            nlat = nlat or nlat_default
+            nlon = nlon or nlon_default
+
+        self.lmax = lmax
+        self.mmax = lmax
+        self.mres = 1
+        if grid_type == "gaussian" and nlat <= lmax:
+            raise ValueError("nlat <= lmax")
+        if nlon <= 2 * self.mmax:
+            raise ValueError("nlon <= 2*mmax")
+
+        self.nlat = nlat
+        self.nlon = nlon
+        self.norm = norm
+        self.cs_phase = cs_phase
+        self.grid_type = grid_type
+        self.coef_dealiasing = coef_dealiasing
+        self.radius = float(radius)
+        self.dtype = np.dtype(np.float64)
+        self.dtype_complex = np.dtype(np.complex128)
+        self.nthreads = None
+        self.opsht = None
+        self.type_sht = self.__class__.__module__
+        self._buffers = threading.local()
+        self._integrating_factors = {}
+        self._dt_integrating_factors = None
+
+        # physical space: latitudes split between the processes
+        self._nlats_loc = [
+            nlat // self.nb_proc + (rank < nlat % self.nb_proc)
+            for rank in range(self.nb_proc)
+        ]
+        self.nlat_loc = self._nlats_loc[self.rank]
+        self.ilat_start = sum(self._nlats_loc[: self.rank])
+        slice_lat = slice(self.ilat_start, self.ilat_start + self.nlat_loc)
+
+        cos_theta, weights = compute_nodes_weights(nlat, grid_type)
+        self._cos_theta = cos_theta
+        self._weights = weights
+        self.lats = np.arcsin(cos_theta)
+        self.lons = 2 * np.pi * np.arange(nlon) / nlon
+        self.LONS, self.LATS = np.meshgrid(self.lons, self.lats[slice_lat])
+        self.deltax = 360.0 / nlon
+        self.deltay = self.deltax
+        self.x_seq = self.lons
+        self.y_seq = self.lats
+
+        self.shapeX_seq = (nlat, nlon)
+        self.shapeX_loc = self.shapeX = (self.nlat_loc, nlon)
+
+        # spectral space: orders m distributed in a round-robin fashion
+        self._ms_all = [
+            np.arange(rank, self.mmax + 1, self.nb_proc)
+            for rank in range(self.nb_proc)
+        ]
+        self.ms_loc = self._ms_all[self.rank]
+        self.l_idx, self.m_idx, self._slices = compute_lm_indices(
+            lmax, self.ms_loc
+        )
+        self.nlm = len(self.l_idx)
+        self.nlm_seq = (lmax + 1) * (lmax + 2) // 2
+        self.shapeK_seq = (self.nlm_seq,)
+        self.shapeK_loc = self.shapeK = (self.nlm,)
+        # index of the local coefficients in the sequential packed layout
+        self.idx_lm_seq = (
+            self.m_idx * (2 * lmax + 1 - self.m_idx) // 2 + self.l_idx
+        )
+
+        # local coefficients: not shared with other operators
+        self._set_spectral_tables(
+            SpectralTables(
+                self.l_idx, self.m_idx, self.radius, lmax, self.mmax
+            )
+        )
+        self._zeros_sh = self.create_array_sh(0.0)
+
+        self._ms = self.ms_loc
+        self._init_scalar_tables()
+        self._init_profiling()
+
+    def __reduce__(self):
+        raise TypeError(
+            f"Cannot pickle {type(self).__name__} objects (operators bound to "
+            "an MPI communicator)"
+        )
+
+    # communications
+
+    def _alltoallv(self, sendbuf, counts_send, counts_recv):
+        recvbuf = np.empty(sum(counts_recv), complex)
+        displs_send = np.concatenate(([0], np.cumsum(counts_send)[:-1]))
+        displs_recv = np.concatenate(([0], np.cumsum(counts_recv)[:-1]))
+        self.comm.Alltoallv(
+            [sendbuf, (counts_send, displs_send), MPI.C_DOUBLE_COMPLEX],
+            [recvbuf, (counts_recv, displs_recv), MPI.C_DOUBLE_COMPLEX],
+        )
+        return recvbuf
+
+    def _fourier_from_spat(self, fields):
+        """FFT and transposition from ``(nfields, nlat_loc, nlon)`` real arrays
+        to ``(nm_loc, nlat, nfields)`` Fourier coefficients.
+
+        """
+        nfields = fields.shape[0]
+        fourier = np.fft.rfft(fields, axis=-1)[..., : self.mmax + 1]
+        fourier *= 2 * np.pi / self.nlon
+        sendbuf = np.concatenate(
+            [fourier[:, :, ms].transpose(1, 2, 0).ravel() for ms in self._ms_all]
+        )
+        nm_loc = len(self.ms_loc)
+        recvbuf = self._alltoallv(
+            sendbuf,
+            [self.nlat_loc * len(ms) * nfields for ms in self._ms_all],
+            [nlat_loc * nm_loc * nfields for nlat_loc in self._nlats_loc],
+        )
+        return recvbuf.reshape(self.nlat, nm_loc, nfields).transpose(1, 0, 2)
+
+    def _spat_from_fourier(self, fourier_loc, fields):
+        """Transposition and inverse FFT from ``(nm_loc, nlat, nfields)`` Fourier
+        coefficients to ``(nfields, nlat_loc, nlon)`` real arrays.
+
+        """
+        nm_loc, _, nfields = fourier_loc.shape
+        sendbuf = np.ascontiguousarray(fourier_loc.transpose(1, 0, 2)).ravel()
+        counts_recv = [self.nlat_loc * len(ms) * nfields for ms in self._ms_all]
+        recvbuf = self._alltoallv(
+            sendbuf,
+            [nlat_loc * nm_loc * nfields for nlat_loc in self._nlats_loc],
+            counts_recv,
+        )
+        fourier = np.zeros(
+            (nfields, self.nlat_loc, self.nlon // 2 + 1), dtype=complex
+        )
+        start = 0
+        for ms, count in zip(self._ms_all, counts_recv):
+            fourier[:, :, ms] = (
+                recvbuf[start : start + count]
+                .reshape(self.nlat_loc, len(ms), nfields)
+                .transpose(2, 0, 1)
+            )
+            start += count
+        fields[:] = np.fft.irfft(fourier, n=self.nlon, axis=-1)
+        fields *= self.nlon
+        return fields
+
+    # misc.
+
+    @cached_property
+    def opsht_padded(self):
+        """Operator on a grid fine enough to compute the products of two
+        fields without aliasing, with the same truncation and the same
+        distribution of the orders (so that the local spectral arrays are the
+        same). Used by :func:`nonlinear_product_sh` (collective).
+
+        """
+        nlat, nlon = self._nlatnlon_padded()
+        if nlat <= self.nlat and nlon <= self.nlon:
+            return self
+        return type(self)(
+            nlat=nlat,
+            nlon=nlon,
+            lmax=self.lmax,
+            norm=self.norm,
+            cs_phase=self.cs_phase,
+            grid_type=self.grid_type,
+            radius=self.radius,
+            comm=self.comm,
+            coef_dealiasing=self.coef_dealiasing,
+        )
+
+    def _legendre_points(self, cos_theta, derivatives=False):
+        return compute_legendre(
+            self.lmax,
+            self.ms_loc,
+            cos_theta,
+            self.norm,
+            self.cs_phase,
+            derivatives,
+        )
+
+    def _reduce_points(self, values):
+        """Sum the contributions of the (distributed) orders."""
+        self.comm.Allreduce(MPI.IN_PLACE, values, op=MPI.SUM)
+        return values
+
+    def _params_sh(self):
+        return dict(
+            lmax=self.lmax,
+            mmax=self.mmax,
+            mres=self.mres,
+            norm=self.norm,
+            cs_phase=self.cs_phase,
+        )
+
+    def save_sh(self, path, fields_lm):
+        """Gather spectral arrays and save them on the process 0 (collective,
+        see :func:`OperatorsSphereHarmo2D.save_sh`).
+
+        """
+        from .checkpoint import save_sh
+
+        def gather(a_lm):
+            if np.ndim(a_lm) == 1:
+                return self.gather_sh(a_lm)
+            return [gather(array) for array in a_lm]
+
+        if isinstance(fields_lm, dict):
+            fields_lm_seq = {
+                name: gather(a_lm) for name, a_lm in fields_lm.items()
+            }
+        else:
+            fields_lm_seq = gather(fields_lm)
+        if self.rank == 0:
+            save_sh(path, fields_lm_seq, radius=self.radius, **self._params_sh())
+        self.comm.barrier()
+
+    def sum_wavenumbers(self, field_lm):
+        """Sum over all (distributed) coefficients."""
+        return self.comm.allreduce(field_lm.sum(), op=MPI.SUM)
+
+    def _sum_per_l(self, values):
+        """Sum over the orders m (distributed) of arrays of shape ``(...,
+        nlm)``.
+
+        """
+        return self.comm.allreduce(super()._sum_per_l(values), op=MPI.SUM)
+
+    def produce_str_describing_oper(self):
+        """Produce a string describing the operator."""
+        return f"lmax{self.lmax}_nlat{self.nlat}_nlon{self.nlon}"
+
+    def produce_long_str_describing_oper(self):
+        """Produce a long string describing the operator."""
+        return (
+            "Spherical harmonic transforms distributed over "
+            f"{self.nb_proc} processes, nlat = {self.nlat} ; nlon = {self.nlon}"
+        )
+
+    def set_nthreads(self, nthreads):
+        """Not supported (one thread per process)."""
+        raise NotImplementedError(
+            "The number of threads cannot be changed for the MPI operators"
+        )
+
+    def use_nthreads(self, nthreads):
+        """Not supported (see :func:`set_nthreads`)."""
+        self.set_nthreads(nthreads)
+
+    def submit(self, method, *args, executor=None):
+        """Not supported: the transforms use collective communications, which
+        cannot be called concurrently in several threads.
+
+        """
+        raise NotImplementedError(
+            "Concurrent transforms are not supported with MPI"
+        )
+
+    # gather / scatter
+
+    def gather_Xspace(self, field_loc, root=0):
+        """Gather a spatial array on the process ``root`` (None on the other
+        processes).
+
+        """
+        field_seq = np.empty(self.shapeX_seq) if self.rank == root else None
+        counts = [nlat_loc * self.nlon for nlat_loc in self._nlats_loc]
+        self.comm.Gatherv(
+            np.ascontiguousarray(field_loc, dtype=float),
+            [field_seq, counts, MPI.DOUBLE],
+            root=root,
+        )
+        return field_seq
+
+    def scatter_Xspace(self, field_seq, root=0):
+        """Scatter a spatial array from the process ``root``."""
+        field_loc = self.create_array_spat()
+        counts = [nlat_loc * self.nlon for nlat_loc in self._nlats_loc]
+        if self.rank == root:
+            field_seq = np.ascontiguousarray(field_seq, dtype=float)
+        self.comm.Scatterv([field_seq, counts, MPI.DOUBLE], field_loc, root=root)
+        return field_loc
+
+    def gather_sh(self, field_lm, root=0):
+        """Gather a spectral array in the sequential packed layout on the process
+        ``root`` (None on the other processes).
+
+        """
+        indices = self.comm.gather(self.idx_lm_seq, root=root)
+        values = self.comm.gather(np.asarray(field_lm), root=root)
+        if self.rank != root:
+            return None
+        field_lm_seq = np.empty(self.nlm_seq, complex)
+        for idx, value in zip(indices, values):
+            field_lm_seq[idx] = value
+        return field_lm_seq
+
+    @cached_property
+    def _idx_lm_seq_all(self):
+        """Indices in the sequential packed layout of the coefficients of all
+        the processes (concatenated in the order of the ranks).
+
+        """
+        return np.concatenate(
+            [
+                m_idx * (2 * self.lmax + 1 - m_idx) // 2 + l_idx
+                for l_idx, m_idx, _ in (
+                    compute_lm_indices(self.lmax, ms) for ms in self._ms_all
+                )
+            ]
+        )
+
+    def scatter_sh(self, field_lm_seq, root=0):
+        """Scatter a spectral array given in the sequential packed layout."""
+        field_lm = self.create_array_sh()
+        counts = [int((self.lmax + 1 - ms).sum()) for ms in self._ms_all]
+        sendbuf = None
+        if self.rank == root:
+            # coefficients sorted by process
+            sendbuf = np.asarray(field_lm_seq, dtype=complex)[
+                self._idx_lm_seq_all
+            ]
+        self.comm.Scatterv(
+            [sendbuf, counts, MPI.C_DOUBLE_COMPLEX], field_lm, root=root
+        )
+        return field_lm
@@ -0,0 +1,148 @@
+"""Regridding with spectral interpolation (:mod:`fluidsht.sht2d.regrid`)
+=======================================================================
+
+Fields are moved between two grids (for example the Gaussian grid of a model
+and a regular output grid at another resolution) with a forward transform on
+the input grid, a truncation or a zero-padding of the spectral coefficients and
+an inverse transform on the output grid. The coefficients are converted if the
+two operators use different normalizations of the spherical harmonics.
+
+.. code-block:: python
+
+    regridder = Regridder(
+        oper_model, dict(nlat=181, nlon=360, lmax=85, grid_type="regular")
+    )
+    # fields of shape (nfields, nlat, nlon)
+    fields_out = regridder.regrid(fields)
+    u_out, v_out = regridder.regrid_vec(u, v)
+
+.. autofunction:: lm_index_map
+
+.. autoclass:: Regridder
+   :members:
+
+"""
+import numpy as np
+
+from ._legendre import norm_factors
+from .operators import OperatorsSphereHarmo2D
+
+
+def lm_index_map(lmax_in, lmax_out, mmax_in=None, mmax_out=None):
+    """Indices of the coefficients common to two truncations.
+
+    The spectral arrays are packed "m-major" (see
+    :mod:`fluidsht.sht2d.with_numpy`).
+
+    Returns
+    -------
+
+    idx_in, idx_out : ndarray
+
+      The coefficients ``a_lm_in[idx_in]`` are stored in ``a_lm_out[idx_out]``.
+
+    """
+    if mmax_in is None:
+        mmax_in = lmax_in
+    if mmax_out is None:
+        mmax_out = lmax_out
+    lmax = min(lmax_in, lmax_out)
+    mmax = min(mmax_in, mmax_out, lmax)
+    m_idx = np.repeat(np.arange(mmax + 1), lmax + 1 - np.arange(mmax + 1))
+    l_idx = np.concatenate([np.arange(m, lmax + 1) for m in range(mmax + 1)])
+
+    def packed_index(lmax_array):
+        return m_idx * (2 * lmax_array + 1 - m_idx) // 2 + l_idx
+
+    return packed_index(lmax_in), packed_index(lmax_out)
+
+
+def _as_operator(oper):
+    if isinstance(oper, dict):
+        return OperatorsSphereHarmo2D(**oper)
+    return oper
+
+
+class Regridder:
+    """Regrid scalar and vector fields between two grids.
+
+    Parameters
+    ----------
+
+    oper_in, oper_out : OperatorsSphereHarmo2D or dict
+
+      Operators (or keyword arguments to create them) of the input and
+      output grids. The SHT objects are shared through the cache of
+      :func:`fluidsht.create_sht_object`.
+
+    """
+
+    def __init__(self, oper_in, oper_out):
+        self.oper_in = oper_in = _as_operator(oper_in)
+        self.oper_out = oper_out = _as_operator(oper_out)
+        self.idx_in, self.idx_out = lm_index_map(
+            oper_in.lmax,
+            oper_out.lmax,
+            oper_in.m_idx.max(),
+            oper_out.m_idx.max(),
+        )
+        # conversion between normalizations (as for checkpoint files)
+        params_in = oper_in._params_sh()
+        params_out = oper_out._params_sh()
+        self.factors = None
+        keys = ("norm", "cs_phase")
+        if any(params_in[key] != params_out[key] for key in keys):
+            l_idx = oper_out.l_idx[self.idx_out]
+            factors = norm_factors(l_idx, params_in["norm"])
+            factors /= norm_factors(l_idx, params_out["norm"])
+            if params_in["cs_phase"] != params_out["cs_phase"]:
+                factors *= (-1.0) ** oper_out.m_idx[self.idx_out]
+            self.factors = factors
+
+    def regrid_sh(self, fields_lm, fields_lm_out=None):
+        """Truncate or zero-pad spectral arrays of shape ``(nlm_in,)`` or
+        ``(nfields, nlm_in)`` (``fields_lm_out`` is overwritten).
+
+        """
+        if fields_lm_out is None:
+            shape = fields_lm.shape[:-1] + (self.oper_out.nlm,)
+            fields_lm_out = np.zeros(shape, self.oper_out.dtype_complex)
+        else:
+            fields_lm_out.fill(0.0)
+        values = fields_lm[..., self.idx_in]
+        if self.factors is not None:
+            values *= self.factors
+        fields_lm_out[..., self.idx_out] = values
+        return fields_lm_out
+
+    def regrid(self, fields, fields_out=None):
+        """Regrid a field of shape ``(nlat, nlon)`` or a stack of fields of
+        shape ``(nfields, nlat, nlon)`` (``fields_out`` is overwritten).
+
+        """
+        oper_in, oper_out = self.oper_in, self.oper_out
+        if fields.ndim == 2:
+            fields_lm = self.regrid_sh(oper_in.sht(fields))
+            if fields_out is None:
+                return oper_out.isht(fields_lm)
+            return oper_out.isht(fields_lm, fields_out)
+        fields_lm = self.regrid_sh(oper_in.sht_batch(fields))
+        return oper_out.isht_batch(fields_lm, fields_out)
+
+    def regrid_vec(self, u, v, u_out=None, v_out=None):
+        """Regrid a vector field (or a stack of vector fields) with the vector
+        spherical harmonics (``u_out`` and ``v_out`` are overwritten).
+
+        """
+        oper_in, oper_out = self.oper_in, self.oper_out
+        if u.ndim == 2:
+            uD_lm, uR_lm = oper_in.vsh_from_vec(u, v)
+            vec_from_vsh = oper_out.vec_from_vsh
+        else:
+            uD_lm, uR_lm = oper_in.vsh_from_vec_batch(u, v)
+            vec_from_vsh = oper_out.vec_from_vsh_batch
+        uD_lm = self.regrid_sh(uD_lm)
+        uR_lm = self.regrid_sh(uR_lm)
+        if u_out is None:
+            return vec_from_vsh(uD_lm, uR_lm)
+        return vec_from_vsh(uD_lm, uR_lm, u_out, v_out)
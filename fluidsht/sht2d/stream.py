@@ -0,0 +1,254 @@
+"""Streaming transforms of time series (:mod:`fluidsht.sht2d.stream`)
+=====================================================================
+
+Transform long time series of fields of shape ``(ntimes, nlat, nlon)`` stored
+on disk without loading them in memory. The snapshots are read chunk by chunk
+(``chunk_size`` snapshots per chunk) by a background thread, while the
+previous chunk is transformed with the batched methods of an operator
+(:class:`fluidsht.sht2d.operators.OperatorsSphereHarmo2D`) and written in the
+output.
+
+The sources can be any array-like objects supporting slicing along their first
+axis, for example:
+
+- NumPy arrays and memory-mapped ``.npy`` files (a path to a ``.npy`` file is
+  opened with ``np.load(path, mmap_mode="r")``),
+
+- ``h5py`` datasets,
+
+- ``netCDF4`` variables.
+
+The outputs (of shape ``(ntimes, nlm)``) can be NumPy arrays, ``h5py``
+datasets or paths to ``.npy`` files (created as memory-mapped files). If no
+output is given, the results are returned in NumPy arrays.
+
+The memory used is bounded: at most ``prefetch`` chunks wait in the queue, one
+chunk is read and one chunk is transformed. For ``h5py`` datasets, it is
+better to use a ``chunk_size`` multiple of the chunks of the dataset.
+
+Example::
+
+  with h5py.File("reanalysis.h5") as file:
+      vort_lm = stream_sht(oper, file["vorticity"], "vort_lm.npy")
+
+.. autofunction:: iter_chunks
+
+.. autofunction:: stream_sht
+
+.. autofunction:: stream_divrotsh_from_vec
+
+"""
+import os
+import queue
+import threading
+
+import numpy as np
+
+_END = object()
+
+
+def _as_source(source):
+    if isinstance(source, (str, os.PathLike)):
+        return np.load(source, mmap_mode="r")
+    return source
+
+
+def _prepare_output(output, shape, dtype):
+    if output is None:
+        return np.empty(shape, dtype)
+    if isinstance(output, (str, os.PathLike)):
+        return np.lib.format.open_memmap(
+            output, mode="w+", dtype=dtype, shape=shape
+        )
+    if tuple(output.shape) != shape:
+        raise ValueError(
+            f"Output of shape {tuple(output.shape)} instead of {shape}"
+        )
+    return output
+
+
+def _flush(output):
+    if isinstance(output, np.memmap):
+        output.flush()
+
+
+def iter_chunks(sources, chunk_size=8, prefetch=2, dtype=None):
+    """Iterate over chunks of arrays read by a background thread.
+
+    Parameters
+    ----------
+
+    sources : sequence of array-like
+
+      Arrays (or paths to ``.npy`` files) with the same length.
+
+    chunk_size : int
+
+      Number of snapshots (along the first axis) per chunk.
+
+    prefetch : int
+
+      Maximum number of chunks read in advance.
+
+    dtype : {None, dtype}
+
+      The chunks are converted to contiguous arrays of this type.
+
+    Yields
+    ------
+
+    slice_times : slice
+
+      Position of the chunk along the first axis.
+
+    chunks : tuple of ndarray
+
+      One chunk per source.
+
+    """
+    if chunk_size < 1 or prefetch < 1:
+        raise ValueError("chunk_size and prefetch have to be positive")
+    sources = [_as_source(source) for source in sources]
+    ntimes = len(sources[0])
+    if any(len(source) != ntimes for source in sources):
+        raise ValueError("The sources do not have the same length")
+
+    chunks = queue.Queue(maxsize=prefetch)
+    stopped = threading.Event()
+
+    def put(item):
+        # do not block forever if the consumer has stopped
+        while not stopped.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def read():
+        try:
+            for start in range(0, ntimes, chunk_size):
+                slice_times = slice(start, min(start + chunk_size, ntimes))
+                arrays = tuple(
+                    np.ascontiguousarray(source[slice_times], dtype=dtype)
+                    for source in sources
+                )
+                if not put((slice_times, arrays)):
+                    return
+        except Exception as error:
+            put(error)
+        else:
+            put(_END)
+
+    thread = threading.Thread(target=read, name="fluidsht-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def stream_sht(oper, source, output=None, chunk_size=8, prefetch=2):
+    """Forward transforms of a time series of scalar fields.
+
+    Parameters
+    ----------
+
+    oper : :class:`fluidsht.sht2d.operators.OperatorsSphereHarmo2D`
+
+    source : array-like or path
+
+      Fields of shape ``(ntimes, nlat, nlon)``.
+
+    output : {None, array-like, path}
+
+      Spectral coefficients of shape ``(ntimes, nlm)`` (overwritten).
+
+    chunk_size, prefetch : int
+
+      See :func:`iter_chunks`.
+
+    Returns
+    -------
+
+    The output (a memory-mapped array if ``output`` is a path).
+
+    """
+    source = _as_source(source)
+    output = _prepare_output(
+        output, (len(source), oper.nlm), oper.dtype_complex
+    )
+    fields_lm = oper.create_array_sh_batch(chunk_size)
+    for slice_times, (fields,) in iter_chunks(
+        [source], chunk_size, prefetch, oper.dtype
+    ):
+        nfields = len(fields)
+        oper.sht_batch(fields, fields_lm[:nfields])
+        output[slice_times] = fields_lm[:nfields]
+    _flush(output)
+    return output
+
+
+def stream_divrotsh_from_vec(
+    oper,
+    source_u,
+    source_v,
+    output_div=None,
+    output_rot=None,
+    chunk_size=8,
+    prefetch=2,
+):
+    """Divergence and curl of a time series of velocity fields.
+
+    Parameters
+    ----------
+
+    oper : :class:`fluidsht.sht2d.operators.OperatorsSphereHarmo2D`
+
+    source_u, source_v : array-like or path
+
+      Velocity components of shape ``(ntimes, nlat, nlon)``.
+
+    output_div, output_rot : {None, array-like, path}
+
+      Spectral coefficients of shape ``(ntimes, nlm)`` (overwritten).
+
+    chunk_size, prefetch : int
+
+      See :func:`iter_chunks`.
+
+    Returns
+    -------
+
+    The outputs for the divergence and the curl.
+
+    """
+    source_u = _as_source(source_u)
+    shape = (len(source_u), oper.nlm)
+    output_div = _prepare_output(output_div, shape, oper.dtype_complex)
+    output_rot = _prepare_output(output_rot, shape, oper.dtype_complex)
+    div_lm = oper.create_array_sh_batch(chunk_size)
+    rot_lm = oper.create_array_sh_batch(chunk_size)
+    for slice_times, (u, v) in iter_chunks(
+        [source_u, source_v], chunk_size, prefetch, oper.dtype
+    ):
+        nfields = len(u)
+        # the VSH are computed in place and multiplied by l(l+1)/r
+        uD_lm, uR_lm = oper.vsh_from_vec_batch(
+            u, v, div_lm[:nfields], rot_lm[:nfields]
+        )
+        uD_lm *= -oper.K2_r
+        uR_lm *= oper.K2_r
+        output_div[slice_times] = uD_lm
+        output_rot[slice_times] = uR_lm
+    _flush(output_div)
+    _flush(output_rot)
+    return output_div, output_rot
@@ -1,8 +1,34 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from importlib.util import find_spec
+from itertools import repeat
+import json
+import os
+import pickle
+from tempfile import TemporaryDirectory
 import unittest
 from warnings import warn
 import numpy as np
-from numpy.testing import assert_array_almost_equal, assert_array_less
+from numpy.testing import (
+    assert_array_almost_equal,
+    assert_array_equal,
+    assert_array_less,
+)
+import fluidsht
+from fluidsht._plan_cache import estimate_nbytes
+from fluidsht.sht2d._legendre import compute_nodes_weights
 from fluidsht.sht2d.operators import OperatorsSphereHarmo2D
+from fluidsht.sht2d.regrid import Regridder, lm_index_map
+from fluidsht.sht2d.stream import (
+    iter_chunks,
+    stream_divrotsh_from_vec,
+    stream_sht,
+)
+
+try:
+    from mpi4py import MPI
+    from fluidsht.sht2d.operators_mpi import OperatorsSphereHarmo2DMPI
+except ImportError:
+    MPI = None
 
 
 def as_iterable(args):
@@ -12,8 +38,79 @@ def as_iterable(args):
         return args
 
 
+def check_out(self, oper, arrays_sh):
+    """Check that the methods write their results in the arrays ``out``."""
+    a_lm, b_lm = arrays_sh
+    out_lm = oper.create_array_sh()
+    for name in ("laplacian_sh", "invlaplacian_sh"):
+        method = getattr(oper, name)
+        for negative in (False, True):
+            result = method(a_lm, negative, out=out_lm)
+            self.assertIs(result, out_lm)
+            assert_array_almost_equal(
+                result, method(a_lm, negative), decimal=self.decimal
+            )
+
+    field = oper.isht(a_lm)
+    self.assertIs(oper.isht(a_lm, field), field)
+    self.assertIs(oper.sht(field, out_lm), out_lm)
+    assert_array_almost_equal(out_lm, a_lm, decimal=self.decimal)
+
+    u, v = oper.create_array_spat(), oper.create_array_spat()
+    for name, args in (
+        ("vec_from_divrotsh", (a_lm, b_lm)),
+        ("vec_from_rotsh", (b_lm,)),
+        ("vec_from_divsh", (a_lm,)),
+        ("gradf_from_fsh", (a_lm,)),
+    ):
+        method = getattr(oper, name)
+        result = method(*args, u, v)
+        self.assertIs(result[0], u)
+        self.assertIs(result[1], v)
+        for array, expected in zip(result, method(*args)):
+            assert_array_almost_equal(array, expected, decimal=self.decimal)
+
+    # paths skipping the zero component
+    zeros_lm = oper.create_array_sh(0.0)
+    for result, expected in (
+        (oper.vec_from_rotsh(b_lm), oper.vec_from_divrotsh(zeros_lm, b_lm)),
+        (oper.vec_from_divsh(a_lm), oper.vec_from_divrotsh(a_lm, zeros_lm)),
+    ):
+        for array, array_expected in zip(result, expected):
+            assert_array_almost_equal(array, array_expected, decimal=self.decimal)
+
+
+def compute_sht(oper, field):
+    """Used in the workers of a process pool"""
+    return oper.sht(field)
+
+
+def check_eval_at_points(self, oper):
+    """Evaluate simple fields at points out of the grid and at the poles."""
+    lats = np.array([-np.pi / 2, 0.3, 0.3, 1.0, np.pi / 2])
+    lons = np.arange(5.0)
+    # sin(lat) = (4 pi / 3)**0.5 Y_1^0
+    field_lm = oper.create_array_sh(0.0)
+    field_lm[(oper.l_idx == 1) & (oper.m_idx == 0)] = np.sqrt(4 * np.pi / 3)
+    assert_array_almost_equal(
+        oper.eval_at_points(field_lm, lats, lons), np.sin(lats)
+    )
+    # solid body rotation: u = cos(lat), rot = 2 sin(lat)
+    u, v = oper.eval_vec_at_points(
+        oper.create_array_sh(0.0),
+        oper.uRsh_from_rotsh(2 * field_lm),
+        lats,
+        lons,
+    )
+    assert_array_almost_equal(u, np.cos(lats))
+    assert_array_almost_equal(v, 0.0)
+
+
 class TestOperators2D(unittest.TestCase):
     sht_class = "default"
+    dtype = "float64"
+    # accuracy of the comparisons (see assert_array_almost_equal)
+    decimal = 6
 
     @classmethod
     def setUpClass(cls):
@@ -23,12 +120,18 @@ class TestOperators2D(unittest.TestCase):
         """
         lmax = 15
         cls.oper = oper = OperatorsSphereHarmo2D(
-            nlat=lmax + 1, nlon=2 * lmax + 1, lmax=lmax, sht=cls.sht_class
+            nlat=lmax + 1,
+            nlon=2 * lmax + 1,
+            lmax=lmax,
+            sht=cls.sht_class,
+            dtype=cls.dtype,
         )
         cls.arrays_spat = [oper.create_array_spat(1.0) for i in range(2)]
         cls.arrays_sh = [oper.create_array_sh_random() for i in range(2)]
         for array in cls.arrays_sh:
             array[np.logical_not(oper.where_l2_idx_positive)] = 0.0
+            # coefficients of real fields
+            array[oper.m_idx == 0] = array[oper.m_idx == 0].real
 
     def assert_reversible(self, arrays_in, forward, inverse):
         try:
@@ -45,7 +148,7 @@ class TestOperators2D(unittest.TestCase):
         arrays_transformed = forward(*as_iterable(arrays_in))
         arrays_out = inverse(*as_iterable(arrays_transformed))
 
-        assert_array_almost_equal(arrays_in, arrays_out)
+        assert_array_almost_equal(arrays_in, arrays_out, decimal=self.decimal)
 
     def test_not0(self):
         """Arrays which are expected to have small values when :math:`l(l+1) == 0`."""
@@ -76,15 +179,801 @@ class TestOperators2D(unittest.TestCase):
     def test_sht_isht(self):
         self.assert_reversible(self.arrays_spat[0], "sht", "isht")
 
+    def test_sht_isht_batch(self):
+        oper = self.oper
+        fields = np.array([oper.create_array_spat_random() for i in range(3)])
+        fields_lm = oper.sht_batch(fields)
+        for field, field_lm in zip(fields, fields_lm):
+            assert_array_almost_equal(
+                oper.sht(field), field_lm, decimal=self.decimal
+            )
+
+        fields_out = oper.create_array_spat_batch(3)
+        oper.isht_batch(fields_lm, fields_out)
+        for field_lm, field in zip(fields_lm, fields_out):
+            assert_array_almost_equal(
+                oper.isht(field_lm), field, decimal=self.decimal
+            )
+
+    def test_vec_vsh_batch(self):
+        oper = self.oper
+        uD_lm = np.array(self.arrays_sh)
+        uR_lm = uD_lm[::-1].copy()
+        u, v = oper.vec_from_vsh_batch(uD_lm, uR_lm)
+        for args in zip(uD_lm, uR_lm, u, v):
+            u0, v0 = oper.vec_from_vsh(*args[:2])
+            assert_array_almost_equal(u0, args[2], decimal=self.decimal)
+            assert_array_almost_equal(v0, args[3], decimal=self.decimal)
+
+        uD_lm_out, uR_lm_out = oper.vsh_from_vec_batch(u, v)
+        assert_array_almost_equal(uD_lm, uD_lm_out, decimal=self.decimal)
+        assert_array_almost_equal(uR_lm, uR_lm_out, decimal=self.decimal)
+
+    def test_plan_cache(self):
+        oper = self.oper
+        oper2 = OperatorsSphereHarmo2D(
+            nlat=oper.nlat,
+            nlon=oper.nlon,
+            lmax=oper.lmax,
+            sht=self.sht_class,
+            dtype=self.dtype,
+        )
+        self.assertIs(oper.opsht, oper2.opsht)
+        if hasattr(oper.opsht, "_estimate_nbytes"):
+            # tables of Legendre functions (also the ones computed lazily)
+            self.assertGreater(
+                estimate_nbytes(oper.opsht), oper.nlm * (oper.nlat // 2) * 4
+            )
+
+    def test_spectral_tables(self):
+        oper = self.oper
+        oper2 = OperatorsSphereHarmo2D(
+            nlat=oper.nlat, nlon=2 * oper.nlat - 1, lmax=oper.lmax
+        )
+        self.assertIs(oper2.K2, oper.K2)
+        self.assertIs(oper.K2_power(2), oper.K4)
+        assert_array_almost_equal(oper.K2_power(3), oper.K2**3)
+        assert_array_less(0, fluidsht.spectral_tables_info().nbytes)
+        self.assertTrue(np.array_equal(oper.l_idx, oper.opsht.l_idx))
+        self.assertTrue(np.array_equal(oper.m_idx, oper.opsht.m_idx))
+        with self.assertRaises(ValueError):
+            oper.inv_K2_r[0] = 1.0
+
+    def test_integrating_factor(self):
+        oper = self.oper
+        factor = oper.get_integrating_factor(1e-2, 0.1, order=2)
+        self.assertIs(oper.get_integrating_factor(1e-2, 0.1, order=2), factor)
+        assert_array_almost_equal(factor, np.exp(-1e-3 * oper.K4))
+
+        arrays_lm = np.array(self.arrays_sh)
+        expected = arrays_lm * np.exp(-0.2 * oper.K2)
+        expected[:, oper.l_idx > 10] = 0.0
+        expected *= np.exp(-36 * (oper.l_idx / oper.lmax) ** 8)
+        kwargs = dict(filter_exp=(36, 8), ltrunc=10)
+        result = oper.apply_integrating_factor(arrays_lm, 1.0, 0.2, **kwargs)
+        self.assertIs(result, arrays_lm)
+        assert_array_almost_equal(arrays_lm, expected, decimal=self.decimal)
+        # the factors for the previous time step have been removed
+        self.assertEqual(len(oper._integrating_factors), 1)
+
+        arrays_lm = [a_lm.copy() for a_lm in self.arrays_sh]
+        oper.apply_integrating_factor(arrays_lm, 1.0, 0.2, **kwargs)
+        assert_array_almost_equal(arrays_lm, expected, decimal=self.decimal)
+
+        # parameters given as lists or arrays
+        kwargs = dict(filter_exp=[36, 8], ltrunc=10)
+        nu = np.ones(oper.nlm)
+        factor = oper.get_integrating_factor(nu, 0.2, **kwargs)
+        self.assertIs(oper.get_integrating_factor(nu, 0.2, **kwargs), factor)
+        assert_array_almost_equal(
+            factor, oper.get_integrating_factor(1.0, 0.2, **kwargs)
+        )
+        factor_list = oper.get_integrating_factor([1.0] * oper.nlm, 0.2)
+        assert_array_almost_equal(
+            factor_list, oper.get_integrating_factor(1.0, 0.2)
+        )
+
+    def test_dealiasing(self):
+        oper = self.oper
+        arrays_lm = np.array(self.arrays_sh)
+        a_lm = arrays_lm[0].copy()
+        self.assertIs(oper.dealiasing(a_lm), a_lm)
+        oper.dealiasing(arrays_lm)
+        cond = oper.l_idx > 2 * oper.lmax / 3
+        assert_array_almost_equal(arrays_lm[:, cond], 0.0)
+        assert_array_almost_equal(a_lm, arrays_lm[0])
+        assert_array_almost_equal(
+            arrays_lm[:, ~cond], np.array(self.arrays_sh)[:, ~cond]
+        )
+
+    def test_nonlinear_product(self):
+        oper = self.oper
+        a_lm, b_lm = self.arrays_sh
+        # very fine grid
+        nlat = 2 * oper.lmax + 2
+        oper_fine = OperatorsSphereHarmo2D(
+            nlat=nlat,
+            nlon=2 * nlat - 1,
+            lmax=oper.lmax,
+            sht=self.sht_class,
+            dtype=self.dtype,
+        )
+        expected = oper_fine.sht(oper_fine.isht(a_lm) * oper_fine.isht(b_lm))
+        assert_array_almost_equal(
+            oper.nonlinear_product_sh(a_lm, b_lm), expected, decimal=self.decimal
+        )
+        self.assertGreater(oper.opsht_padded.nlat, oper.nlat)
+        self.assertIs(oper_fine.opsht_padded, oper_fine.opsht)
+
+    def test_advection(self):
+        a_lm, b_lm = self.arrays_sh
+        for radius in (1, 2):
+            oper = OperatorsSphereHarmo2D(
+                nlat=self.oper.nlat,
+                nlon=self.oper.nlon,
+                lmax=self.oper.lmax,
+                sht=self.sht_class,
+                radius=radius,
+                dtype=self.dtype,
+            )
+            grad_lon, grad_colat = oper.gradf_from_fsh(b_lm)
+            u, v = oper.vec_from_rotsh(a_lm)
+            expected = oper.sht(u * grad_lon + v * grad_colat)
+            assert_array_almost_equal(
+                oper.advection_sh(a_lm, b_lm), expected, decimal=self.decimal
+            )
+            u, v = oper.vec_from_divrotsh(b_lm, a_lm)
+            expected = oper.sht(u * grad_lon + v * grad_colat)
+            out = oper.create_array_sh()
+            result = oper.advection_divrotsh(b_lm, a_lm, b_lm, out)
+            self.assertIs(result, out)
+            assert_array_almost_equal(result, expected, decimal=self.decimal)
+
+    def test_layouts(self):
+        oper = self.oper
+        a_lm, b_lm = self.arrays_sh
+        fields_lm = np.array(self.arrays_sh)
+        l_idx, m_idx = oper.l_idx, oper.m_idx
+
+        tri = oper.triangle_from_sh(a_lm)
+        self.assertEqual(tri.shape, (oper.lmax + 1, m_idx.max() + 1))
+        assert_array_equal(tri[l_idx, m_idx], a_lm)
+        assert_array_equal(tri[np.triu_indices(oper.lmax + 1, 1)], 0.0)
+        out = oper.create_array_sh_batch(2)
+        result = oper.sh_from_triangle(oper.triangle_from_sh(fields_lm), out)
+        self.assertIs(result, out)
+        assert_array_equal(result, fields_lm)
+
+        cilm = oper.cube_from_sh(fields_lm)
+        self.assertEqual(cilm.shape, (2, 2, oper.lmax + 1, oper.lmax + 1))
+        self.assertEqual(cilm.dtype, oper.dtype)
+        cond = m_idx > 0
+        assert_array_almost_equal(
+            cilm[1, 0, l_idx[cond], m_idx[cond]], np.sqrt(2) * b_lm[cond].real
+        )
+        assert_array_almost_equal(
+            cilm[1, 1, l_idx[cond], m_idx[cond]], -np.sqrt(2) * b_lm[cond].imag
+        )
+        assert_array_equal(cilm[:, 1, :, 0], 0.0)
+        assert_array_almost_equal(oper.sh_from_cube(cilm), fields_lm)
+
+        a_r = oper.real_from_sh(fields_lm)
+        self.assertEqual(a_r.shape, (2, 2 * oper.nlm))
+        self.assertTrue(np.shares_memory(a_r, fields_lm))
+        assert_array_equal(a_r[0, 1::2], a_lm.imag)
+        self.assertTrue(np.shares_memory(oper.sh_from_real(a_r), fields_lm))
+
+    def test_checkpoint(self):
+        oper = self.oper
+        a_lm, b_lm = self.arrays_sh
+        fields_lm = np.array(self.arrays_sh)
+        kwargs = dict(
+            nlat=oper.nlat, nlon=oper.nlon, sht=self.sht_class, dtype=self.dtype
+        )
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "state.sht")
+            oper.save_sh(path, {"a": a_lm, "b": b_lm})
+            state = oper.load_sh(path, mmap_mode="r")
+            self.assertEqual(list(state), ["a", "b"])
+            self.assertIsInstance(state["b"], np.memmap)
+            assert_array_equal(state["b"], b_lm)
+
+            # entries of different shapes
+            oper.save_sh(path, {"stack": fields_lm, "a": a_lm})
+            for mmap_mode in (None, "r"):
+                state = oper.load_sh(path, mmap_mode=mmap_mode)
+                assert_array_equal(state["stack"], fields_lm)
+                assert_array_equal(state["a"], a_lm)
+
+            oper.save_sh(path, fields_lm)
+            assert_array_equal(oper.load_sh(path), fields_lm)
+            # restart at another resolution
+            oper_coarse = OperatorsSphereHarmo2D(lmax=7, **kwargs)
+            result = oper_coarse.load_sh(path, mmap_mode="r")
+            self.assertEqual(result.shape, (2, oper_coarse.nlm))
+            regridder = Regridder(oper, oper_coarse)
+            assert_array_equal(result, regridder.regrid_sh(fields_lm))
+            a_lm_coarse = result[0]
+            oper_coarse.save_sh(path, a_lm_coarse)
+            result = oper.load_sh(path)
+            assert_array_equal(
+                result, Regridder(oper_coarse, oper).regrid_sh(a_lm_coarse)
+            )
+            # other normalization
+            oper_schmidt = OperatorsSphereHarmo2D(
+                lmax=oper.lmax, norm="schmidt", **kwargs
+            )
+            oper.save_sh(path, a_lm)
+            assert_array_almost_equal(
+                oper_schmidt.isht(oper_schmidt.load_sh(path)),
+                oper.isht(a_lm),
+                decimal=self.decimal,
+            )
+            with open(path, "r+b") as file:
+                file.write(b"FLUIDSHP")
+            with self.assertRaises(ValueError):
+                oper.load_sh(path)
+
+    def test_pickle(self):
+        oper = self.oper
+        a_lm, b_lm = self.arrays_sh
+        oper_copy = pickle.loads(pickle.dumps(oper))
+        self.assertIsNot(oper_copy, oper)
+        self.assertEqual(oper_copy.dtype, oper.dtype)
+        self.assertNotIn("opsht", vars(oper_copy))
+        if fluidsht.plan_cache_info().maxbytes > 0:
+            # SHT object shared through the cache of the process
+            self.assertIs(oper_copy.opsht, oper.opsht)
+        fields = [oper.isht(a_lm), oper.isht(b_lm)]
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results = list(executor.map(compute_sht, repeat(oper), fields))
+        for result, expected in zip(results, self.arrays_sh):
+            assert_array_almost_equal(result, expected, decimal=self.decimal)
+
+    def test_eval_at_points(self):
+        oper = self.oper
+        a_lm, b_lm = self.arrays_sh
+        # points of the Gaussian grid (south pole first)
+        lats = np.arcsin(compute_nodes_weights(oper.nlat)[0])
+        lons = 2 * np.pi * np.arange(oper.nlon) / oper.nlon
+        LONS, LATS = np.meshgrid(lons, lats)
+        assert_array_almost_equal(
+            oper.eval_at_points(a_lm, LATS, LONS),
+            oper.isht(a_lm),
+            decimal=self.decimal,
+        )
+        values = oper.eval_at_points(
+            np.array([a_lm, b_lm]),
+            np.degrees(LATS),
+            np.degrees(LONS),
+            degrees=True,
+        )
+        self.assertEqual(values.shape, (2,) + oper.shapeX)
+        assert_array_almost_equal(
+            values[1], oper.isht(b_lm), decimal=self.decimal
+        )
+        for result, expected in zip(
+            oper.eval_vec_at_points(a_lm, b_lm, LATS, LONS),
+            oper.vec_from_vsh(a_lm, b_lm),
+        ):
+            assert_array_almost_equal(result, expected, decimal=self.decimal)
+
+        check_eval_at_points(self, oper)
+
+    def test_profiling(self):
+        oper = OperatorsSphereHarmo2D(
+            lmax=7, sht=self.sht_class, dtype=self.dtype
+        )
+        # in case FLUIDSHT_PROFILE is set
+        oper.disable_profiling()
+        with oper.profile():
+            field = oper.create_array_spat(1.0)
+            field_lm = oper.sht(field)
+            oper.sht(field, field_lm)
+            oper.vec_from_rotsh(field_lm)
+            oper.laplacian_sh(field_lm, out=field_lm)
+        self.assertFalse(hasattr(oper.sht, "_profiled"))
+        self.assertNotIn("laplacian_sh", vars(oper))
+        oper.sht(field)
+
+        timings = oper.get_timings()
+        self.assertEqual(timings["sht"]["ncalls"], 2)
+        self.assertEqual(timings["sht"]["nbytes"], field_lm.nbytes)
+        self.assertEqual(timings["laplacian_sh"]["nbytes"], 0)
+        # methods called by other methods
+        self.assertIn("vec_from_torsh", timings)
+        self.assertIn("vec_from_rotsh", oper.timings_report())
+        rotsh = timings["vec_from_rotsh"]
+        self.assertLess(rotsh["self_time"], rotsh["time"])
+        # percentages from the self times (nested calls counted once)
+        lines = oper.timings_report().splitlines()[1:]
+        percents = [float(line.split()[-2]) for line in lines]
+        self.assertAlmostEqual(sum(percents), 100, delta=1)
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "timings.json")
+            oper.save_timings(path)
+            with open(path) as file:
+                self.assertEqual(json.load(file)["timings"], timings)
+        oper.reset_timings()
+        self.assertEqual(oper.get_timings(), {})
+
+    def test_lazy_opsht(self):
+        oper = OperatorsSphereHarmo2D(
+            lmax=7, sht=self.sht_class, dtype=self.dtype
+        )
+        self.assertNotIn("opsht", vars(oper))
+        self.assertNotIn("inv_K2_not0", vars(oper))
+        field_lm = oper.sht(oper.create_array_spat(1.0))
+        self.assertIn("opsht", vars(oper))
+        self.assertEqual(field_lm.shape, oper.shapeK)
+        with self.assertRaises(AttributeError):
+            oper.does_not_exist
+
+    def test_nthreads(self):
+        oper = self.oper
+        field = self.arrays_spat[0]
+        field_lm = oper.sht(field)
+        opsht = oper.opsht
+        with oper.use_nthreads(1):
+            self.assertEqual(oper.nthreads, 1)
+            assert_array_almost_equal(
+                oper.sht(field), field_lm, decimal=self.decimal
+            )
+        self.assertIs(oper.opsht, opsht)
+        self.assertEqual(oper.nthreads, None)
+
+    @unittest.skipIf(find_spec("threadpoolctl") is None, "No threadpoolctl")
+    def test_blas_threads(self):
+        from threadpoolctl import threadpool_info
+
+        def get_nthreads_blas():
+            # BLAS used by NumPy (other libraries can bundle their own BLAS)
+            return [
+                info["num_threads"]
+                for info in threadpool_info()
+                if info["user_api"] == "blas" and "numpy" in info["filepath"]
+            ]
+
+        oper = self.oper
+        oper.sht(self.arrays_spat[0])
+        nthreads_blas = get_nthreads_blas()
+        with oper.use_nthreads(2):
+            if hasattr(oper.opsht, "limit_threads"):
+                self.assertEqual(set(get_nthreads_blas()), {2})
+        self.assertEqual(get_nthreads_blas(), nthreads_blas)
+
     def test_laplacian_invlaplacian(self):
         self.assert_reversible(
             self.arrays_sh[0], "laplacian_sh", "invlaplacian_sh"
         )
 
+    def test_out(self):
+        check_out(self, self.oper, self.arrays_sh)
+
+    def test_map(self):
+        oper = self.oper
+        fields_lm = [oper.create_array_sh_random() for i in range(4)]
+        for field_lm in fields_lm:
+            field_lm[oper.m_idx == 0] = field_lm[oper.m_idx == 0].real
+            # no mean divergence or curl
+            field_lm[0] = 0.0
+        fields = oper.map_isht(fields_lm)
+        for field_lm, field_lm_out in zip(fields_lm, oper.map_sht(fields)):
+            assert_array_almost_equal(
+                field_lm_out, field_lm, decimal=self.decimal
+            )
+
+        # the work buffers are not shared between the threads
+        with ThreadPoolExecutor(2) as executor:
+            velocities = oper.map_vec_from_divrotsh(
+                fields_lm, fields_lm[::-1], executor=executor
+            )
+            future = oper.submit_divrotsh_from_vec(
+                *velocities[0], executor=executor
+            )
+            div_lm, rot_lm = future.result()
+        assert_array_almost_equal(div_lm, fields_lm[0], decimal=self.decimal)
+        assert_array_almost_equal(rot_lm, fields_lm[-1], decimal=self.decimal)
+        for (u, v), div_lm, rot_lm in zip(
+            velocities, fields_lm, fields_lm[::-1]
+        ):
+            expected = oper.vec_from_divrotsh(div_lm, rot_lm)
+            assert_array_almost_equal(u, expected[0], decimal=self.decimal)
+            assert_array_almost_equal(v, expected[1], decimal=self.decimal)
+
+    def test_spectra(self):
+        # grid fine enough to compute the squares without aliasing
+        oper = OperatorsSphereHarmo2D(
+            lmax=7, sht=self.sht_class, dtype=self.dtype
+        )
+
+        def mean(field):
+            return oper.sht(field)[0].real / np.sqrt(4 * np.pi)
+
+        fields_lm = np.array([oper.create_array_sh_random() for i in range(3)])
+        fields_lm[:, oper.m_idx == 0] = fields_lm[:, oper.m_idx == 0].real
+        fields_lm[:, 0] = 0.0
+        fields = oper.isht_batch(fields_lm)
+        spectra = oper.spectrum_l(fields_lm)
+        self.assertEqual(spectra.shape, (3, oper.lmax + 1))
+        for field, field_lm, spectrum in zip(fields, fields_lm, spectra):
+            assert_array_almost_equal(
+                oper.spectrum_l(field_lm), spectrum, decimal=self.decimal
+            )
+            self.assertAlmostEqual(
+                spectrum.sum(), mean(field**2), places=self.decimal
+            )
+
+        div_lm, rot_lm = fields_lm[:2]
+        u, v = oper.vec_from_divrotsh(div_lm, rot_lm)
+        uD_lm, uR_lm = oper.vsh_from_divrotsh(div_lm, rot_lm)
+        self.assertAlmostEqual(
+            oper.energy_spectrum_from_vsh(uD_lm, uR_lm).sum(),
+            mean(0.5 * (u**2 + v**2)),
+            places=self.decimal,
+        )
+        self.assertAlmostEqual(
+            oper.enstrophy_spectrum(rot_lm).sum(),
+            mean(0.5 * oper.isht(rot_lm) ** 2),
+            places=self.decimal,
+        )
+
+    def test_sht_analytic(self):
+        oper = self.oper
+        # sin(lat) = (4 pi / 3)**0.5 Y_1^0
+        field_lm = oper.sht(np.sin(oper.LATS))
+        cond = (oper.l_idx == 1) & (oper.m_idx == 0)
+        assert_array_almost_equal(
+            field_lm[cond], np.sqrt(4 * np.pi / 3), decimal=self.decimal
+        )
+        assert_array_almost_equal(field_lm[~cond], 0.0, decimal=self.decimal)
 
-@unittest.SkipTest
+        # solid body rotation: u = cos(lat), rot = 2 sin(lat)
+        div_lm, rot_lm = oper.divrotsh_from_vec(
+            np.cos(oper.LATS), oper.create_array_spat(0)
+        )
+        assert_array_almost_equal(rot_lm, 2 * field_lm, decimal=self.decimal)
+        assert_array_almost_equal(div_lm, 0.0, decimal=self.decimal)
+
+
+class TestOperators2DFloat32(TestOperators2D):
+    dtype = "float32"
+    decimal = 4
+
+    def test_dtype(self):
+        oper = self.oper
+        field_lm = oper.create_array_sh_random()
+        self.assertEqual(field_lm.dtype, np.complex64)
+        field = oper.isht(field_lm)
+        self.assertEqual(field.dtype, np.float32)
+        self.assertEqual(oper.sht(field).dtype, np.complex64)
+        for array in oper.vec_from_divrotsh(field_lm, field_lm):
+            self.assertEqual(array.dtype, np.float32)
+        for array in oper.divrotsh_from_vec(field, field):
+            self.assertEqual(array.dtype, np.complex64)
+        self.assertEqual(oper.laplacian_sh(field_lm).dtype, np.complex64)
+
+
+class TestOperators2DWithNumpy(TestOperators2D):
+    sht_class = "sht2d.with_numpy"
+
+    def test_regular_grid(self):
+        lmax = 15
+        oper = OperatorsSphereHarmo2D(
+            nlat=2 * lmax + 2,
+            nlon=2 * lmax + 2,
+            lmax=lmax,
+            grid_type="regular",
+            sht=self.sht_class,
+        )
+        field_lm = oper.create_array_sh_random()
+        field_lm[oper.m_idx == 0] = field_lm[oper.m_idx == 0].real
+        assert_array_almost_equal(oper.sht(oper.isht(field_lm)), field_lm)
+
+
+@unittest.skipIf(find_spec("pyshtools") is None, "pyshtools is not available")
 class TestOperators2DWithSHTOOLS(TestOperators2D):
-    sht_class = "sht2d._try_with_shtools"
+    sht_class = "sht2d.with_shtools"
+
+    def test_compare_numpy(self):
+        oper = self.oper
+        oper_numpy = OperatorsSphereHarmo2D(
+            nlat=oper.nlat, nlon=oper.nlon, lmax=oper.lmax, sht="sht2d.with_numpy"
+        )
+        field = oper.create_array_spat_random()
+        field_lm = oper.sht(field)
+        assert_array_almost_equal(field_lm, oper_numpy.sht(field))
+        assert_array_almost_equal(oper.isht(field_lm), oper_numpy.isht(field_lm))
+
+    def test_truncation(self):
+        lmax = 10
+        oper = OperatorsSphereHarmo2D(nlat=24, lmax=lmax, sht=self.sht_class)
+        self.assertEqual(oper.nlon, 47)
+        field_lm = oper.create_array_sh_random()
+        field_lm[oper.m_idx == 0] = field_lm[oper.m_idx == 0].real
+        assert_array_almost_equal(oper.sht(oper.isht(field_lm)), field_lm)
+
+
+class TestStream(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.oper = oper = OperatorsSphereHarmo2D(lmax=7)
+        cls.fields = np.array([oper.create_array_spat_random() for i in range(5)])
+
+    def test_iter_chunks(self):
+        slices = [
+            slice_times
+            for slice_times, (chunk,) in iter_chunks([self.fields], 2, 1)
+        ]
+        self.assertEqual(slices, [slice(0, 2), slice(2, 4), slice(4, 5)])
+
+        class Source:
+            def __len__(self):
+                return 4
+
+            def __getitem__(self, key):
+                raise OSError("cannot read")
+
+        with self.assertRaises(OSError):
+            list(iter_chunks([Source()]))
+
+    def test_stream_sht(self):
+        oper = self.oper
+        fields = self.fields
+        with TemporaryDirectory() as tmp:
+            path_in = os.path.join(tmp, "fields.npy")
+            path_out = os.path.join(tmp, "fields_lm.npy")
+            np.save(path_in, fields)
+            stream_sht(oper, path_in, path_out, chunk_size=2)
+            fields_lm = np.load(path_out)
+        assert_array_almost_equal(fields_lm, oper.sht_batch(fields))
+
+    @unittest.skipIf(find_spec("h5py") is None, "h5py not installed")
+    def test_stream_divrotsh_from_vec_h5py(self):
+        import h5py
+
+        oper = self.oper
+        u, v = self.fields, self.fields[::-1]
+        with TemporaryDirectory() as tmp:
+            with h5py.File(os.path.join(tmp, "data.h5"), "w") as file:
+                file["u"] = u
+                file["v"] = v
+                shape = (len(u), oper.nlm)
+                output_div = file.create_dataset("div_lm", shape, complex)
+                stream_divrotsh_from_vec(
+                    oper, file["u"], file["v"], output_div, chunk_size=3
+                )
+                div_lm = output_div[:]
+
+        for field_u, field_v, field_div_lm in zip(u, v, div_lm):
+            assert_array_almost_equal(
+                field_div_lm, oper.divrotsh_from_vec(field_u, field_v)[0]
+            )
+
+
+class TestRegrid(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.oper = OperatorsSphereHarmo2D(nlat=16, nlon=32, lmax=15)
+        kwargs_out = dict(nlat=24, nlon=48, lmax=10, grid_type="regular")
+        cls.regridder = Regridder(cls.oper, kwargs_out)
+
+    def test_lm_index_map(self):
+        idx_in, idx_out = lm_index_map(15, 10)
+        oper_in, oper_out = self.regridder.oper_in, self.regridder.oper_out
+        self.assertEqual(len(idx_in), oper_out.nlm)
+        assert_array_equal(oper_in.l_idx[idx_in], oper_out.l_idx[idx_out])
+        assert_array_equal(oper_in.m_idx[idx_in], oper_out.m_idx[idx_out])
+
+    def test_regrid(self):
+        regridder = self.regridder
+        oper_in, oper_out = regridder.oper_in, regridder.oper_out
+        fields_lm = np.array([oper_in.create_array_sh_random() for i in range(3)])
+        fields_lm[:, oper_in.m_idx == 0] = fields_lm[:, oper_in.m_idx == 0].real
+        cond = oper_in.l_idx <= oper_out.lmax
+        fields_lm_out = np.array([field_lm[cond] for field_lm in fields_lm])
+        expected = oper_out.isht_batch(fields_lm_out)
+
+        fields_out = regridder.regrid(oper_in.isht_batch(fields_lm))
+        assert_array_almost_equal(fields_out, expected)
+        field_out = oper_out.create_array_spat()
+        regridder.regrid(oper_in.isht(fields_lm[0]), field_out)
+        assert_array_almost_equal(field_out, expected[0])
+
+        # zero padding
+        regridder_back = Regridder(oper_out, oper_in)
+        assert_array_almost_equal(
+            regridder.regrid(regridder_back.regrid(fields_out)), fields_out
+        )
+
+        fields_lm_out[:, 0] = 0.0
+        uD_lm, uR_lm = fields_lm_out[:2]
+        u, v = regridder.regrid_vec(
+            *oper_in.vec_from_vsh(*regridder_back.regrid_sh(fields_lm_out[:2]))
+        )
+        u_expected, v_expected = oper_out.vec_from_vsh(uD_lm, uR_lm)
+        assert_array_almost_equal(u, u_expected)
+        assert_array_almost_equal(v, v_expected)
+        uD_lms = regridder_back.regrid_sh(fields_lm_out[:2])
+        uR_lms = regridder_back.regrid_sh(fields_lm_out[1:])
+        us, vs = regridder.regrid_vec(*oper_in.vec_from_vsh_batch(uD_lms, uR_lms))
+        assert_array_almost_equal(us[0], u_expected)
+        assert_array_almost_equal(vs[0], v_expected)
+
+    def test_regrid_norm(self):
+        oper_in = self.oper
+        oper_out = OperatorsSphereHarmo2D(
+            nlat=24, nlon=48, lmax=10, grid_type="regular", norm="schmidt"
+        )
+        regridder = Regridder(oper_in, oper_out)
+        field_lm = oper_in.create_array_sh_random()
+        field_lm[oper_in.m_idx == 0] = field_lm[oper_in.m_idx == 0].real
+        field = oper_in.isht(field_lm)
+        assert_array_almost_equal(
+            regridder.regrid(field), self.regridder.regrid(field)
+        )
+        field_lm[0] = 0.0
+        u, v = oper_in.vec_from_vsh(field_lm, field_lm)
+        for result, result_expected in zip(
+            regridder.regrid_vec(u, v), self.regridder.regrid_vec(u, v)
+        ):
+            assert_array_almost_equal(result, result_expected)
+        # the coefficients are converted (not only truncated)
+        self.assertIsNotNone(regridder.factors)
+        assert_array_almost_equal(
+            oper_out.isht(regridder.regrid_sh(field_lm)),
+            self.regridder.oper_out.isht(self.regridder.regrid_sh(field_lm)),
+        )
+
+
+@unittest.skipIf(MPI is None, "mpi4py is not available")
+class TestOperators2DMPI(unittest.TestCase):
+    """Can be run with ``mpirun -np 4 python -m unittest fluidsht.sht2d.tests``"""
+
+    decimal = 6
+
+    @classmethod
+    def setUpClass(cls):
+        lmax = 15
+        kwargs = dict(nlat=lmax + 1, nlon=2 * lmax + 2, lmax=lmax)
+        cls.oper = OperatorsSphereHarmo2DMPI(**kwargs)
+        cls.oper_seq = OperatorsSphereHarmo2DMPI(comm=MPI.COMM_SELF, **kwargs)
+
+    def create_arrays_sh_real(self, nb_arrays):
+        """Random coefficients of real fields with no l=0 mode"""
+        arrays = [self.oper.create_array_sh_random() for i in range(nb_arrays)]
+        for array in arrays:
+            array[self.oper.l_idx == 0] = 0.0
+            array[self.oper.m_idx == 0] = array[self.oper.m_idx == 0].real
+        return arrays
+
+    def test_sht_analytic(self):
+        oper = self.oper
+        # sin(lat) = (4 pi / 3)**0.5 Y_1^0
+        field_lm = oper.sht(np.sin(oper.LATS))
+        cond = (oper.l_idx == 1) & (oper.m_idx == 0)
+        assert_array_almost_equal(field_lm[cond], np.sqrt(4 * np.pi / 3))
+        assert_array_almost_equal(field_lm[~cond], 0.0)
+        # mean of sin(lat)**2
+        spectrum = np.zeros(oper.lmax + 1)
+        spectrum[1] = 1 / 3
+        assert_array_almost_equal(oper.spectrum_l(field_lm), spectrum)
+
+    def test_divrotsh_analytic(self):
+        oper = self.oper
+        # solid body rotation: u = cos(lat), rot = 2 sin(lat)
+        div_lm, rot_lm = oper.divrotsh_from_vec(
+            np.cos(oper.LATS), oper.create_array_spat(0)
+        )
+        assert_array_almost_equal(rot_lm, oper.sht(2 * np.sin(oper.LATS)))
+        assert_array_almost_equal(div_lm, 0.0)
+
+        gradf_lon, gradf_lat = oper.gradf_from_fsh(oper.sht(np.sin(oper.LATS)))
+        # v is the colatitude component
+        assert_array_almost_equal(gradf_lat, -np.cos(oper.LATS))
+        assert_array_almost_equal(gradf_lon, 0.0)
+
+    def test_reversible(self):
+        oper = self.oper
+        field_lm = self.create_arrays_sh_real(1)[0]
+        assert_array_almost_equal(oper.sht(oper.isht(field_lm)), field_lm)
+
+        uD_lm, uR_lm = self.create_arrays_sh_real(2)
+        u, v = oper.vec_from_vsh(uD_lm, uR_lm)
+        for array_in, array_out in zip((uD_lm, uR_lm), oper.vsh_from_vec(u, v)):
+            assert_array_almost_equal(array_in, array_out)
+
+        div_lm, rot_lm = oper.divrotsh_from_vec(u, v)
+        u2, v2 = oper.vec_from_divrotsh(div_lm, rot_lm)
+        assert_array_almost_equal(u, u2)
+        assert_array_almost_equal(v, v2)
+
+    def test_out(self):
+        check_out(self, self.oper, self.create_arrays_sh_real(2))
+
+    def test_submit(self):
+        with self.assertRaises(NotImplementedError):
+            self.oper.submit_sht(self.oper.create_array_spat())
+        with self.assertRaises(NotImplementedError):
+            self.oper.set_nthreads(1)
+        with self.assertRaises(NotImplementedError):
+            with self.oper.use_nthreads(1):
+                pass
+
+    def test_advection(self):
+        oper = self.oper
+        a_lm, b_lm = self.create_arrays_sh_real(2)
+        grad_lon, grad_colat = oper.gradf_from_fsh(b_lm)
+        u, v = oper.vec_from_divrotsh(b_lm, a_lm)
+        assert_array_almost_equal(
+            oper.advection_divrotsh(b_lm, a_lm, b_lm),
+            oper.sht(u * grad_lon + v * grad_colat),
+        )
+
+    def test_nonlinear_product(self):
+        oper, oper_seq = self.oper, self.oper_seq
+        a_lm, b_lm = self.create_arrays_sh_real(2)
+        result = oper.gather_sh(oper.nonlinear_product_sh(a_lm, b_lm))
+        a_lm, b_lm = oper.gather_sh(a_lm), oper.gather_sh(b_lm)
+        if oper.rank == 0:
+            expected = oper_seq.nonlinear_product_sh(a_lm, b_lm)
+            assert_array_almost_equal(result, expected)
+        self.assertGreater(oper.opsht_padded.nlat, oper.nlat)
+        with self.assertRaises(ValueError):
+            OperatorsSphereHarmo2DMPI(lmax=7, dtype="float32")
+
+    def test_eval_at_points(self):
+        check_eval_at_points(self, self.oper)
+
+    def test_pickle(self):
+        with self.assertRaises(TypeError):
+            pickle.dumps(self.oper)
+
+    def test_checkpoint(self):
+        oper = self.oper
+        fields_lm = np.array(self.create_arrays_sh_real(2))
+        path = None
+        if oper.rank == 0:
+            tmp = TemporaryDirectory()
+            path = os.path.join(tmp.name, "state.sht")
+        path = oper.comm.bcast(path)
+        oper.save_sh(path, fields_lm)
+        assert_array_equal(oper.load_sh(path), fields_lm)
+        oper.save_sh(path, {"rot": fields_lm[0], "stack": fields_lm})
+        state = oper.load_sh(path)
+        assert_array_equal(state["rot"], fields_lm[0])
+        assert_array_equal(state["stack"], fields_lm)
+        oper.comm.barrier()
+        if oper.rank == 0:
+            tmp.cleanup()
+
+    def test_dealiasing(self):
+        oper = self.oper
+        a_lm = oper.dealiasing(oper.create_array_sh_random())
+        assert_array_almost_equal(a_lm[oper.l_idx > 2 * oper.lmax / 3], 0.0)
+
+    def test_compare_seq(self):
+        oper, oper_seq = self.oper, self.oper_seq
+        fields = np.random.RandomState(0).randn(2, *oper.shapeX_seq)
+        fields_lm_seq = [oper_seq.sht(field) for field in fields]
+        u_seq, v_seq = oper_seq.vec_from_vsh(*fields_lm_seq)
+
+        fields_loc = [oper.scatter_Xspace(field) for field in fields]
+        fields_lm = [oper.sht(field) for field in fields_loc]
+        u, v = oper.vec_from_vsh(*fields_lm)
+        results = [oper.gather_sh(field_lm) for field_lm in fields_lm]
+        results.extend(oper.gather_Xspace(field) for field in (u, v))
+        if oper.rank == 0:
+            for result, expected in zip(
+                results, fields_lm_seq + [u_seq, v_seq]
+            ):
+                assert_array_almost_equal(result, expected)
+
+        field_lm = oper.scatter_sh(fields_lm_seq[0])
+        assert_array_almost_equal(field_lm, fields_lm[0])
+        self.assertAlmostEqual(
+            oper.sum_wavenumbers(field_lm), fields_lm_seq[0].sum()
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,266 @@
+"""Class using NumPy (:mod:`fluidsht.sht2d.with_numpy`)
+=======================================================
+
+Pure NumPy implementation of the SHT, which does not require any compiled SHT
+library. It is useful for tests, continuous integration and small truncation
+degrees.
+
+The forward transforms are done with real FFTs along the longitudes
+(:func:`numpy.fft.rfft`) followed by matrix products with tables of associated
+Legendre functions computed once at initialization (see
+:class:`fluidsht.sht2d._legendre.LegendreTransforms`). The transforms of stacks
+of fields (``*_batch`` methods) are done with one matrix product per order m
+for all fields, i.e. with BLAS level 3 routines.
+
+The conventions (normalization, layout of the spectral arrays, grid with the
+south pole first, components of the vectors) are the same as for
+:mod:`fluidsht.sht2d.with_shtns`.
+
+.. autoclass:: SHT2DWithNumpy
+   :members:
+   :undoc-members:
+
+"""
+from warnings import warn
+
+import numpy as np
+
+from fluiddyn.calcul.sphericalharmo import compute_nlatnlon
+from fluidsht.sht2d._legendre import (
+    LegendreTransforms,
+    compute_lm_indices,
+    compute_nodes_weights,
+)
+from fluidsht.sht2d._spectral_tables import get_spectral_tables
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+
+class SHT2DWithNumpy(LegendreTransforms):
+    """Perform SHT with NumPy (FFT and Legendre matrices).
+
+    Parameters
+    ----------
+
+    nlat : {None, int}
+
+      If None, computed from lmax to avoid aliasing (see ``nl_order``).
+
+    nlon : {None, int}
+
+      If None, computed from lmax to avoid aliasing (see ``nl_order``).
+
+    lmax : int
+
+      Truncation degree.
+
+    mmax : {None, int}
+
+      If None, triangular truncation.
+
+    mres : 1
+
+      Only 1 is supported.
+
+    norm : {None, "orthonormal", "fourpi", "schmidt"}
+
+      Normalization of the spherical harmonics (default orthonormal).
+
+    cs_phase : bool, optional, default = False
+
+      Apply the Condon-Shortley phase factor to the associated Legendre
+      functions.
+
+    nl_order : {2, int}
+
+      Nonlinear order of the equations (used to compute nlat and nlon).
+
+    radius : float
+
+      Radius of the sphere.
+
+    grid_type : str, {"gaussian", "regular"}
+
+    wisdom_dir : str, optional
+
+      Ignored (no tuning with this backend).
+
+    nthreads : int, optional
+
+      Number of threads used by BLAS for the Legendre transforms. Only taken
+      into account if threadpoolctl is installed, when the limit is applied
+      with :func:`limit_threads` (done by the operators when they start using
+      this object). Default (None) to the BLAS default.
+
+    dtype : {"float64", "float32"}
+
+      Precision of the spatial arrays (the spectral arrays are complex128 or
+      complex64). The transforms are done in this precision.
+
+    """
+
+    def __init__(
+        self,
+        nlat=None,
+        nlon=None,
+        lmax=15,
+        mmax=None,
+        mres=1,
+        norm=None,
+        cs_phase=False,
+        nl_order=2,
+        radius=1,
+        grid_type="gaussian",
+        wisdom_dir=None,
+        nthreads=None,
+        dtype="float64",
+    ):
+        if norm is None:
+            norm = "orthonormal"
+        if mres != 1:
+            raise NotImplementedError("mres != 1")
+        if mmax is None:
+            mmax = lmax
+
+        if nlat is None or nlon is None:
+            nlat_default, nlon_default = compute_nlatnlon(lmax, nl_order)
+            nlat = nlat or nlat_default
+            nlon = nlon or nlon_default
+
+        if nlat <= lmax:
+            raise ValueError("nlat <= lmax")
+        if nlon <= 2 * mmax:
+            raise ValueError("nlon <= 2*mmax")
+        if grid_type == "regular" and nlat <= 2 * lmax:
+            warn(
+                "nlat <= 2*lmax: the analysis on a regular grid is not exact "
+                "(sampling theorem)"
+            )
+
+        self.lmax = int(lmax)
+        self.mmax = int(mmax)
+        self.mres = mres
+        self.norm = norm
+        self.cs_phase = cs_phase
+        self.grid_type = grid_type
+        self.radius = float(radius)
+        self.nlat = nlat
+        self.nlon = nlon
+        self.nthreads = nthreads
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float64, np.float32):
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        self.dtype_complex = np.result_type(self.dtype, np.complex64)
+
+        cos_theta, weights = compute_nodes_weights(nlat, grid_type)
+        self._cos_theta = cos_theta
+        self._weights = weights
+        self.sin_lats = cos_theta
+        self.lats = np.arcsin(cos_theta)
+        self.lons = 2 * np.pi * np.arange(nlon) / nlon
+        self.LONS, self.LATS = np.meshgrid(self.lons, self.lats)
+        self.deltax = 360.0 / nlon
+        # wrong but useful for fluidsim
+        self.deltay = self.deltax
+
+        self._ms = np.arange(self.mmax + 1)
+        _, _, self._slices = compute_lm_indices(self.lmax, self._ms)
+        # read-only arrays shared with the operators
+        tables = get_spectral_tables(self.lmax, self.mmax, mres, self.radius)
+        self._spectral_tables = tables
+        self.l_idx, self.m_idx = tables.l_idx, tables.m_idx
+        self.nlm = len(self.l_idx)
+        self.l2_idx = tables.l2_idx
+        self.K2 = tables.K2
+        self.K4 = tables.K4
+        self.K8 = tables.K8
+        self.K2_not0 = tables.K2_not0
+
+        self.lrange = np.arange(self.lmax + 1)
+        self.l2_l = self.lrange * (self.lrange + 1)
+        self.kh_l = np.sqrt(self.l2_l) / self.radius
+
+        # no MPI decomposition
+        self.shapeX = self.shapeX_loc = self.shapeX_seq = (nlat, nlon)
+        self.shapeK = self.shapeK_loc = self.shapeK_seq = (self.nlm,)
+
+        self._init_scalar_tables()
+
+        self._zeros_sh = self.create_array_sh(0.0)
+
+    def limit_threads(self):
+        """Limit the number of BLAS threads to ``nthreads`` (process-wide, with
+        threadpoolctl).
+
+        Returns None if there is no limit, or the threadpoolctl limiter, whose
+        method ``restore_original_limits`` restores the previous limits. The
+        limit is not changed around each transform, since that would race with
+        the transforms done in other threads.
+
+        """
+        if self.nthreads is None or threadpool_limits is None:
+            return None
+        return threadpool_limits(limits=self.nthreads, user_api="blas")
+
+    # Fourier transforms along the longitudes
+
+    def _fourier_from_spat(self, fields):
+        """FFT from ``(nfields, nlat, nlon)`` real arrays to ``(nm, nlat,
+        nfields)`` Fourier coefficients.
+
+        """
+        fourier = np.fft.rfft(fields, axis=-1)[..., : self.mmax + 1]
+        # NumPy < 2.0 computes FFTs only in double precision
+        fourier = fourier.astype(self.dtype_complex, copy=False)
+        fourier *= 2 * np.pi / self.nlon
+        return fourier.transpose(2, 1, 0)
+
+    def _spat_from_fourier(self, fourier, fields):
+        """Inverse FFT from ``(nm, nlat, nfields)`` Fourier coefficients to
+        ``(nfields, nlat, nlon)`` real arrays.
+
+        """
+        nfields = fourier.shape[2]
+        fourier_full = np.zeros(
+            (nfields, self.nlat, self.nlon // 2 + 1), dtype=self.dtype_complex
+        )
+        fourier_full[..., : self.mmax + 1] = fourier.transpose(2, 1, 0)
+        fields[:] = np.fft.irfft(fourier_full, n=self.nlon, axis=-1)
+        fields *= self.nlon
+        return fields
+
+    # creation of arrays
+
+    def idx_lm(self, l, m):
+        """Index of the coefficient (l, m) in the spectral arrays."""
+        if l >= 0 and 0 <= m <= min(l, self.mmax) and l <= self.lmax:
+            return self._slices[m].start + l - m
+        else:
+            raise ValueError("not (l>=0 and m>=0 and m<=l)")
+
+    # misc.
+
+    def dealiasing(self, field_lm):
+        """Convenient function for fluidsim"""
+        return field_lm
+
+    def sum_wavenumbers(self, field_lm):
+        """Convenient function to look more like a pseudo-spectral Operators"""
+        return field_lm.sum()
+
+    def produce_str_describing_oper(self):
+        """Produce a string describing the operator."""
+        return f"lmax{self.lmax}_nlat{self.nlat}_nlon{self.nlon}"
+
+    def produce_long_str_describing_oper(self):
+        """Produce a long string describing the operator."""
+        return (
+            "Spherical harmonic transforms with NumPy "
+            f"nlat = {self.nlat} ; nlon = {self.nlon}"
+        )
+
+
+SHTclass = SHT2DWithNumpy
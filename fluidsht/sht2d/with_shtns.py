@@ -1,6 +1,11 @@
 """Class using SHTns (:mod:`fluidsht.sht2d.with_shtns`)
 =========================================================
 
+The transforms of stacks of fields (``*_batch`` methods) are convenience loops
+calling SHTns once per field, with no speedup compared to separate calls: the
+Python interface of SHTns does not expose its multi-field transforms
+(``shtns_set_many``).
+
 .. autoclass:: SHT2DWithSHTns
    :members:
    :undoc-members:
@@ -13,7 +18,10 @@ import numpy as np
 import shtns
 
 from fluiddyn.calcul.sphericalharmo import EasySHT
+from fluidsht._plan_cache import nbytes_array_attrs
+from fluidsht.compat import nullcontext
 from fluidsht.util import make_namedtuple_from_module
+from fluidsht.wisdom import get_wisdom_dir, get_wisdom_path, wisdom_context
 
 
 keys_norm = ("orthonormal", "fourpi", "schmidt")
@@ -43,6 +51,55 @@ options_norm = make_namedtuple_from_module(
 options_flags = make_namedtuple_from_module(shtns, "sht_{}", "flags", keys_flags)
 
 
+class _SHTnsCastProxy:
+    """Wrap a ``shtns.sht`` object so that its transforms accept single
+    precision arrays.
+
+    SHTns only supports double precision on CPUs, so that the inputs are cast
+    to double precision and the results are cast back in the output arrays.
+
+    """
+
+    # number of inputs of the transforms (the other arguments are outputs)
+    _nb_inputs = {
+        "spat_to_SH": 1,
+        "SH_to_spat": 1,
+        "spat_to_SHsphtor": 2,
+        "SHsphtor_to_spat": 2,
+        "SHsph_to_spat": 1,
+        "SHtor_to_spat": 1,
+    }
+
+    def __init__(self, sh):
+        self._sh = sh
+        for name, nb_inputs in self._nb_inputs.items():
+            setattr(self, name, self._make_cast_function(name, nb_inputs))
+
+    def _make_cast_function(self, name, nb_inputs):
+        func = getattr(self._sh, name)
+
+        def cast_function(*args):
+            inputs = [_as_double(arr) for arr in args[:nb_inputs]]
+            outputs = args[nb_inputs:]
+            outputs_double = [
+                np.empty(arr.shape, complex if arr.dtype.kind == "c" else float)
+                for arr in outputs
+            ]
+            func(*inputs, *outputs_double)
+            for arr, arr_double in zip(outputs, outputs_double):
+                arr[:] = arr_double
+
+        cast_function.__name__ = name
+        return cast_function
+
+    def __getattr__(self, name):
+        return getattr(self._sh, name)
+
+
+def _as_double(arr):
+    return arr.astype(complex if arr.dtype.kind == "c" else float, copy=False)
+
+
 class SHT2DWithSHTns(EasySHT):
     __doc__ = (
         EasySHT.__doc__
@@ -55,6 +112,24 @@ class SHT2DWithSHTns(EasySHT):
         Default = do not apply the Condon-Shortley phase factor to the
         associated Legendre functions;
 
+    - wisdom_dir : str, optional
+
+        Directory where the configurations tuned by SHTns are saved and loaded
+        (see :mod:`fluidsht.wisdom`). Default to the environment variable
+        ``FLUIDSHT_WISDOM_DIR``. If no directory is given, SHTns is initialized
+        quickly, without tuning.
+
+    - nthreads : int, optional
+
+        Number of OpenMP threads used by the transforms. Default (None) to the
+        SHTns default (``OMP_NUM_THREADS`` or all cores).
+
+    - dtype : {"float64", "float32"}
+
+        Precision of the arrays. SHTns computes in double precision (on CPUs)
+        so that single precision arrays are cast before and after the
+        transforms.
+
     """
     )
 
@@ -72,6 +147,9 @@ class SHT2DWithSHTns(EasySHT):
         nl_order=2,
         radius=1,
         grid_type="gaussian",
+        wisdom_dir=None,
+        nthreads=None,
+        dtype="float64",
     ):
         if isinstance(norm, str):
             norm = getattr(options_norm, norm)
@@ -81,10 +159,18 @@ class SHT2DWithSHTns(EasySHT):
         if not cs_phase:
             norm += options_flags.no_cs_phase
 
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float64, np.float32):
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        self.dtype_complex = np.result_type(self.dtype, np.complex64)
+
+        wisdom_dir = get_wisdom_dir(wisdom_dir)
+
         if grid_type == "gaussian":
             flags = (
                 # options_flags.gauss_fly
-                options_flags.quick_init
+                # tuning is worth only if the result is saved
+                (options_flags.gauss if wisdom_dir else options_flags.quick_init)
                 | options_flags.phi_contiguous
                 | options_flags.south_pole_first
                 | flags
@@ -97,14 +183,201 @@ class SHT2DWithSHTns(EasySHT):
                 | flags
             )
 
-        super().__init__(
-            lmax, mmax, mres, norm, nlat, nlon, flags, polar_opt, nl_order, radius
+        if wisdom_dir:
+            flags |= options_flags.load_save_cfg
+            self.wisdom_path = get_wisdom_path(
+                wisdom_dir,
+                nlat,
+                nlon,
+                lmax,
+                flags,
+                mmax=mmax,
+                mres=mres,
+                norm=norm,
+                nl_order=nl_order,
+                nthreads=nthreads,
+            )
+            context = wisdom_context(self.wisdom_path)
+        else:
+            self.wisdom_path = None
+            context = nullcontext()
+
+        with context:
+            self._init_sh(
+                lmax,
+                mmax,
+                mres,
+                norm,
+                nlat,
+                nlon,
+                flags,
+                polar_opt,
+                nl_order,
+                nthreads,
+            )
+        self._init_attributes(radius)
+
+        self.nthreads = nthreads
+        if self.dtype != np.float64:
+            self.sh = _SHTnsCastProxy(self.sh)
+        self.sht_as_arg = self.sh.spat_to_SH
+        self.isht_as_arg = self.sh.SH_to_spat
+        self._zeros_sh = self.create_array_sh(0.0)
+
+    def _init_sh(
+        self,
+        lmax,
+        mmax,
+        mres,
+        norm,
+        nlat,
+        nlon,
+        flags,
+        polar_opt,
+        nl_order,
+        nthreads,
+    ):
+        """Create the SHTns object and its grid (costly).
+
+        The object is created here and not by ``EasySHT.__init__``, which does
+        not forward the number of threads: SHTns sets it when the object is
+        created, so that the grid (Legendre tables, FFTW plans and tuning)
+        would have to be initialized twice.
+
+        """
+        self.lmax = int(lmax)
+        self.mres = int(mres)
+        self.mmax = self.lmax // self.mres if mmax is None else int(mmax)
+        # in SHTns, 0 means None (default number of threads or size of grid)
+        self.sh = shtns.sht(
+            self.lmax, self.mmax, self.mres, norm=norm, nthreads=nthreads or 0
+        )
+        self.nlat, self.nlon = self.sh.set_grid(
+            nlat=nlat or 0,
+            nphi=nlon or 0,
+            flags=flags,
+            polar_opt=polar_opt,
+            nl_order=nl_order,
         )
+        if flags & options_flags.south_pole_first:
+            self.order_lat = "south_to_north"
+        else:
+            self.order_lat = "north_to_south"
+
+    def _init_attributes(self, radius):
+        """Attributes of EasySHT, with the angles in radians."""
+        self.radius = float(radius)
+        self.sin_lats = self.sh.cos_theta
+        self.lons = 2 * np.pi * np.arange(self.nlon) / (self.nlon * self.mres)
+        self.lats = np.arcsin(self.sin_lats)
+        # for fluidsim plotting
+        self.x_seq = self.lons
+        self.y_seq = self.lats
+        self.LONS, self.LATS = np.meshgrid(self.lons, self.lats)
+        self.cosLATS = np.cos(self.LATS)
+
+        self.l_idx = self.sh.l
+        self.m_idx = self.sh.m
+        self.nlm = self.sh.nlm
+        self.l2_idx = self.l_idx * (self.l_idx + 1)
+        # laplacian:=l(l+1)/r^2 and laplacian^2
+        self.K2 = self.l2_idx / self.radius**2
+        self.K4 = self.K2**2
+        self.K8 = self.K4**2
+        self.K2_not0 = self.K2.copy()
+        self.K2_not0[self.l2_idx == 0] = 1e-15
+        self.lrange = np.arange(self.lmax + 1)
+        self.l2_l = self.lrange * (self.lrange + 1)
+        self.kh_l = np.sqrt(self.l2_l) / self.radius
+
+        self.deltax = 360.0 / (self.nlon * self.mres)
+        # wrong but useful for fluidsim
+        self.deltay = self.deltax
+        self._complex64_save_netCFD = np.dtype(
+            [("real", np.float32), ("imag", np.float32)]
+        )
+        # no MPI decomposition
+        self.shapeX = self.shapeX_loc = self.shapeX_seq = (self.nlat, self.nlon)
+        self.shapeK = self.shapeK_loc = self.shapeK_seq = (self.nlm,)
+
+    def _estimate_nbytes(self):
+        """Memory used by the arrays and the tables of SHTns (Legendre
+        functions for half of the latitudes, in double precision).
+
+        """
+        return nbytes_array_attrs(self) + self.nlm * (self.nlat + 1) // 2 * 8
+
+    def create_array_spat(self, value=None):
+        """Create an array representing a field in spatial space."""
+        field = super().create_array_spat(value)
+        return field.astype(self.dtype, copy=False)
+
+    def create_array_sh(self, value=None, dtype=None):
+        """Create an array representing a field in spectral space."""
+        if dtype is None:
+            dtype = self.dtype_complex
+        field_lm = super().create_array_sh(value, dtype)
+        return field_lm.astype(dtype, copy=False)
+
+    def sht(self, field, field_lm=None):
+        """Forward transform (``field_lm`` is overwritten)."""
+        if field_lm is None:
+            field_lm = self.create_array_sh()
+        self.sh.spat_to_SH(field, field_lm)
+        return field_lm
+
+    def isht(self, field_lm, field=None):
+        """Inverse transform (``field`` is overwritten)."""
+        if field is None:
+            field = self.create_array_spat()
+        self.sh.SH_to_spat(field_lm, field)
+        return field
+
+    # batched scalar transforms (several fields stacked along the first axis)
+
+    def create_array_spat_batch(self, nfields, value=None):
+        """Create a stack of ``nfields`` arrays in spatial space."""
+        if value is None:
+            return np.empty((nfields,) + self.shapeX, self.dtype)
+        else:
+            return np.full((nfields,) + self.shapeX, value, self.dtype)
+
+    def create_array_sh_batch(self, nfields, value=None, dtype=None):
+        """Create a stack of ``nfields`` arrays in spectral space."""
+        if dtype is None:
+            dtype = self.dtype_complex
+        if value is None:
+            return np.empty((nfields, self.nlm), dtype)
+        elif value == 0:
+            return np.zeros((nfields, self.nlm), dtype)
+        else:
+            return value * np.ones((nfields, self.nlm), dtype)
+
+    def sht_batch(self, fields, fields_lm=None):
+        """Forward transforms of a stack of fields of shape ``(nfields, nlat,
+        nlon)`` (``fields_lm`` of shape ``(nfields, nlm)`` is overwritten).
+
+        One SHTns call per field (no speedup, see the module docstring).
+
+        """
+        if fields_lm is None:
+            fields_lm = self.create_array_sh_batch(len(fields))
+        for field, field_lm in zip(fields, fields_lm):
+            self.sh.spat_to_SH(field, field_lm)
+        return fields_lm
 
-        # Some overrides
-        # angles should be represented in radians by default
-        for attr in (self.lats, self.lons, self.LATS, self.LONS):
-            np.deg2rad(attr, out=attr)
+    def isht_batch(self, fields_lm, fields=None):
+        """Inverse transforms of a stack of fields of shape ``(nfields, nlm)``
+        (``fields`` of shape ``(nfields, nlat, nlon)`` is overwritten).
+
+        One SHTns call per field (no speedup, see the module docstring).
+
+        """
+        if fields is None:
+            fields = self.create_array_spat_batch(len(fields_lm))
+        for field_lm, field in zip(fields_lm, fields):
+            self.sh.SH_to_spat(field_lm, field)
+        return fields
 
     # functions for 2D vectorial spherical harmonic transforms
 
@@ -141,41 +414,93 @@ class SHT2DWithSHTns(EasySHT):
         self.sh.spat_to_SHsphtor(v, u, uD_lm, uR_lm)
         return uD_lm, uR_lm
 
+    def vec_from_sphsh(self, uD_lm, u=None, v=None):
+        """Compute velocities u, v from the spheroidal (divergent) part uD
+        alone (u and v are overwritten).
+
+        """
+        if u is None:
+            u = self.create_array_spat()
+            v = self.create_array_spat()
+        self.sh.SHsph_to_spat(uD_lm, v, u)
+        return u, v
+
+    def vec_from_torsh(self, uR_lm, u=None, v=None):
+        """Compute velocities u, v from the toroidal (rotational) part uR
+        alone (u and v are overwritten).
+
+        """
+        if u is None:
+            u = self.create_array_spat()
+            v = self.create_array_spat()
+        self.sh.SHtor_to_spat(uR_lm, v, u)
+        return u, v
+
+    def vec_from_vsh_batch(self, uD_lm, uR_lm, u=None, v=None):
+        """Batched version of :func:`vec_from_vsh` for stacks of shape
+        ``(nfields, nlm)`` (u and v are overwritten).
+
+        One SHTns call per field (no speedup, see the module docstring).
+
+        """
+        if u is None:
+            u = self.create_array_spat_batch(len(uD_lm))
+            v = self.create_array_spat_batch(len(uD_lm))
+        for args in zip(uD_lm, uR_lm, v, u):
+            self.sh.SHsphtor_to_spat(*args)
+        return u, v
+
+    def vec_from_sphsh_batch(self, uD_lm, u=None, v=None):
+        """Batched version of :func:`vec_from_sphsh` for stacks of shape
+        ``(nfields, nlm)`` (u and v are overwritten).
+
+        One SHTns call per field (no speedup, see the module docstring).
+
+        """
+        if u is None:
+            u = self.create_array_spat_batch(len(uD_lm))
+            v = self.create_array_spat_batch(len(uD_lm))
+        for args in zip(uD_lm, v, u):
+            self.sh.SHsph_to_spat(*args)
+        return u, v
+
+    def vsh_from_vec_batch(self, u, v, uD_lm=None, uR_lm=None):
+        """Batched version of :func:`vsh_from_vec` for stacks of shape
+        ``(nfields, nlat, nlon)`` (uD_lm and uR_lm are overwritten).
+
+        One SHTns call per field (no speedup, see the module docstring).
+
+        """
+        if uD_lm is None:
+            uD_lm = self.create_array_sh_batch(len(u))
+        if uR_lm is None:
+            uR_lm = self.create_array_sh_batch(len(u))
+        for args in zip(v, u, uD_lm, uR_lm):
+            self.sh.spat_to_SHsphtor(*args)
+        return uD_lm, uR_lm
+
     def gradf_from_fsh(self, f_lm, gradf_lon=None, gradf_lat=None):
         """Compute the gradient of a function f from its spherical
         harmonic coeff f_lm (gradf_lon and gradf_lat are overwritten)
 
         """
         if gradf_lon is None:
-            gradf_lon = self.create_array_spat(0)
-            gradf_lat = self.create_array_spat(0)  # becareful bug if not 0!!!
-        #       We do not use SHsph_to_spat() because it seems that there is a
-        #       problem (av: what exactly? does it still exist?)
-        #       self.sh.SHsph_to_spat(f_lm, gradf_lat, gradf_lon)
-        #       instead we use SHsphtor_to_spat(...) with tor_lm= zeros_lm
-        # zeros_lm = self.create_array_sh(0.)
-        self.sh.SHsphtor_to_spat(f_lm, self._zeros_sh, gradf_lat, gradf_lon)
-
-        # if self.order_lat == 'south_to_north':
-        #    sign_inv_v = -1
-        # else:
-        #    sign_inv_v = 1
-        # sign_inv_v = 1
-        gradf_lat[:] = +gradf_lat / self.radius  # *sign_inv_v
-        gradf_lon[:] = +gradf_lon / self.radius
-        # print('radius', self.radius)
+            gradf_lon = self.create_array_spat()
+            gradf_lat = self.create_array_spat()
+        self.sh.SHsph_to_spat(f_lm, gradf_lat, gradf_lon)
+
+        if self.radius != 1:
+            # in place, without temporary arrays
+            gradf_lat /= self.radius
+            gradf_lon /= self.radius
         return gradf_lon, gradf_lat
 
     # Method aliases
     # NOTE: Only kept for reference. Replaced by pythranized methods in operators
     # divrotsh_from_vsh = EasySHT.hdivrotsh_from_uDuRsh
     # vsh_from_divrotsh = EasySHT.uDuRsh_from_hdivrotsh
-    create_array_spat_random = functools.partialmethod(
-        EasySHT.create_array_spat, "rand"
-    )
-    create_array_sh_random = functools.partialmethod(
-        EasySHT.create_array_sh, "rand"
-    )
+    create_array_spat_random = functools.partialmethod(create_array_spat, "rand")
+    create_array_sh_random = functools.partialmethod(create_array_sh, "rand")
 
 
 SHTclass = SHT2DWithSHTns
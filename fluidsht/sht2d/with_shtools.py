@@ -0,0 +1,201 @@
+"""Class using SHTOOLS (:mod:`fluidsht.sht2d.with_shtools`)
+===========================================================
+
+The scalar transforms are done with the Gauss-Legendre quadrature routines of
+SHTOOLS (``SHExpandGLQ`` and ``MakeGridGLQ``). The nodes and weights of the
+quadrature are computed once at initialization, and the transforms can be
+truncated at a degree ``lmax`` smaller than the degree resolved by the grid
+(argument ``lmax_calc`` of SHTOOLS).
+
+SHTOOLS uses real spherical harmonics stored in arrays of shape ``(2, lmax+1,
+lmax+1)`` (cosine and sine coefficients) and grids with the north pole first.
+The coefficients are converted to the packed complex layout used by the other
+backends (see :mod:`fluidsht.sht2d.with_shtns` and
+:mod:`fluidsht.sht2d._layouts`) and the grids are flipped, so that the backends
+are interchangeable.
+
+SHTOOLS does not provide vector transforms on Gauss-Legendre grids, so that
+they are done as in :mod:`fluidsht.sht2d.with_numpy`. The scalar transforms
+are always computed in double precision by SHTOOLS (the arrays are cast for
+``dtype="float32"``).
+
+.. autoclass:: SHT2DWithSHTOOLS
+   :members:
+
+"""
+from collections import namedtuple
+
+import numpy as np
+from pyshtools.backends import shtools
+
+from fluiddyn.calcul.sphericalharmo import compute_nlatnlon
+from fluidsht.sht2d.with_numpy import SHT2DWithNumpy
+
+Normalization = namedtuple(
+    "normalization", ("orthonormal", "fourpi", "schmidt", "unnormalized")
+)
+options_norm = Normalization(
+    4,
+    1,
+    2,
+    3
+    # "ortho", "4pi", "schmidt", "unnorm"
+)
+# Condon-Shortley phase factor to the associated Legendre functions
+Flags = namedtuple("flags", ("csphase", "no_csphase"))
+options_flags = Flags(-1, 1)
+
+
+class SHT2DWithSHTOOLS(SHT2DWithNumpy):
+    """Perform SHT with SHTOOLS on a Gauss-Legendre grid.
+
+    Parameters
+    ----------
+
+    nlat : {None, int}
+
+      Number of latitudes (degree resolved by the grid + 1). If None, computed
+      from lmax to avoid aliasing (see ``nl_order``).
+
+    nlon : {None, int}
+
+      Has to be equal to ``2 * nlat - 1`` (SHTOOLS grid).
+
+    lmax : int
+
+      Truncation degree (can be smaller than ``nlat - 1``).
+
+    norm : {None, "orthonormal", "fourpi", "schmidt"}
+
+      Normalization of the spherical harmonics (default orthonormal).
+
+    cs_phase : bool, optional, default = False
+
+      Apply the Condon-Shortley phase factor to the associated Legendre
+      functions.
+
+    nl_order, radius, wisdom_dir, nthreads, dtype :
+
+      See :class:`fluidsht.sht2d.with_numpy.SHT2DWithNumpy`.
+
+    grid_type : str, {"gaussian"}
+
+    """
+
+    def __init__(
+        self,
+        nlat=None,
+        nlon=None,
+        lmax=15,
+        norm=None,
+        cs_phase=False,
+        nl_order=2,
+        radius=1,
+        grid_type="gaussian",
+        wisdom_dir=None,
+        nthreads=None,
+        dtype="float64",
+    ):
+        if grid_type != "gaussian":
+            raise NotImplementedError(f"grid_type={grid_type}")
+
+        if nlat is None:
+            nlat = compute_nlatnlon(lmax, nl_order)[0]
+        if nlon is None:
+            nlon = 2 * nlat - 1
+        elif nlon != 2 * nlat - 1:
+            raise ValueError(
+                "SHTOOLS Gauss-Legendre grids need nlon == 2*nlat - 1"
+            )
+
+        self._norm_shtools = getattr(options_norm, norm or "orthonormal")
+        self._csphase = (
+            options_flags.csphase if cs_phase else options_flags.no_csphase
+        )
+        super().__init__(
+            nlat,
+            nlon,
+            lmax,
+            norm=norm,
+            cs_phase=cs_phase,
+            nl_order=nl_order,
+            radius=radius,
+            grid_type=grid_type,
+            nthreads=nthreads,
+            dtype=dtype,
+        )
+
+    def _init_scalar_tables(self):
+        # degree resolved by the grid
+        self._lmax_grid = self.nlat - 1
+        # nodes and weights of the quadrature, computed only once
+        self._zeros, self._weights_glq = shtools.SHGLQ(self._lmax_grid)
+
+        # conversion between the packed complex layout and the cubes of
+        # SHTOOLS (index maps shared with the operators)
+        self._layouts = self._spectral_tables.layouts
+
+    def sht(self, field, field_lm=None):
+        """Forward transform (``field_lm`` is overwritten)."""
+        if field_lm is None:
+            field_lm = self.create_array_sh()
+        cilm = shtools.SHExpandGLQ(
+            # SHTOOLS grids start at the north pole
+            np.ascontiguousarray(field[::-1]),
+            self._weights_glq,
+            self._zeros,
+            norm=self._norm_shtools,
+            csphase=self._csphase,
+            lmax_calc=self.lmax,
+        )
+        return self._layouts.sh_from_cube(cilm, field_lm)
+
+    def isht(self, field_lm, field=None):
+        """Inverse transform (``field`` is overwritten)."""
+        if field is None:
+            field = self.create_array_spat()
+        grid = shtools.MakeGridGLQ(
+            self._layouts.cube_from_sh(field_lm, dtype=np.float64),
+            self._zeros,
+            lmax=self._lmax_grid,
+            norm=self._norm_shtools,
+            csphase=self._csphase,
+            lmax_calc=self.lmax,
+        )
+        field[:] = grid[::-1]
+        return field
+
+    sht_as_arg = sht
+    isht_as_arg = isht
+
+    def sht_batch(self, fields, fields_lm=None):
+        """Forward transforms of a stack of fields of shape ``(nfields, nlat,
+        nlon)`` (``fields_lm`` of shape ``(nfields, nlm)`` is overwritten).
+
+        """
+        if fields_lm is None:
+            fields_lm = self.create_array_sh_batch(len(fields))
+        for field, field_lm in zip(fields, fields_lm):
+            self.sht(field, field_lm)
+        return fields_lm
+
+    def isht_batch(self, fields_lm, fields=None):
+        """Inverse transforms of a stack of fields of shape ``(nfields, nlm)``
+        (``fields`` of shape ``(nfields, nlat, nlon)`` is overwritten).
+
+        """
+        if fields is None:
+            fields = self.create_array_spat_batch(len(fields_lm))
+        for field_lm, field in zip(fields_lm, fields):
+            self.isht(field_lm, field)
+        return fields
+
+    def produce_long_str_describing_oper(self):
+        """Produce a long string describing the operator."""
+        return (
+            "Spherical harmonic transforms with SHTOOLS "
+            f"nlat = {self.nlat} ; nlon = {self.nlon}"
+        )
+
+
+SHTclass = SHT2DWithSHTOOLS
@@ -0,0 +1,121 @@
+import csv
+import json
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import unittest
+
+import numpy as np
+
+from fluidsht._plan_cache import PlanCache, estimate_nbytes
+from fluidsht.bench import fields_results, flop_estimate, main
+from fluidsht.util import get_nthreads
+from fluidsht.wisdom import (
+    cpu_signature,
+    get_wisdom_dir,
+    get_wisdom_path,
+    wisdom_context,
+)
+
+
+class Plan:
+    def __init__(self, n):
+        self.array = np.zeros(n)
+
+
+class TestPlanCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = PlanCache(maxbytes=3 * 80)
+        keys = [cache.make_key("plan", i, n=10) for i in range(4)]
+
+        plan0 = cache.get_or_create(keys[0], lambda: Plan(10))
+        self.assertIs(cache.get_or_create(keys[0], lambda: Plan(10)), plan0)
+        for key in keys[1:3]:
+            cache.get_or_create(key, lambda: Plan(10))
+
+        # keys[0] has been used last => keys[1] is evicted
+        cache.get_or_create(keys[0], lambda: Plan(10))
+        cache.get_or_create(keys[3], lambda: Plan(10))
+        info = cache.info()
+        self.assertEqual(info.nb_plans, 3)
+        self.assertEqual(info.evictions, 1)
+        self.assertEqual(info.nbytes, 3 * 80)
+        self.assertIs(cache.get_or_create(keys[0], lambda: Plan(10)), plan0)
+        self.assertEqual(cache.info().misses, 4)
+
+        cache.clear()
+        self.assertEqual(cache.info().nb_plans, 0)
+
+    def test_too_large_and_unhashable(self):
+        cache = PlanCache(maxbytes=8)
+        key = cache.make_key("plan", n=10)
+        plan = cache.get_or_create(key, lambda: Plan(10))
+        self.assertIsNot(cache.get_or_create(key, lambda: Plan(10)), plan)
+        self.assertIsNone(cache.make_key("plan", a=np.zeros(2)))
+
+    def test_estimate_nbytes(self):
+        plan = Plan(10)
+        self.assertEqual(estimate_nbytes(plan), 80)
+        plan._estimate_nbytes = lambda: 1000
+        self.assertEqual(estimate_nbytes(plan), 1000)
+
+
+class TestWisdom(unittest.TestCase):
+    def test_wisdom_context(self):
+        self.assertEqual(cpu_signature(), cpu_signature())
+        cwd = os.getcwd()
+        with TemporaryDirectory() as tmp:
+            self.assertEqual(get_wisdom_dir(tmp), Path(tmp))
+            path = get_wisdom_path(tmp, 16, 32, 15, 0)
+            self.assertIn(cpu_signature(), path.parts)
+            # SHTns only loads configurations with the same number of threads
+            self.assertNotEqual(
+                get_wisdom_path(tmp, 16, 32, 15, 0, nthreads=2), path
+            )
+            with wisdom_context(path):
+                self.assertEqual(Path(os.getcwd()).resolve(), path.resolve())
+                with open("shtns_cfg", "w") as file:
+                    file.write("cfg")
+            self.assertEqual(os.getcwd(), cwd)
+            # second time: existing configuration
+            with wisdom_context(path):
+                self.assertTrue(Path("shtns_cfg").exists())
+            self.assertEqual(os.getcwd(), cwd)
+
+
+class TestUtil(unittest.TestCase):
+    def test_get_nthreads(self):
+        self.assertGreaterEqual(get_nthreads("auto"), 1)
+        self.assertEqual(get_nthreads(2), 2)
+        with self.assertRaises(ValueError):
+            get_nthreads(0)
+
+
+class TestBench(unittest.TestCase):
+    def test_flop_estimate(self):
+        flops = flop_estimate(16, 32, 136)
+        self.assertGreater(flops, 0)
+        self.assertGreater(flop_estimate(16, 32, 136, "vector"), 2 * flops)
+
+    def test_main(self):
+        with TemporaryDirectory() as tmp:
+            path_json = os.path.join(tmp, "bench.json")
+            path_csv = os.path.join(tmp, "bench.csv")
+            args = ["--lmax", "7", "--batch-sizes", "1", "2", "--repeat", "2"]
+            main(args + ["-o", path_json])
+            main(args + ["--kinds", "vector", "-o", path_csv])
+
+            with open(path_json) as file:
+                data = json.load(file)
+            self.assertIn("numpy", data["metadata"])
+            for result in data["results"]:
+                self.assertEqual(set(result), set(fields_results))
+                self.assertGreater(result["gflops"], 0)
+
+            with open(path_csv, newline="") as file:
+                reader = csv.DictReader(file)
+                self.assertEqual(tuple(reader.fieldnames), fields_results)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,5 @@
 from collections import namedtuple
+import os
 
 
 def make_namedtuple_from_module(module, pattern, typename, field_names):
@@ -34,3 +35,33 @@ def make_namedtuple_from_module(module, pattern, typename, field_names):
 
     NamedTuple = namedtuple(typename, field_names)
     return NamedTuple(*field_values)
+
+
+def get_nthreads(nthreads="auto"):
+    """Compute a number of threads.
+
+    Parameters
+    ----------
+
+    nthreads : int or "auto"
+
+      If "auto", the number of CPUs in the affinity mask of the process (i.e.
+      the cores on which it is allowed to run, for example when MPI processes
+      are bound to sockets).
+
+    Returns
+    -------
+    The number of threads (int).
+
+    """
+    if nthreads == "auto":
+        try:
+            return len(os.sched_getaffinity(0))
+        except AttributeError:
+            # not available on all platforms
+            return os.cpu_count() or 1
+
+    nthreads = int(nthreads)
+    if nthreads < 1:
+        raise ValueError(f"nthreads should be positive (nthreads = {nthreads})")
+    return nthreads
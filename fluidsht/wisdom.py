@@ -0,0 +1,132 @@
+"""Persistent store of tuned SHT configurations (:mod:`fluidsht.wisdom`)
+=======================================================================
+
+Some SHT libraries (for example SHTns with the flag ``load_save_cfg``) can
+benchmark different algorithms during initialization and save the best
+configuration in a file of the current directory. This module manages a
+"wisdom" directory where these files are stored per CPU signature and
+transform parameters, so that later processes (possibly on other nodes of a
+cluster sharing the same filesystem) only have to load them.
+
+The wisdom directory is given either by the argument ``wisdom_dir`` of the
+operators or by the environment variable ``FLUIDSHT_WISDOM_DIR``. If none is
+given, tuned configurations are not saved.
+
+Concurrent processes (for example MPI ranks) are serialized with an exclusive
+file lock, so that only one process tunes and writes a configuration while the
+others wait and then read it. Since SHTns only reuses a saved configuration
+created with the same parameters (including the number of threads), all these
+parameters are part of the name of the directory.
+
+.. warning::
+
+  The current directory of the process is changed while a SHT object is
+  created (the SHT libraries save their configurations in the current
+  directory), which breaks relative paths used at the same time in other
+  threads. The operators create their SHT object in the calling thread (see
+  :func:`fluidsht.sht2d.operators.OperatorsSphereHarmo2D.submit`), and the
+  creations are serialized, but SHT objects should not be created while other
+  threads use relative paths.
+
+.. autofunction:: get_wisdom_dir
+
+.. autofunction:: cpu_signature
+
+.. autofunction:: get_wisdom_path
+
+.. autofunction:: wisdom_context
+
+"""
+from contextlib import contextmanager
+from hashlib import sha1
+import os
+from pathlib import Path
+import platform
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # no file locking on Windows
+    fcntl = None
+
+
+_lock_chdir = threading.RLock()
+
+
+def get_wisdom_dir(wisdom_dir=None):
+    """Return the wisdom directory as a Path (or None if it is not set)."""
+    if wisdom_dir is None:
+        wisdom_dir = os.getenv("FLUIDSHT_WISDOM_DIR")
+    if not wisdom_dir:
+        return None
+    return Path(wisdom_dir).expanduser()
+
+
+def cpu_signature():
+    """Short string characterizing the CPU of the host."""
+    description = [platform.machine(), platform.processor(), str(os.cpu_count())]
+    try:
+        with open("/proc/cpuinfo") as file:
+            for line in file:
+                if line.startswith(("model name", "flags")):
+                    description.append(line.split(":", 1)[1].strip())
+                elif not line.strip() and len(description) > 3:
+                    # only the first processor
+                    break
+    except OSError:
+        pass
+    digest = sha1("\n".join(description).encode()).hexdigest()[:12]
+    return f"{platform.machine()}_{digest}"
+
+
+def get_wisdom_path(
+    wisdom_dir,
+    nlat,
+    nlon,
+    lmax,
+    flags,
+    mmax=None,
+    mres=1,
+    norm=None,
+    nl_order=None,
+    nthreads=None,
+):
+    """Directory containing the tuned configuration for some parameters.
+
+    All the parameters used by SHTns to match a saved configuration are part
+    of the name (None meaning the default of the library).
+
+    """
+    name = (
+        f"lmax{lmax}_mmax{mmax}_mres{mres}_nlat{nlat}_nlon{nlon}"
+        f"_flags{flags}_norm{norm}_nlorder{nl_order}_nthreads{nthreads}"
+    )
+    return Path(wisdom_dir) / cpu_signature() / name
+
+
+@contextmanager
+def wisdom_context(path):
+    """Context manager to create a SHT object which loads / saves its
+    configuration in the current directory.
+
+    The current directory is changed to ``path`` and an exclusive file lock
+    is held. The lock is exclusive even if the configuration file exists,
+    since the SHT library tunes and appends a new entry to the file if none of
+    its entries matches the parameters (e.g. a file written by another
+    version of the library).
+
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    with _lock_chdir, open(path / ".lock", "a") as file_lock:
+        if fcntl is not None:
+            fcntl.flock(file_lock, fcntl.LOCK_EX)
+        cwd = os.getcwd()
+        os.chdir(path)
+        try:
+            yield path
+        finally:
+            os.chdir(cwd)
+            if fcntl is not None:
+                fcntl.flock(file_lock, fcntl.LOCK_UN)